@@ -0,0 +1,108 @@
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+baselines_dir = os.path.join(os.path.dirname(__file__), "baselines")
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    return {
+        "count": len(samples),
+        "mean": round(statistics.fmean(samples), 3),
+        "p50": round(percentile(samples, 50), 3),
+        "p95": round(percentile(samples, 95), 3),
+        "p99": round(percentile(samples, 99), 3),
+        "max": round(max(samples), 3),
+    }
+
+
+# For repeated timings of one call: the median and interquartile range, which a
+# few slow rounds (GC, another process) barely move, and how many rounds fell
+# outside 1.5 IQR of the quartiles. Compare on the median.
+def summarizeTimings(samples: list[float]) -> dict[str, float]:
+    q1, median, q3 = statistics.quantiles(samples, n=4, method="inclusive")
+    iqr = q3 - q1
+    outliers = sum(
+        1 for sample in samples if sample < q1 - 1.5 * iqr or sample > q3 + 1.5 * iqr
+    )
+    return {
+        "count": len(samples),
+        "median": round(median, 3),
+        "iqr": round(iqr, 3),
+        "q1": round(q1, 3),
+        "q3": round(q3, 3),
+        "mean": round(statistics.fmean(samples), 3),
+        "min": round(min(samples), 3),
+        "outliers": outliers,
+    }
+
+
+# The app reads DATABASE_URL at import time, so this has to run before anything
+# imports db or main.
+@contextmanager
+def benchDatabase() -> Iterator[str]:
+    if "DATABASE_URL" in os.environ:
+        yield os.environ["DATABASE_URL"]
+        return
+    with tempfile.TemporaryDirectory() as workdir:
+        url = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        os.environ["DATABASE_URL"] = url
+        yield url
+
+
+def baselinePath(name: str) -> str:
+    return os.path.join(baselines_dir, f"{name}.json")
+
+
+# Keys are sorted and numbers rounded so a re-run only shows up in the diff
+# where a number actually moved.
+def saveBaseline(name: str, config: dict, results: dict[str, dict[str, float]]):
+    os.makedirs(baselines_dir, exist_ok=True)
+    document = {
+        "config": config,
+        "machine": {
+            "python": platform.python_version(),
+            "platform": sys.platform,
+            "cpus": os.cpu_count(),
+        },
+        "recorded": datetime.now(timezone.utc).date().isoformat(),
+        "results": results,
+    }
+    with open(baselinePath(name), "w") as output:
+        json.dump(document, output, indent=2, sort_keys=True)
+        output.write("\n")
+
+
+# Returns the names whose metric got worse by more than threshold (0.2 = 20%).
+def compareBaseline(
+    name: str, results: dict[str, dict[str, float]], metric: str, threshold: float
+) -> list[str]:
+    path = baselinePath(name)
+    if not os.path.exists(path):
+        print(f"no baseline at {path}")
+        return []
+    with open(path) as source:
+        baseline = json.load(source)["results"]
+    regressions = []
+    for key, stats in results.items():
+        if key not in baseline or not baseline[key].get(metric):
+            continue
+        change = stats[metric] / baseline[key][metric] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(key)
+            flag = "  REGRESSION"
+        print(f"{key:<40} {metric} {baseline[key][metric]:>10.3f} -> {stats[metric]:>10.3f} ({change:+.0%}){flag}")
+    return regressions
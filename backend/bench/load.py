@@ -0,0 +1,153 @@
+# HTTP load driver: concurrent clients hit a weighted mix of routes against the
+# in-process app (httpx ASGI transport) and report throughput and p50/p95/p99
+# per route template.
+#
+#   cd backend && python -m bench.load --scale small --clients 16 --seconds 20
+#   cd backend && python -m bench.load --scale small --save
+#   cd backend && python -m bench.load --scale small --compare
+#
+# Clients don't send If-None-Match, so every request is a full 200.
+import argparse
+import asyncio
+import random
+import sys
+import time
+from collections import defaultdict
+from bench.common import benchDatabase, compareBaseline, saveBaseline, summarize
+from bench.seed import BENCH_PASSWORD, SCALES
+
+searchTerms = ["dragon", "space", "neon empire", "ghost", "crystal", "rogue quest"]
+sorts = ["rating", "reviews", "year", "name"]
+
+
+class RouteMix:
+    def __init__(self, rng: random.Random, gameIds: list[int], userIds: list[int], genreIds: list[int]):
+        self.rng = rng
+        self.gameIds = gameIds
+        self.userIds = userIds
+        self.genreIds = genreIds
+        # (template, weight, builds the concrete path)
+        self.routes = [
+            ("GET /games", 30, lambda: f"/games?sort={rng.choice(sorts)}"),
+            (
+                "GET /games?genreIds",
+                10,
+                lambda: f"/games?genreIds={rng.choice(genreIds)}&minRating={rng.choice((0, 60, 80))}",
+            ),
+            ("GET /games/facets", 5, lambda: "/games/facets"),
+            ("GET /games/{gameId}", 20, lambda: f"/games/{self.game()}"),
+            ("GET /games/{gameId}/reviews", 15, lambda: f"/games/{self.game()}/reviews"),
+            ("GET /users/{userId}/reviews", 10, lambda: f"/users/{rng.choice(userIds)}/reviews"),
+            ("GET /search", 5, lambda: f"/search?q={rng.choice(searchTerms)}"),
+            ("GET /users/me", 5, lambda: "/users/me"),
+        ]
+        self.weights = [weight for _, weight, _ in self.routes]
+
+    # Skewed towards popular games, like real traffic
+    def game(self) -> int:
+        return self.gameIds[min(len(self.gameIds) - 1, int(self.rng.expovariate(1 / 50)))]
+
+    def pick(self) -> tuple[str, str]:
+        template, _, build = self.rng.choices(self.routes, self.weights)[0]
+        return template, build()
+
+
+async def run(clients: int, seconds: float, seed: int) -> dict[str, dict[str, float]]:
+    import httpx
+    from sqlmodel import Session, select
+    from db import engine
+    import main
+    import models
+
+    with Session(engine) as db:
+        gameIds = list(
+            db.exec(select(models.Game.id).order_by(models.Game.reviewCount.desc()))  # type: ignore
+        )
+        userIds = list(db.exec(select(models.User.id)))
+        genreIds = list(db.exec(select(models.Genre.id)))
+        username = db.exec(select(models.User.username)).first()
+
+    latencies: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, int] = defaultdict(int)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        tokenResponse = await client.post(
+            "/token", data={"username": username, "password": BENCH_PASSWORD}
+        )
+        tokenResponse.raise_for_status()
+        headers = {"Authorization": f"Bearer {tokenResponse.json()['access_token']}"}
+
+        async def clientLoop(clientIndex: int, deadline: float):
+            mix = RouteMix(random.Random(seed * 1000 + clientIndex), gameIds, userIds, genreIds)
+            while time.perf_counter() < deadline:
+                template, path = mix.pick()
+                start = time.perf_counter()
+                response = await client.get(path, headers=headers)
+                latencies[template].append((time.perf_counter() - start) * 1000)
+                if response.status_code >= 400:
+                    errors[template] += 1
+
+        # A short warm-up fills the caches and the connection pool
+        await asyncio.gather(*[clientLoop(i, time.perf_counter() + 1) for i in range(clients)])
+        latencies.clear()
+        errors.clear()
+        started = time.perf_counter()
+        await asyncio.gather(
+            *[clientLoop(i, started + seconds) for i in range(clients)]
+        )
+        elapsed = time.perf_counter() - started
+
+    results: dict[str, dict[str, float]] = {}
+    for template in sorted(latencies):
+        samples = latencies[template]
+        results[template] = {
+            **summarize(samples),
+            "rps": round(len(samples) / elapsed, 1),
+            "errors": errors[template],
+        }
+    allSamples = [sample for samples in latencies.values() for sample in samples]
+    results["ALL"] = {
+        **summarize(allSamples),
+        "rps": round(len(allSamples) / elapsed, 1),
+        "errors": sum(errors.values()),
+    }
+    return results
+
+
+def printResults(results: dict[str, dict[str, float]]):
+    print(f"{'route':<32} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}")
+    for template, stats in results.items():
+        print(
+            f"{template:<32} {stats['rps']:>8.1f} {stats['p50']:>8.2f} "
+            f"{stats['p95']:>8.2f} {stats['p99']:>8.2f} {stats['errors']:>7}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-process HTTP load driver")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--save", action="store_true", help="write the baseline JSON")
+    parser.add_argument("--compare", action="store_true", help="diff against the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    args = parser.parse_args()
+
+    with benchDatabase():
+        from bench.seed import prepareDatabase
+
+        counts = prepareDatabase(args.scale, args.seed)
+        results = asyncio.run(run(args.clients, args.seconds, args.seed))
+    printResults(results)
+
+    baselineName = f"load-{args.scale}"
+    config = {"scale": args.scale, "seed": args.seed, "clients": args.clients, **counts}
+    if args.save:
+        saveBaseline(baselineName, config, results)
+    if args.compare and compareBaseline(baselineName, results, "p95", args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# p50/p95/p99 of GET /games while logins are in flight.
+#
+#   cd backend && python -m bench.login_contention --logins 8 --seconds 10
+#
+# The app runs in-process behind httpx's ASGI transport, so anything that blocks
+# the event loop (a sync query or a bcrypt call in an async handler) shows up
+# directly in the /games tail latency. Runs against a throwaway SQLite file unless
+# DATABASE_URL is set.
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from bench.common import percentile
+
+
+async def run(logins: int, seconds: float, games: int):
+    import httpx
+    from sqlmodel import Session
+    import db
+    import main
+    import models
+
+    db.create_db_and_tables()
+    with Session(db.engine) as session:
+        for i in range(games):
+            session.add(
+                models.Game(
+                    name=f"Game {i}",
+                    releaseYear=2000 + i % 25,
+                    description="Benchmark game",
+                    publisher="Bench",
+                )
+            )
+        session.commit()
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post(
+            "/register",
+            json={"username": "bench", "email": "bench@example.com", "password": "pw"},
+        )
+        deadline = time.perf_counter() + seconds
+        gameLatencies: list[float] = []
+        loginCount = 0
+
+        async def loginLoop():
+            nonlocal loginCount
+            while time.perf_counter() < deadline:
+                response = await client.post(
+                    "/token", data={"username": "bench", "password": "pw"}
+                )
+                response.raise_for_status()
+                loginCount += 1
+
+        async def gamesLoop():
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                response = await client.get("/games")
+                response.raise_for_status()
+                gameLatencies.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*[loginLoop() for _ in range(logins)], gamesLoop())
+
+    print(f"logins in flight: {logins}, completed logins: {loginCount}")
+    print(f"/games requests: {len(gameLatencies)}")
+    print(
+        "/games latency ms: "
+        f"p50={statistics.median(gameLatencies):.1f} "
+        f"p95={percentile(gameLatencies, 95):.1f} "
+        f"p99={percentile(gameLatencies, 99):.1f} "
+        f"max={max(gameLatencies):.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--games", type=int, default=50)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ.setdefault(
+            "DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        )
+        asyncio.run(run(args.logins, args.seconds, args.games))
+
+
+if __name__ == "__main__":
+    main()
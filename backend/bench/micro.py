@@ -0,0 +1,184 @@
+# Microbenchmarks of the hot handlers, called directly (no HTTP, no threadpool)
+# against a seeded database. Times are per call in milliseconds, reported as the
+# median and interquartile range after warmup rounds; --compare uses the median.
+#
+#   cd backend && python -m bench.micro --scale small
+#   cd backend && python -m bench.micro --scale small --save      # new baseline
+#   cd backend && python -m bench.micro --scale small --compare   # vs. baseline
+#
+# "cold" variants clear the response/user caches before every call, so they
+# measure the queries; "cached" variants measure the cache-hit path.
+import argparse
+import sys
+import time
+from collections.abc import Callable
+from bench.common import benchDatabase, compareBaseline, saveBaseline, summarizeTimings
+from bench.seed import SCALES
+
+# Untimed rounds first, so connection pools, statement caches and lazily built
+# indexes (facets, leaderboards) are warm before the first sample
+WARMUP_ROUNDS = 10
+
+
+def measure(
+    call: Callable[[], object],
+    setup: Callable[[], object] | None,
+    seconds: float,
+    minRounds: int,
+    warmupRounds: int = WARMUP_ROUNDS,
+) -> list[float]:
+    for _ in range(warmupRounds):
+        if setup:
+            setup()
+        call()
+    samples: list[float] = []
+    deadline = time.perf_counter() + seconds
+    while len(samples) < minRounds or time.perf_counter() < deadline:
+        if setup:
+            setup()
+        start = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def buildBenchmarks() -> dict[str, tuple[Callable[[], object], Callable[[], object] | None]]:
+    from fastapi import Response
+    from sqlmodel import Session, func, select
+    from starlette.requests import Request
+    from db import engine
+    import main
+    import models
+
+    def request(path: str) -> Request:
+        return Request(
+            {"type": "http", "method": "GET", "path": path, "headers": [], "query_string": b""}
+        )
+
+    with Session(engine) as db:
+        busiestGameId = db.exec(
+            select(models.Game.id).order_by(models.Game.reviewCount.desc())  # type: ignore
+        ).first()
+        busiestUserId = db.exec(
+            select(models.Review.userId)
+            .group_by(models.Review.userId)
+            .order_by(func.count().desc())
+        ).first()
+        username = db.exec(
+            select(models.User.username).where(models.User.id == busiestUserId)
+        ).one()
+        firstGenreId = db.exec(select(models.Genre.id)).first()
+    token = main.createAccessToken({"sub": username})
+
+    def games(filters: models.GameFilter, sort: str = "rating"):
+        def call():
+            with Session(engine) as db:
+                main.getAllGamesInfo(
+                    db,
+                    request("/games"),
+                    Response(),
+                    filters,
+                    sort=sort,  # type: ignore
+                    limit=50,
+                    cursor=None,
+                )
+
+        return call
+
+    def gameReviews():
+        with Session(engine) as db:
+            main.getGameReviews(
+                busiestGameId,
+                db,
+                request("/reviews"),
+                Response(),
+                sort="newest",
+                limit=50,
+                cursor=None,
+            )
+
+    def userReviews():
+        with Session(engine) as db:
+            main.getUserReviews(
+                busiestUserId, db, request("/reviews"), Response(), limit=50, cursor=None
+            )
+
+    def leaderboard(board: str):
+        def call():
+            with Session(engine) as db:
+                main.getLeaderboard(
+                    board,  # type: ignore
+                    db,
+                    request("/leaderboards"),
+                    Response(),
+                    limit=50,
+                    offset=0,
+                )
+
+        return call
+
+    def currentUser():
+        with Session(engine) as db:
+            main.get_current_user(token, db)
+
+    def clearResponses():
+        main.responseCache.clear()
+
+    def clearUsers():
+        main.userCache.clear()
+
+    noFilter = models.GameFilter()
+    genreFilter = models.GameFilter(genreIds=[firstGenreId], minRating=50)  # type: ignore
+    return {
+        "getAllGamesInfo.rating.cold": (games(noFilter), clearResponses),
+        "getAllGamesInfo.name.cold": (games(noFilter, "name"), clearResponses),
+        "getAllGamesInfo.filtered.cold": (games(genreFilter), clearResponses),
+        "getAllGamesInfo.rating.cached": (games(noFilter), None),
+        "getGameReviews.busiest": (gameReviews, None),
+        "getUserReviews.busiest": (userReviews, None),
+        "getLeaderboard.top-rated.cold": (leaderboard("top-rated"), clearResponses),
+        "getLeaderboard.trending.cold": (leaderboard("trending"), clearResponses),
+        "get_current_user.cold": (currentUser, clearUsers),
+        "get_current_user.cached": (currentUser, None),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Handler microbenchmarks")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--seconds", type=float, default=1.0, help="per benchmark")
+    parser.add_argument("--min-rounds", type=int, default=20)
+    parser.add_argument("--warmup-rounds", type=int, default=WARMUP_ROUNDS)
+    parser.add_argument("--filter", default="", help="only names containing this")
+    parser.add_argument("--save", action="store_true", help="write the baseline JSON")
+    parser.add_argument("--compare", action="store_true", help="diff against the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    args = parser.parse_args()
+
+    with benchDatabase():
+        from bench.seed import prepareDatabase
+
+        counts = prepareDatabase(args.scale, args.seed)
+        results: dict[str, dict[str, float]] = {}
+        for name, (call, setup) in buildBenchmarks().items():
+            if args.filter not in name:
+                continue
+            results[name] = summarizeTimings(
+                measure(call, setup, args.seconds, args.min_rounds, args.warmup_rounds)
+            )
+            stats = results[name]
+            print(
+                f"{name:<32} median={stats['median']:>8.3f}ms iqr={stats['iqr']:>7.3f}ms "
+                f"mean={stats['mean']:>8.3f}ms n={stats['count']} outliers={stats['outliers']}"
+            )
+
+    baselineName = f"micro-{args.scale}"
+    if args.save:
+        saveBaseline(baselineName, {"scale": args.scale, "seed": args.seed, **counts}, results)
+    if args.compare and compareBaseline(baselineName, results, "median", args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
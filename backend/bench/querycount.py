@@ -0,0 +1,163 @@
+# Query-count regression check: the catalog paths must run the same number of
+# statements however many games there are, i.e. no query per game. Counts the
+# statements behind each case at every --games size (importing games in
+# between) and exits non-zero when a count grew, so an N+1 in the catalog
+# loaders shows up in CI.
+#
+#   cd backend && python -m bench.querycount
+#   cd backend && python -m bench.querycount --games 10 --games 50000
+import argparse
+import sys
+import time
+from collections.abc import Callable
+from typing import Any
+from bench.common import benchDatabase
+from bench.seed import genreNames, platformNames
+
+DEFAULT_GAME_COUNTS = [10, 10_000]
+
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+# Tops the catalog up to total games, each with a genre and two platforms
+def importGames(engine: Any, total: int):
+    from bulkimport import BulkImporter
+    import models
+
+    importer = BulkImporter(engine)
+    importer.loadExisting()
+    rows = [
+        models.GameImportRow(
+            name=f"Counted game {index}",
+            releaseYear=1985 + index % 40,
+            description="Counted.",
+            publisher=f"Publisher {index % 50}",
+            genres=[genreNames[index % len(genreNames)]],
+            platforms=[
+                platformNames[index % len(platformNames)],
+                platformNames[(index + 1) % len(platformNames)],
+            ],
+        )
+        for index in range(len(importer.gameIds), total)
+    ]
+    for start in range(0, len(rows), importer.chunkSize):
+        importer.importChunk(rows[start : start + importer.chunkSize])
+
+
+def buildCases(client: Any) -> dict[str, Callable[[], Any]]:
+    from sqlmodel import Session, select
+    from catalog import gameOutQuery, loadGameOuts
+    from db import engine
+    from pagination import MAX_PAGE_SIZE
+    import models
+
+    # A filter the first game matches, so the filtered page is never empty
+    with Session(engine) as db:
+        gameId, genreId, platformId = db.exec(
+            select(models.Game.id, models.GameGenre.genreId, models.GamePlatform.platformId)
+            .join(models.GameGenre, models.GameGenre.gameId == models.Game.id)  # type: ignore
+            .join(models.GamePlatform, models.GamePlatform.gameId == models.Game.id)  # type: ignore
+            .order_by(models.Game.id)
+        ).first()  # type: ignore
+
+    def wholeCatalog() -> Any:
+        with Session(engine) as db:
+            return loadGameOuts(db, gameOutQuery())
+
+    def get(path: str, **params: Any) -> Callable[[], Any]:
+        def call() -> Any:
+            response = client.get(path, params=params)
+            if response.status_code >= 400:
+                raise RuntimeError(f"GET {path}: {response.status_code}")
+            return response
+
+        return call
+
+    return {
+        "loadGameOuts (whole catalog)": wholeCatalog,
+        "GET /games": get("/games", limit=MAX_PAGE_SIZE),
+        "GET /games (filtered)": get(
+            "/games", genreIds=genreId, platformIds=platformId, limit=MAX_PAGE_SIZE
+        ),
+        "GET /games/{gameId}": get(f"/games/{gameId}"),
+    }
+
+
+def countStatements(
+    engine: Any, cases: dict[str, Callable[[], Any]], clearCaches: Callable[[], None]
+) -> dict[str, int]:
+    from sqlalchemy import event
+
+    counts: dict[str, int] = {}
+    for name, call in cases.items():
+        # Every call starts cold, so the queries behind the caches run too
+        clearCaches()
+        counter = StatementCounter()
+        event.listen(engine, "before_cursor_execute", counter)
+        try:
+            call()
+        finally:
+            event.remove(engine, "before_cursor_execute", counter)
+        counts[name] = counter.count
+    return counts
+
+
+def countAtSizes(gameCounts: list[int]) -> dict[int, dict[str, int]]:
+    from fastapi.testclient import TestClient
+    from db import engine
+    from similarity import similarityIndex
+    import main
+
+    def clearCaches():
+        main.responseCache.clear()
+        main.userCache.clear()
+
+    counts: dict[int, dict[str, int]] = {}
+    with TestClient(main.app) as client:
+        # The similarity table is computed in a background thread at startup;
+        # let it finish so its queries aren't counted
+        while similarityIndex.version == 0:
+            time.sleep(0.05)
+        for total in gameCounts:
+            importGames(engine, total)
+            counts[total] = countStatements(engine, buildCases(client), clearCaches)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that catalog query counts stay flat")
+    parser.add_argument(
+        "--games",
+        type=int,
+        action="append",
+        help="catalog sizes to count at (default: 10 and 10000)",
+    )
+    args = parser.parse_args()
+    gameCounts = sorted(set(args.games or DEFAULT_GAME_COUNTS))
+
+    with benchDatabase():
+        counts = countAtSizes(gameCounts)
+
+    smallest = gameCounts[0]
+    grown = []
+    print(f"{'case':<32}" + "".join(f"{total:>10}" for total in gameCounts))
+    for name in counts[smallest]:
+        row = [counts[total][name] for total in gameCounts]
+        flag = ""
+        if max(row) > row[0]:
+            grown.append(name)
+            flag = "  GREW"
+        print(f"{name:<32}" + "".join(f"{count:>10}" for count in row) + flag)
+    if grown:
+        print(f"query count grows with the catalog: {', '.join(grown)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
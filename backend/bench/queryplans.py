@@ -0,0 +1,292 @@
+# Query-plan regression check: drives the hot routes against a seeded SQLite
+# database, records every statement they run, and prints EXPLAIN QUERY PLAN for
+# each. Exits non-zero when a plan does a full table scan that isn't listed in
+# allowedScans, so an index dropped or a query rewritten past its index shows
+# up in CI rather than in production latency.
+#
+#   cd backend && python -m bench.queryplans
+#   cd backend && python -m bench.queryplans --verbose     # every plan
+#
+# Ordered index walks ("SCAN game USING INDEX ix_game_averageRating") are what
+# keyset pagination is supposed to do and pass. "USE TEMP B-TREE FOR ORDER BY"
+# means a sort of every matching row and is reported as a warning.
+import argparse
+import re
+import sys
+import time
+from collections.abc import Callable
+from typing import Any
+from bench.common import benchDatabase
+from bench.seed import BENCH_PASSWORD
+
+# Tables a route is meant to read in full, with the reason
+allowedScans: dict[str, dict[str, str]] = {
+    "GET /genres": {"genre": "returns every genre"},
+    "GET /platforms": {"platform": "returns every platform"},
+    # FacetIndex rebuilds its bitmaps from every link row after a catalog change
+    "GET /games/facets": {
+        "gamegenre": "bitmap rebuild",
+        "gameplatform": "bitmap rebuild",
+        "genre": "names for every genre bucket",
+        "platform": "names for every platform bucket",
+    },
+    "GET /leaderboards/{board}": {
+        "review": "trending window load when the leaderboards are (re)built",
+    },
+    "GET /users/me/recommendations": {
+        "review": "top-rated fallback builds the leaderboards",
+    },
+    "POST /admin/recomputeRatings": {
+        "review": "aggregates every review",
+        "game": "resets every game",
+    },
+}
+fullScan = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+# Subqueries and CTEs SQLite builds as temp tables; reading those back is a scan
+materialized = re.compile(r"^(?:MATERIALIZE|CO-ROUTINE) (\w+)$")
+tempSort = "USE TEMP B-TREE FOR ORDER BY"
+
+
+class StatementRecorder:
+    def __init__(self):
+        self.route = ""
+        self.statements: dict[tuple[str, str], Any] = {}
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if not self.route:
+            return
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "WITH")):
+            if executemany:
+                parameters = parameters[0] if parameters else ()
+            self.statements.setdefault((self.route, statement), parameters)
+
+
+def driveRoutes(recorder: StatementRecorder) -> None:
+    from fastapi.testclient import TestClient
+    from sqlmodel import Session, func, select
+    from db import engine
+    from similarity import similarityIndex
+    import main
+    import models
+
+    with Session(engine) as db:
+        busiestGameId = db.exec(
+            select(models.Game.id).order_by(models.Game.reviewCount.desc())  # type: ignore
+        ).first()
+        userId, username = db.exec(
+            select(models.Review.userId, models.User.username)
+            .join(models.User, models.User.id == models.Review.userId)  # type: ignore
+            .group_by(models.Review.userId)
+            .order_by(func.count().desc())
+        ).first()  # type: ignore
+        reviewedGameId = db.exec(
+            select(models.Review.gameId).where(models.Review.userId == userId)
+        ).first()
+        unreviewedGameId = db.exec(
+            select(models.Game.id).where(
+                models.Game.id.not_in(  # type: ignore
+                    select(models.Review.gameId).where(models.Review.userId == userId)
+                )
+            )
+        ).first()
+        otherReviewId = db.exec(
+            select(models.Review.reviewId).where(models.Review.userId != userId)
+        ).first()
+        profileId = db.exec(
+            select(models.Profile.profileId).where(models.Profile.userId == userId)
+        ).one()
+        genreId = db.exec(select(models.Genre.id)).first()
+        platformId = db.exec(select(models.Platform.id)).first()
+    main.adminUsernames.append(username)
+
+    with TestClient(main.app) as client:
+        # The similarity table is computed in a background thread at startup;
+        # let it finish so its queries aren't recorded against a route
+        while similarityIndex.version == 0:
+            time.sleep(0.05)
+
+        def call(route: str, method: str, path: str, **kwargs) -> Any:
+            # Every call starts cold, so the queries behind the caches run too
+            main.responseCache.clear()
+            main.userCache.clear()
+            recorder.route = route
+            response = client.request(method, path, headers=headers, **kwargs)
+            recorder.route = ""
+            if response.status_code >= 500:
+                raise RuntimeError(f"{method} {path}: {response.status_code}")
+            return response
+
+        headers: dict[str, str] = {}
+        token = call(
+            "POST /token",
+            "POST",
+            "/token",
+            data={"username": username, "password": BENCH_PASSWORD},
+        ).json()["access_token"]
+        headers["Authorization"] = f"Bearer {token}"
+
+        routes: list[tuple[str, str, str, dict[str, Any]]] = [
+            ("GET /users/me", "GET", "/users/me", {}),
+            ("GET /users/me/reviews", "GET", "/users/me/reviews", {}),
+            ("GET /users/me/recommendations", "GET", "/users/me/recommendations", {}),
+            ("GET /users/{userId}/reviews", "GET", f"/users/{userId}/reviews?limit=2", {}),
+            ("GET /profiles/{profileId}", "GET", f"/profiles/{profileId}", {}),
+            ("GET /games/{gameId}", "GET", f"/games/{busiestGameId}", {}),
+            ("GET /games/{gameId}/reviews", "GET", f"/games/{busiestGameId}/reviews?limit=2", {}),
+            (
+                "GET /games/{gameId}/reviews",
+                "GET",
+                f"/games/{busiestGameId}/reviews?sort=helpful&limit=2",
+                {},
+            ),
+            ("GET /games/{gameId}/similar", "GET", f"/games/{busiestGameId}/similar", {}),
+            ("GET /games/facets", "GET", f"/games/facets?genreIds={genreId}", {}),
+            ("GET /genres", "GET", "/genres", {}),
+            ("GET /leaderboards/{board}", "GET", "/leaderboards/top-rated?limit=2", {}),
+            ("GET /leaderboards/{board}", "GET", "/leaderboards/trending?limit=2", {}),
+            ("GET /platforms", "GET", "/platforms", {}),
+            ("GET /search", "GET", "/search?q=dragon&limit=2", {}),
+            ("GET /search/reviews", "GET", "/search/reviews?q=dragon&limit=2", {}),
+            (
+                "POST /users/me/reviews",
+                "POST",
+                "/users/me/reviews",
+                {"json": {"gameId": unreviewedGameId, "content": "Plans", "score": 80}},
+            ),
+            (
+                "POST /users/me/reviews (duplicate)",
+                "POST",
+                "/users/me/reviews",
+                {"json": {"gameId": reviewedGameId, "content": "Plans", "score": 80}},
+            ),
+            (
+                "PUT /users/me/reviews",
+                "PUT",
+                "/users/me/reviews",
+                {"json": {"gameId": reviewedGameId, "content": "Plans", "score": 60}},
+            ),
+            (
+                "PUT /reviews/{reviewId}/vote",
+                "PUT",
+                f"/reviews/{otherReviewId}/vote",
+                {"json": {"vote": "like"}},
+            ),
+            (
+                "PUT /reviews/{reviewId}/vote",
+                "PUT",
+                f"/reviews/{otherReviewId}/vote",
+                {"json": {"vote": "dislike"}},
+            ),
+            ("POST /admin/recomputeRatings", "POST", "/admin/recomputeRatings", {}),
+            (
+                "DELETE /reviews/{reviewId}/vote",
+                "DELETE",
+                f"/reviews/{otherReviewId}/vote",
+                {},
+            ),
+        ]
+        for sort in ("rating", "reviews", "year", "name"):
+            routes.append(("GET /games", "GET", f"/games?sort={sort}&limit=2", {}))
+        routes.append(
+            (
+                "GET /games",
+                "GET",
+                f"/games?genreIds={genreId}&platformIds={platformId}&minRating=60&limit=2",
+                {},
+            )
+        )
+
+        since = call(
+            "GET /games/{gameId}/reviews", "GET", f"/games/{reviewedGameId}/reviews?limit=2"
+        ).headers["x-changes-cursor"]
+        for route, method, path, kwargs in routes:
+            response = call(route, method, path, **kwargs)
+            # Follow the cursor once: page 2 runs the keyset WHERE clause
+            nextCursor = response.headers.get("x-next-cursor")
+            if nextCursor and method == "GET":
+                separator = "&" if "?" in path else "?"
+                call(route, method, f"{path}{separator}cursor={nextCursor}")
+
+        reviewId = call("GET /users/me/reviews", "GET", "/users/me/reviews").json()[0]["reviewId"]
+        call("GET /leaderboards/{board}", "GET", "/leaderboards/trending?limit=2")
+        call("DELETE /users/me/reviews/{reviewId}", "DELETE", f"/users/me/reviews/{reviewId}")
+        # The delete is caught up from the change log rather than rebuilt
+        call(
+            "GET /leaderboards/{board} (catch-up)", "GET", "/leaderboards/trending?limit=2"
+        )
+        # What the writes above logged for the game whose review was edited
+        call(
+            "GET /games/{gameId}/reviews/changes",
+            "GET",
+            f"/games/{reviewedGameId}/reviews/changes",
+            params={"since": since},
+        )
+
+
+def explain(connection: Any, statement: str, parameters: Any) -> list[str]:
+    rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+    return [row[3] for row in rows]
+
+
+def checkPlans(
+    recorder: StatementRecorder, verbose: bool, report: Callable[[str], None] = print
+) -> list[str]:
+    from db import engine
+
+    failures: list[str] = []
+    with engine.connect() as connection:
+        for (route, statement), parameters in recorder.statements.items():
+            plan = explain(connection, statement, parameters)
+            problems = []
+            temporary = {
+                match.group(1) for detail in plan if (match := materialized.match(detail))
+            }
+            allowed = temporary | allowedScans.get(route, {}).keys()
+            for detail in plan:
+                match = fullScan.match(detail)
+                if match and match.group(1) not in allowed:
+                    problems.append(f"full scan of {match.group(1)}")
+                elif detail == tempSort:
+                    problems.append("sorts in a temp b-tree")
+            fatal = [problem for problem in problems if problem.startswith("full scan")]
+            if fatal:
+                failures.append(f"{route}: {', '.join(fatal)}")
+            if problems or verbose:
+                label = "FAIL" if fatal else "WARN" if problems else "ok"
+                report(f"[{label}] {route}")
+                report("    " + " ".join(statement.split()))
+                for detail in plan:
+                    report(f"      {detail}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN QUERY PLAN the hot routes")
+    parser.add_argument("--scale", default="small")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args()
+
+    with benchDatabase() as url:
+        if not url.startswith("sqlite"):
+            parser.error("EXPLAIN QUERY PLAN output is SQLite's; use a sqlite DATABASE_URL")
+        from sqlalchemy import event
+        from bench.seed import prepareDatabase
+        from db import engine
+
+        prepareDatabase(args.scale, args.seed)
+        recorder = StatementRecorder()
+        event.listen(engine, "before_cursor_execute", recorder)
+        driveRoutes(recorder)
+        event.remove(engine, "before_cursor_execute", recorder)
+        failures = checkPlans(recorder, args.verbose)
+
+    print(f"{len(recorder.statements)} statements checked, {len(failures)} with full scans")
+    for failure in failures:
+        print(f"  {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+# Deterministic synthetic data: the same --scale and --seed always produce the
+# same rows, so benchmark numbers from different runs are comparable.
+#
+#   cd backend && DATABASE_URL=sqlite:///bench.db python -m bench.seed --scale medium
+#
+# Every user's password is BENCH_PASSWORD.
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import Engine, Table, insert, select
+
+SCALES = {
+    "small": {"users": 200, "games": 500, "reviewsPerUser": 10},
+    "medium": {"users": 2_000, "games": 5_000, "reviewsPerUser": 25},
+    "large": {"users": 20_000, "games": 50_000, "reviewsPerUser": 50},
+}
+BENCH_PASSWORD = "bench-password"
+INSERT_CHUNK_ROWS = 10_000
+
+genreNames = [
+    "Action", "Adventure", "RPG", "Strategy", "Simulation", "Puzzle", "Racing",
+    "Sports", "Shooter", "Platformer", "Roguelike", "Horror", "Survival", "Fighting",
+]
+platformNames = ["PC", "PlayStation 5", "Xbox Series X", "Switch", "macOS", "Linux"]
+words = (
+    "dark ancient city space island kingdom dragon robot ocean forest neon empire "
+    "shadow legend storm crystal frontier echo iron star ghost rogue quest saga"
+).split()
+
+
+def sentence(rng: random.Random, length: int) -> str:
+    return " ".join(rng.choice(words) for _ in range(length)).capitalize() + "."
+
+
+def insertChunked(engine: Engine, table: Table, rows: list[dict]):
+    for start in range(0, len(rows), INSERT_CHUNK_ROWS):
+        with engine.begin() as connection:
+            connection.execute(insert(table), rows[start : start + INSERT_CHUNK_ROWS])
+
+
+def seedDatabase(
+    engine: Engine, users: int, games: int, reviewsPerUser: int, seed: int = 1
+) -> dict[str, int]:
+    from sqlmodel import Session
+    from bulkimport import BulkImporter
+    from main import getPasswordHash
+    from ratings import recomputeRatings
+    import models
+
+    rng = random.Random(seed)
+    now = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    importer = BulkImporter(engine)
+    importer.loadExisting()
+    gameRows = [
+        models.GameImportRow(
+            name=f"{sentence(rng, 2)[:-1]} {index}",
+            releaseYear=rng.randint(1985, 2025),
+            description=sentence(rng, rng.randint(12, 40)),
+            publisher=f"Publisher {rng.randint(1, max(1, games // 20))}",
+            genres=rng.sample(genreNames, rng.randint(1, 3)),
+            platforms=rng.sample(platformNames, rng.randint(1, 4)),
+        )
+        for index in range(games)
+    ]
+    for start in range(0, len(gameRows), importer.chunkSize):
+        importer.importChunk(gameRows[start : start + importer.chunkSize])
+    with engine.connect() as connection:
+        gameIds = list(connection.scalars(select(models.Game.id)))  # type: ignore
+
+    # bcrypt is deliberately slow; every bench user shares one hash
+    passwordHash = getPasswordHash(BENCH_PASSWORD)
+    userTable: Table = models.User.__table__  # type: ignore
+    with engine.connect() as connection:
+        lastUserId = connection.scalar(
+            select(models.User.id).order_by(models.User.id.desc())  # type: ignore
+        )
+    firstUserId = (lastUserId or 0) + 1
+    userIds = list(range(firstUserId, firstUserId + users))
+    insertChunked(
+        engine,
+        userTable,
+        [
+            {
+                "id": userId,
+                "username": f"user{userId}",
+                "passwordHash": passwordHash,
+                "email": f"user{userId}@example.com",
+                "createdAt": now - timedelta(days=rng.randint(0, 1000)),
+            }
+            for userId in userIds
+        ],
+    )
+    insertChunked(
+        engine,
+        models.Profile.__table__,  # type: ignore
+        [
+            {
+                "userId": userId,
+                "bio": sentence(rng, 8),
+                "nickname": f"player{userId}",
+                "profilePictureRelativePath": "../images/profilePictures/defaultProfilePicture.jpeg",
+            }
+            for userId in userIds
+        ],
+    )
+
+    # Popularity is skewed like real catalogs: a few games get most reviews
+    weights = [1 / (rank + 1) ** 0.8 for rank in range(len(gameIds))]
+    reviewRows = []
+    for userId in userIds:
+        reviewed: set[int] = set()
+        count = min(len(gameIds), rng.randint(reviewsPerUser // 2, reviewsPerUser * 3 // 2))
+        while len(reviewed) < count:
+            reviewed.update(rng.choices(gameIds, weights, k=count - len(reviewed)))
+        for gameId in reviewed:
+            reviewRows.append(
+                {
+                    "userId": userId,
+                    "gameId": gameId,
+                    "content": sentence(rng, rng.randint(5, 60)),
+                    "score": rng.choice((20, 40, 60, 70, 80, 80, 90, 90, 100)),
+                    "likes": 0,
+                    "dislikes": 0,
+                    "createdAt": now - timedelta(minutes=rng.randint(0, 525_600)),
+                }
+            )
+    insertChunked(engine, models.Review.__table__, reviewRows)  # type: ignore
+
+    with Session(engine) as db:
+        recomputeRatings(db)
+    return {"users": users, "games": games, "reviews": len(reviewRows)}
+
+
+def prepareDatabase(scale: str, seed: int) -> dict[str, int]:
+    from db import create_db_and_tables, engine
+    from search import createSearchIndex
+    import models  # noqa: F401  (registers the tables)
+
+    create_db_and_tables()
+    createSearchIndex(engine)
+    return seedDatabase(engine, **SCALES[scale], seed=seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a database with synthetic data")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    if "DATABASE_URL" not in os.environ:
+        parser.error("set DATABASE_URL; seeding the default database.db is never wanted")
+    started = time.perf_counter()
+    counts = prepareDatabase(args.scale, args.seed)
+    print(f"seeded {counts} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
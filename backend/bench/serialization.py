@@ -0,0 +1,140 @@
+# Serialization cost of list responses, model path vs. the FastJSONResponse path,
+# for 1k- and 10k-row payloads. Rows are synthetic and already in memory, so
+# this measures only what happens between "rows fetched" and "body bytes".
+#
+#   cd backend && python -m bench.serialization
+#   cd backend && python -m bench.serialization --save
+#   cd backend && python -m bench.serialization --compare
+#
+# "model" is what the routes did before: a pydantic object per row, then
+# FastAPI's response_model validation and serialization, then JSONResponse's
+# json.dumps. "fast" is dicts straight into orjson.
+import argparse
+import asyncio
+import json
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Any
+from bench.common import compareBaseline, saveBaseline, summarizeTimings
+from bench.micro import WARMUP_ROUNDS, measure
+
+SIZES = (1_000, 10_000)
+words = ["dragon", "space", "neon", "empire", "ghost", "crystal", "rogue", "quest", "storm"]
+
+
+def gameRows(rng: random.Random, count: int) -> list[dict[str, Any]]:
+    return [
+        {
+            "id": gameId,
+            "name": f"{rng.choice(words).title()} {rng.choice(words)} {gameId}",
+            "releaseYear": rng.randint(1985, 2025),
+            "description": " ".join(rng.choices(words, k=30)).capitalize() + ".",
+            "averageRating": round(rng.uniform(0, 100), 1),
+            "reviewCount": rng.randint(0, 500),
+            "publisher": f"Publisher {rng.randint(1, 40)}",
+            "coverArtRelativePath": f"/images/{gameId:032x}.jpg",
+            "coverArtSrcset": json.dumps(
+                {str(width): f"/images/covers/{gameId:032x}-{width}.webp" for width in (320, 640)}
+            )
+            if rng.random() < 0.5
+            else None,
+            "platforms": [{"name": f"Platform {p}", "id": p} for p in rng.sample(range(1, 8), 3)],
+            "genres": [{"name": f"Genre {g}", "id": g} for g in rng.sample(range(1, 12), 2)],
+        }
+        for gameId in range(1, count + 1)
+    ]
+
+
+def reviewRows(rng: random.Random, count: int) -> list[dict[str, Any]]:
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "reviewId": reviewId,
+            "userId": rng.randint(1, 5000),
+            "gameId": rng.randint(1, 5000),
+            "content": " ".join(rng.choices(words, k=25)).capitalize() + ".",
+            "score": rng.randrange(0, 101, 10),
+            "likes": rng.randint(0, 50),
+            "dislikes": rng.randint(0, 10),
+            "profilePictureRelativePath": "../images/profilePictures/defaultProfilePicture.jpeg",
+            "nickname": f"player{reviewId}",
+            "createdAt": start + timedelta(minutes=reviewId),
+            "gameName": f"Game {reviewId % 5000}",
+        }
+        for reviewId in range(1, count + 1)
+    ]
+
+
+def buildBenchmarks(seed: int) -> dict[str, Any]:
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_model_field
+    from catalog import gameJsonRows
+    from fastjson import FastJSONResponse
+    import models
+
+    gamesField = create_model_field("Response_games", list[models.GameOut], mode="serialization")
+    reviewsField = create_model_field(
+        "Response_reviews", list[models.UserReviewOut], mode="serialization"
+    )
+
+    def modelBody(field: Any, content: list[Any]) -> bytes:
+        serialized = asyncio.run(serialize_response(field=field, response_content=content))
+        return JSONResponse(serialized).body
+
+    benchmarks: dict[str, Any] = {}
+    rng = random.Random(seed)
+    for size in SIZES:
+        games = gameRows(rng, size)
+        reviews = reviewRows(rng, size)
+        benchmarks[f"games.{size}.model"] = lambda games=games: modelBody(
+            gamesField, [models.GameOut.model_validate(row) for row in games]
+        )
+        benchmarks[f"games.{size}.fast"] = lambda games=games: FastJSONResponse(
+            gameJsonRows(games)
+        ).body
+        benchmarks[f"reviews.{size}.model"] = lambda reviews=reviews: modelBody(
+            reviewsField, [models.UserReviewOut.model_construct(**row) for row in reviews]
+        )
+        benchmarks[f"reviews.{size}.fast"] = lambda reviews=reviews: FastJSONResponse(
+            reviews
+        ).body
+    return benchmarks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List response serialization cost")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--seconds", type=float, default=1.0, help="per benchmark")
+    parser.add_argument("--min-rounds", type=int, default=5)
+    parser.add_argument("--warmup-rounds", type=int, default=WARMUP_ROUNDS)
+    parser.add_argument("--save", action="store_true", help="write the baseline JSON")
+    parser.add_argument("--compare", action="store_true", help="diff against the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    args = parser.parse_args()
+
+    results: dict[str, dict[str, float]] = {}
+    for name, call in buildBenchmarks(args.seed).items():
+        results[name] = summarizeTimings(
+            measure(call, None, args.seconds, args.min_rounds, args.warmup_rounds)
+        )
+    for size in SIZES:
+        for kind in ("games", "reviews"):
+            model = results[f"{kind}.{size}.model"]
+            fast = results[f"{kind}.{size}.fast"]
+            print(
+                f"{kind:<8} {size:>6} rows  model median={model['median']:>9.2f}ms "
+                f"(iqr {model['iqr']:.2f})  fast median={fast['median']:>8.2f}ms "
+                f"(iqr {fast['iqr']:.2f})  {model['median'] / fast['median']:>5.1f}x"
+            )
+
+    config = {"seed": args.seed, "sizes": list(SIZES)}
+    if args.save:
+        saveBaseline("serialization", config, results)
+    if args.compare and compareBaseline("serialization", results, "median", args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+# Bulk catalog import from JSON Lines or CSV.
+#
+#   cd backend && python -m bulkimport games.jsonl
+#   cd backend && python -m bulkimport games.csv --chunk-size 10000
+#
+# One row per game: name, releaseYear, description, publisher, genres, platforms
+# and optionally coverArtRelativePath. In CSV, genres/platforms are "|"-separated
+# names. Games are matched by name and updated in place; genres, platforms and
+# publishers are created as needed. Each chunk is one transaction of executemany
+# statements. The CLI is meant for an offline server; while it runs, use
+# POST /admin/games:batch so the in-process caches are invalidated.
+import argparse
+import csv
+import io
+import os
+import sys
+import time
+from collections.abc import Callable, Iterable, Iterator
+from typing import Any
+from pydantic import ValidationError
+from sqlalchemy import (
+    Connection,
+    Engine,
+    Table,
+    bindparam,
+    case,
+    delete,
+    insert,
+    null,
+    select,
+    update,
+)
+import models
+from etags import bumpVersions
+
+CHUNK_ROWS = 5000
+MAX_IMPORT_BYTES = int(os.environ.get("MAX_IMPORT_BYTES", 1024 * 1024 * 1024))
+MAX_REPORTED_ERRORS = 100
+IMPORT_FORMATS = ("jsonl", "csv")
+
+gameTable: Table = models.Game.__table__  # type: ignore
+genreTable: Table = models.Genre.__table__  # type: ignore
+platformTable: Table = models.Platform.__table__  # type: ignore
+publisherTable: Table = models.Publisher.__table__  # type: ignore
+gameGenreTable: Table = models.GameGenre.__table__  # type: ignore
+gamePlatformTable: Table = models.GamePlatform.__table__  # type: ignore
+gamePublisherTable: Table = models.GamePublisher.__table__  # type: ignore
+
+gameColumns = ("releaseYear", "description", "publisher")
+
+
+# JSON lines are yielded unparsed: pydantic parses and validates them in one go
+def readRecords(
+    lines: Iterable[str], format: str
+) -> Iterator[tuple[int, str | dict[str, str]]]:
+    if format == "csv":
+        reader = csv.DictReader(lines)
+        for record in reader:
+            # line_num is where the record ends, which is what an editor shows
+            yield reader.line_num, record
+        return
+    for lineNumber, line in enumerate(lines, start=1):
+        if line.strip():
+            yield lineNumber, line
+
+
+def parseRow(record: str | dict[str, str]) -> models.GameImportRow:
+    if isinstance(record, str):
+        return models.GameImportRow.model_validate_json(record)
+    # CSV cells hold several names separated by "|"
+    row: dict[str, Any] = {**record}
+    for column in ("genres", "platforms"):
+        row[column] = [
+            name.strip() for name in (record.get(column) or "").split("|") if name.strip()
+        ]
+    if not record.get("coverArtRelativePath"):
+        row["coverArtRelativePath"] = None
+    return models.GameImportRow.model_validate(row)
+
+
+class BulkImporter:
+    def __init__(
+        self,
+        engine: Engine,
+        chunkSize: int = CHUNK_ROWS,
+        progress: Callable[[models.ImportReport], None] | None = None,
+    ):
+        self.engine = engine
+        self.chunkSize = chunkSize
+        self.progress = progress
+        self.report = models.ImportReport()
+        self.started = time.perf_counter()
+        # name -> id for everything already in the database, so a chunk needs
+        # no per-row lookups
+        self.gameIds: dict[str, int] = {}
+        self.taxonomyIds: dict[Table, dict[str, int]] = {}
+
+    def importLines(self, lines: Iterable[str], format: str) -> models.ImportReport:
+        if format not in IMPORT_FORMATS:
+            raise ValueError(f"Unknown import format {format!r}.")
+        self.loadExisting()
+        chunk: dict[str, models.GameImportRow] = {}
+        for lineNumber, record in readRecords(lines, format):
+            self.report.rows += 1
+            try:
+                row = parseRow(record)
+            except ValidationError as error:
+                self.skip(lineNumber, error)
+                continue
+            # A name repeated inside one chunk: the later row wins
+            chunk[row.name] = row
+            if len(chunk) >= self.chunkSize:
+                self.importChunk(list(chunk.values()))
+                chunk = {}
+        if chunk:
+            self.importChunk(list(chunk.values()))
+        self.report.seconds = round(time.perf_counter() - self.started, 3)
+        return self.report
+
+    def skip(self, lineNumber: int, error: ValidationError):
+        self.report.skipped += 1
+        if len(self.report.errors) < MAX_REPORTED_ERRORS:
+            message = "; ".join(
+                f"{'.'.join(map(str, detail['loc'])) or 'row'}: {detail['msg']}"
+                for detail in error.errors()
+            )
+            self.report.errors.append(
+                models.ImportRowError(line=lineNumber, message=message)
+            )
+
+    def loadExisting(self):
+        if self.taxonomyIds:
+            return
+        with self.engine.connect() as connection:
+            self.gameIds = {
+                name: gameId
+                for gameId, name in connection.execute(
+                    select(gameTable.c.id, gameTable.c.name)
+                )
+            }
+            for table in (genreTable, platformTable, publisherTable):
+                self.taxonomyIds[table] = {
+                    name: rowId
+                    for rowId, name in connection.execute(
+                        select(table.c.id, table.c.name)
+                    )
+                }
+
+    def ensureNames(
+        self, connection: Connection, table: Table, names: set[str]
+    ) -> dict[str, int]:
+        known = self.taxonomyIds[table]
+        missing = sorted(names - known.keys())
+        if not missing:
+            return {}
+        connection.execute(insert(table), [{"name": name} for name in missing])
+        return self.idsByName(connection, table, missing)
+
+    # Plain executemany INSERT and a lookup afterwards: ordered RETURNING makes
+    # SQLite fall back to one statement per row.
+    def idsByName(
+        self, connection: Connection, table: Table, names: list[str]
+    ) -> dict[str, int]:
+        return {
+            name: rowId
+            for rowId, name in connection.execute(
+                select(table.c.id, table.c.name).where(table.c.name.in_(names))
+            )
+        }
+
+    def importChunk(self, rows: list[models.GameImportRow]):
+        with self.engine.begin() as connection:
+            newTaxonomy = {
+                genreTable: self.ensureNames(
+                    connection, genreTable, {name for row in rows for name in row.genres}
+                ),
+                platformTable: self.ensureNames(
+                    connection,
+                    platformTable,
+                    {name for row in rows for name in row.platforms},
+                ),
+                publisherTable: self.ensureNames(
+                    connection, publisherTable, {row.publisher for row in rows}
+                ),
+            }
+            genreIds = {**self.taxonomyIds[genreTable], **newTaxonomy[genreTable]}
+            platformIds = {**self.taxonomyIds[platformTable], **newTaxonomy[platformTable]}
+            publisherIds = {
+                **self.taxonomyIds[publisherTable],
+                **newTaxonomy[publisherTable],
+            }
+
+            existing = [row for row in rows if row.name in self.gameIds]
+            fresh = [row for row in rows if row.name not in self.gameIds]
+
+            if existing:
+                # executemany UPDATE: the SET clause comes from the parameter keys
+                connection.execute(
+                    update(gameTable).where(gameTable.c.id == bindparam("gameId")),
+                    [
+                        {
+                            "gameId": self.gameIds[row.name],
+                            **row.model_dump(include=set(gameColumns)),
+                        }
+                        for row in existing
+                    ],
+                )
+                withCover = [row for row in existing if row.coverArtRelativePath]
+                if withCover:
+                    # The srcset lists the variants of the old cover; SET reads the
+                    # old row, so an unchanged path keeps its variants
+                    connection.execute(
+                        update(gameTable)
+                        .where(gameTable.c.id == bindparam("gameId"))
+                        .values(
+                            coverArtRelativePath=bindparam("cover"),
+                            coverArtSrcset=case(
+                                (
+                                    gameTable.c.coverArtRelativePath == bindparam("cover"),
+                                    gameTable.c.coverArtSrcset,
+                                ),
+                                else_=null(),
+                            ),
+                        ),
+                        [
+                            {
+                                "gameId": self.gameIds[row.name],
+                                "cover": row.coverArtRelativePath,
+                            }
+                            for row in withCover
+                        ],
+                    )
+                # Links are replaced wholesale, like the row itself
+                existingIds = [self.gameIds[row.name] for row in existing]
+                for table in (gameGenreTable, gamePlatformTable, gamePublisherTable):
+                    connection.execute(delete(table).where(table.c.gameId.in_(existingIds)))
+
+            newGameIds: dict[str, int] = {}
+            if fresh:
+                defaultCover = gameTable.c.coverArtRelativePath.default.arg
+                connection.execute(
+                    insert(gameTable),
+                    [
+                        {
+                            "name": row.name,
+                            **row.model_dump(include=set(gameColumns)),
+                            "coverArtRelativePath": row.coverArtRelativePath
+                            or defaultCover,
+                        }
+                        for row in fresh
+                    ],
+                )
+                newGameIds = self.idsByName(
+                    connection, gameTable, [row.name for row in fresh]
+                )
+
+            gameIds = {
+                row.name: newGameIds.get(row.name) or self.gameIds[row.name]
+                for row in rows
+            }
+            genreLinks = {
+                (gameIds[row.name], genreIds[name]) for row in rows for name in row.genres
+            }
+            platformLinks = {
+                (gameIds[row.name], platformIds[name])
+                for row in rows
+                for name in row.platforms
+            }
+            links = [
+                (gameGenreTable, "genreId", genreLinks),
+                (gamePlatformTable, "platformId", platformLinks),
+                (
+                    gamePublisherTable,
+                    "publisherId",
+                    {(gameIds[row.name], publisherIds[row.publisher]) for row in rows},
+                ),
+            ]
+            for table, column, pairs in links:
+                if pairs:
+                    connection.execute(
+                        insert(table),
+                        [{"gameId": gameId, column: otherId} for gameId, otherId in pairs],
+                    )
+            bumpVersions(connection, ("catalog",), ("taxonomy",))
+
+        # Only remember ids once the transaction that created them has committed
+        self.gameIds.update(newGameIds)
+        for table, names in newTaxonomy.items():
+            self.taxonomyIds[table].update(names)
+        self.report.inserted += len(fresh)
+        self.report.updated += len(existing)
+        self.report.genresCreated += len(newTaxonomy[genreTable])
+        self.report.platformsCreated += len(newTaxonomy[platformTable])
+        self.report.publishersCreated += len(newTaxonomy[publisherTable])
+        self.report.seconds = round(time.perf_counter() - self.started, 3)
+        if self.progress:
+            self.progress(self.report)
+
+
+def detectFormat(fileName: str) -> str:
+    return "csv" if fileName.lower().endswith(".csv") else "jsonl"
+
+
+# Lets the importer read an ASGI request body as text lines from a worker
+# thread, without buffering the whole body.
+class ChunkReader(io.RawIOBase):
+    def __init__(self, chunks: Iterator[bytes]):
+        self.chunks = chunks
+        self.pending = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:  # type: ignore
+        while not self.pending:
+            try:
+                self.pending = next(self.chunks)
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+
+def textLines(chunks: Iterator[bytes]) -> io.TextIOWrapper:
+    return io.TextIOWrapper(
+        io.BufferedReader(ChunkReader(chunks)), encoding="utf-8-sig", newline=""
+    )
+
+
+def printProgress(report: models.ImportReport):
+    rate = report.rows / report.seconds if report.seconds else 0.0
+    print(
+        f"{report.rows} rows: {report.inserted} inserted, {report.updated} updated, "
+        f"{report.skipped} skipped ({rate:,.0f} rows/s)",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    from db import create_db_and_tables, engine
+
+    parser = argparse.ArgumentParser(description="Bulk catalog import")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=IMPORT_FORMATS)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    importer = BulkImporter(engine, args.chunk_size, printProgress)
+    with open(args.path, encoding="utf-8-sig", newline="") as source:
+        report = importer.importLines(source, args.format or detectFormat(args.path))
+    print(report.model_dump_json(indent=2))
@@ -0,0 +1,93 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+# Bounded LRU with a per-entry TTL. Keys are tuples whose first element is a
+# namespace ("games", "game", ...) so writers can drop a whole family of entries.
+# Every invalidation bumps a generation; a value loaded while it moved may
+# predate the write and is returned but not stored.
+class ResponseCache:
+    def __init__(self, maxEntries: int, ttlSeconds: float):
+        self.maxEntries = maxEntries
+        self.ttlSeconds = ttlSeconds
+        self.entries: OrderedDict[tuple[Hashable, ...], tuple[float, Any]] = (
+            OrderedDict()
+        )
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: tuple[Hashable, ...]) -> Any | None:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expiresAt, value = entry
+            if expiresAt < time.monotonic():
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    # Pass the generation read before loading value; set is skipped if an
+    # invalidation happened since
+    def set(self, key: tuple[Hashable, ...], value: Any, generation: int | None = None):
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.entries[key] = (time.monotonic() + self.ttlSeconds, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxEntries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def getOrLoad(self, key: tuple[Hashable, ...], loader: Callable[[], T]) -> T:
+        generation = self.generation
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            self.set(key, value, generation)
+        return value
+
+    # invalidate("games") drops every key in the namespace,
+    # invalidate("game", 5) only keys starting with ("game", 5)
+    def invalidate(self, *prefix: Hashable):
+        with self.lock:
+            self.generation += 1
+            stale = [key for key in self.entries if key[: len(prefix)] == prefix]
+            for key in stale:
+                del self.entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.invalidations += len(self.entries)
+            self.entries.clear()
+
+    def stats(self) -> dict[str, Any]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "maxEntries": self.maxEntries,
+                "ttlSeconds": self.ttlSeconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRatio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,110 @@
+from collections import defaultdict
+from typing import Any
+from sqlmodel import Session, select
+from fastjson import rawJson
+import models
+
+# GameOut's fields, in order, as plain columns
+gameOutColumns = (
+    models.Game.id,
+    models.Game.name,
+    models.Game.releaseYear,
+    models.Game.description,
+    models.Game.averageRating,
+    models.Game.reviewCount,
+    models.Game.publisher,
+    models.Game.coverArtRelativePath,
+    models.Game.coverArtSrcset,
+)
+
+
+def gameOutQuery() -> Any:
+    return select(*gameOutColumns)
+
+
+# GameOut-shaped dicts built from plain tuples, no ORM objects. Constant number
+# of queries regardless of catalog size: games, platforms, genres.
+# coverArtSrcset is left as the stored JSON text.
+def loadGameRows(db: Session, gamesQuery: Any) -> list[dict[str, Any]]:
+    games = db.exec(gamesQuery).all()
+    if not games:
+        return []
+    gameIdsQuery = gamesQuery.with_only_columns(models.Game.id)  # type: ignore
+
+    platformsByGame: dict[int, list[dict[str, Any]]] = defaultdict(list)
+    platformRows = db.exec(
+        select(models.GamePlatform.gameId, models.Platform.id, models.Platform.name)
+        .join(models.Platform, models.Platform.id == models.GamePlatform.platformId)  # type: ignore
+        .where(models.GamePlatform.gameId.in_(gameIdsQuery))  # type: ignore
+    ).all()
+    for gameId, platformId, name in platformRows:
+        platformsByGame[gameId].append({"name": name, "id": platformId})
+
+    genresByGame: dict[int, list[dict[str, Any]]] = defaultdict(list)
+    genreRows = db.exec(
+        select(models.GameGenre.gameId, models.Genre.id, models.Genre.name)
+        .join(models.Genre, models.Genre.id == models.GameGenre.genreId)  # type: ignore
+        .where(models.GameGenre.gameId.in_(gameIdsQuery))  # type: ignore
+    ).all()
+    for gameId, genreId, name in genreRows:
+        genresByGame[gameId].append({"name": name, "id": genreId})
+
+    return [
+        {
+            **game._mapping,
+            "platforms": platformsByGame.get(game.id, []),
+            "genres": genresByGame.get(game.id, []),
+        }
+        for game in games
+    ]
+
+
+def loadGameOuts(db: Session, gamesQuery: Any) -> list[models.GameOut]:
+    return [models.GameOut.model_validate(row) for row in loadGameRows(db, gamesQuery)]
+
+
+# For FastJSONResponse: the srcset column is already JSON, so embed it as-is
+def gameJsonRows(rows: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    return [{**row, "coverArtSrcset": rawJson(row["coverArtSrcset"])} for row in rows]
+
+
+# sort key -> (column, descending); every column here has an index on Game
+gameSorts: dict[str, tuple[Any, bool]] = {
+    "rating": (models.Game.averageRating, True),
+    "reviews": (models.Game.reviewCount, True),
+    "year": (models.Game.releaseYear, True),
+    "name": (models.Game.name, False),
+}
+
+
+def gameSortKey(sort: str, game: dict[str, Any]) -> tuple[Any, int]:
+    column, _ = gameSorts[sort]
+    return game[column.key], game["id"]
+
+
+def applyGameFilter(gamesQuery: Any, gameFilter: models.GameFilter) -> Any:
+    if gameFilter.genreIds:
+        gamesQuery = gamesQuery.where(
+            models.Game.id.in_(  # type: ignore
+                select(models.GameGenre.gameId).where(
+                    models.GameGenre.genreId.in_(gameFilter.genreIds)  # type: ignore
+                )
+            )
+        )
+    if gameFilter.platformIds:
+        gamesQuery = gamesQuery.where(
+            models.Game.id.in_(  # type: ignore
+                select(models.GamePlatform.gameId).where(
+                    models.GamePlatform.platformId.in_(gameFilter.platformIds)  # type: ignore
+                )
+            )
+        )
+    if gameFilter.yearFrom is not None:
+        gamesQuery = gamesQuery.where(models.Game.releaseYear >= gameFilter.yearFrom)
+    if gameFilter.yearTo is not None:
+        gamesQuery = gamesQuery.where(models.Game.releaseYear <= gameFilter.yearTo)
+    if gameFilter.minRating is not None:
+        gamesQuery = gamesQuery.where(models.Game.averageRating >= gameFilter.minRating)
+    if gameFilter.minReviews is not None:
+        gamesQuery = gamesQuery.where(models.Game.reviewCount >= gameFilter.minReviews)
+    return gamesQuery
@@ -0,0 +1,228 @@
+import gzip
+import os
+import threading
+import zlib
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Smaller bodies don't shrink enough to pay for the header and the CPU
+COMPRESSION_MIN_BYTES = int(os.environ.get("COMPRESSION_MIN_BYTES", "1024"))
+# Bodies above this are compressed in a worker thread instead of on the event loop
+COMPRESSION_THREAD_BYTES = int(os.environ.get("COMPRESSION_THREAD_BYTES", "65536"))
+
+# Per request: fast settings. Precompressed cache entries are compressed once and
+# then served many times, so they can afford the slower, smaller settings.
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+PRECOMPRESSED_GZIP_LEVEL = 9
+PRECOMPRESSED_BROTLI_QUALITY = 9
+
+supportedEncodings = ("br", "gzip") if brotli is not None else ("gzip",)
+compressibleTypes = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+# Event streams must reach the client as they are written, not when a compressor
+# decides to flush
+uncompressibleTypes = ("text/event-stream",)
+
+
+# Picks the coding with the highest q-value; on a tie the earlier entry of
+# available (smaller output) wins. None means send it as is. available defaults
+# to what this process can compress; files precompressed on disk pass their own.
+def negotiateEncoding(
+    acceptEncoding: str | None, available: tuple[str, ...] = supportedEncodings
+) -> str | None:
+    if not acceptEncoding:
+        return None
+    weights: dict[str, float] = {}
+    for part in acceptEncoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+    best: str | None = None
+    bestWeight = 0.0
+    for coding in available:
+        weight = weights.get(coding, weights.get("*", 0.0))
+        if weight > bestWeight:
+            best, bestWeight = coding, weight
+    return best
+
+
+def compress(body: bytes, encoding: str, precompressed: bool = False) -> bytes:
+    if encoding == "br":
+        quality = PRECOMPRESSED_BROTLI_QUALITY if precompressed else BROTLI_QUALITY
+        return brotli.compress(body, quality=quality)  # type: ignore
+    level = PRECOMPRESSED_GZIP_LEVEL if precompressed else GZIP_LEVEL
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def isCompressible(headers: Headers) -> bool:
+    contentType = headers.get("content-type", "")
+    return (
+        "content-encoding" not in headers
+        and contentType.startswith(compressibleTypes)
+        and not contentType.startswith(uncompressibleTypes)
+    )
+
+
+# A strong ETag promises byte-identical bodies, which no longer holds once the
+# same resource goes out in several codings. If-None-Match compares weakly
+# (etags.etagMatches), so revalidation keeps working.
+def weakenETag(headers: MutableHeaders):
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        headers["etag"] = "W/" + etag
+
+
+def addVary(headers: MutableHeaders):
+    vary = headers.get("vary")
+    if not vary:
+        headers["vary"] = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower():
+        headers["vary"] = vary + ", Accept-Encoding"
+
+
+# A cached body plus each coding of it, compressed on first use and kept for the
+# lifetime of the cache entry
+class PrecompressedBody:
+    def __init__(self, identity: bytes):
+        self.identity = identity
+        self.encoded: dict[str, bytes] = {}
+        self.lock = threading.Lock()
+
+    def get(self, encoding: str | None) -> bytes:
+        if encoding is None:
+            return self.identity
+        with self.lock:
+            if encoding not in self.encoded:
+                self.encoded[encoding] = compress(self.identity, encoding, precompressed=True)
+            return self.encoded[encoding]
+
+
+# For handlers serving a PrecompressedBody: negotiates the coding, sets the
+# headers on the injected response and returns the bytes to send. The
+# middleware leaves responses that already have a Content-Encoding alone.
+def negotiatedBody(request: Request, response: Response, body: PrecompressedBody) -> bytes:
+    if len(body.identity) < COMPRESSION_MIN_BYTES:
+        return body.identity
+    addVary(response.headers)
+    encoding = negotiateEncoding(request.headers.get("accept-encoding"))
+    if encoding is None:
+        return body.identity
+    response.headers["content-encoding"] = encoding
+    weakenETag(response.headers)
+    return body.get(encoding)
+
+
+class StreamCompressor:
+    def __init__(self, encoding: str):
+        self.brotli = encoding == "br"
+        if self.brotli:
+            self.compressor = brotli.Compressor(quality=BROTLI_QUALITY)  # type: ignore
+        else:
+            # wbits 31: a gzip container rather than raw zlib
+            self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def process(self, chunk: bytes) -> bytes:
+        if self.brotli:
+            return self.compressor.process(chunk)
+        return self.compressor.compress(chunk)
+
+    def finish(self) -> bytes:
+        if self.brotli:
+            return self.compressor.finish()
+        return self.compressor.flush()
+
+
+# Compresses JSON/text responses of at least minimumSize bytes. Whole bodies
+# above threadSize go to a worker thread; streamed bodies are compressed chunk
+# by chunk as they pass.
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimumSize: int = COMPRESSION_MIN_BYTES,
+        threadSize: int = COMPRESSION_THREAD_BYTES,
+    ):
+        self.app = app
+        self.minimumSize = minimumSize
+        self.threadSize = threadSize
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiateEncoding(Headers(scope=scope).get("accept-encoding"))
+        start: Message | None = None
+        streamer: StreamCompressor | None = None
+        passthrough = False
+
+        async def compressingSend(message: Message):
+            nonlocal start, streamer, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                passthrough = not isCompressible(Headers(raw=message["headers"]))
+                if passthrough:
+                    await send(message)
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+            assert start is not None
+            body = message.get("body", b"")
+            moreBody = message.get("more_body", False)
+            headers = MutableHeaders(raw=start["headers"])
+
+            if streamer is not None:
+                chunk = streamer.process(body)
+                if not moreBody:
+                    chunk += streamer.finish()
+                await send({**message, "body": chunk})
+                return
+
+            passthrough = True
+            if not moreBody and len(body) < self.minimumSize:
+                await send(start)
+                await send(message)
+                return
+            addVary(headers)
+            if encoding is None:
+                await send(start)
+                await send(message)
+                return
+            headers["content-encoding"] = encoding
+            weakenETag(headers)
+            if moreBody:
+                passthrough = False
+                streamer = StreamCompressor(encoding)
+                del headers["content-length"]
+                await send(start)
+                await send({**message, "body": streamer.process(body)})
+                return
+            if len(body) > self.threadSize:
+                compressed = await anyio.to_thread.run_sync(compress, body, encoding)
+            else:
+                compressed = compress(body, encoding)
+            headers["content-length"] = str(len(compressed))
+            await send(start)
+            await send({**message, "body": compressed})
+
+        await self.app(scope, receive, compressingSend)
@@ -0,0 +1,120 @@
+# Removes duplicate reviews from databases created before reviews were unique per
+# user and game (the old check-then-insert race). Startup refuses to build
+# ux_review_userId_gameId while duplicates exist; run this against the stopped
+# server, review what it would remove, then delete.
+#
+#   cd backend && python -m dedupereviews
+#   cd backend && python -m dedupereviews --export duplicates.jsonl
+#   cd backend && python -m dedupereviews --delete
+#
+# The newest review of each (userId, gameId) pair is kept. The others are deleted
+# together with their votes, logged to the ReviewChange log and the ratings are
+# recomputed from the remaining reviews.
+import argparse
+import json
+from typing import Any
+from sqlalchemy import Connection, Engine, delete, func, select
+from sqlmodel import Session
+import models
+from etags import bumpVersions
+from ratings import recomputeRatings
+from reviewchanges import recordReviewChanges
+
+
+# Every review that isn't the newest of its pair, with the reviewId that is kept
+def findDuplicateReviews(connection: Connection) -> list[dict[str, Any]]:
+    kept = (
+        select(
+            models.Review.userId,
+            models.Review.gameId,
+            func.max(models.Review.reviewId).label("keptReviewId"),
+        )
+        .group_by(models.Review.userId, models.Review.gameId)
+        .having(func.count() > 1)
+        .subquery()
+    )
+    rows = connection.execute(
+        select(
+            models.Review.reviewId,
+            models.Review.userId,
+            models.Review.gameId,
+            models.Review.score,
+            models.Review.likes,
+            models.Review.dislikes,
+            models.Review.createdAt,
+            models.Review.content,
+            kept.c.keptReviewId,
+        )
+        .join(
+            kept,
+            (kept.c.userId == models.Review.userId)
+            & (kept.c.gameId == models.Review.gameId),
+        )
+        .where(models.Review.reviewId != kept.c.keptReviewId)
+        .order_by(models.Review.userId, models.Review.gameId, models.Review.reviewId)
+    ).all()
+    return [row._asdict() for row in rows]
+
+
+def deleteDuplicateReviews(engine: Engine, duplicates: list[dict[str, Any]]) -> int:
+    reviewIds = [duplicate["reviewId"] for duplicate in duplicates]
+    if not reviewIds:
+        return 0
+    with engine.begin() as connection:
+        connection.execute(
+            delete(models.ReviewVote).where(models.ReviewVote.reviewId.in_(reviewIds))  # type: ignore
+        )
+        result = connection.execute(
+            delete(models.Review).where(models.Review.reviewId.in_(reviewIds))  # type: ignore
+        )
+        recordReviewChanges(
+            connection,
+            [(duplicate["gameId"], duplicate["reviewId"]) for duplicate in duplicates],
+        )
+        bumpVersions(
+            connection,
+            *[("game", duplicate["gameId"]) for duplicate in duplicates],
+            *[("userReviews", duplicate["userId"]) for duplicate in duplicates],
+        )
+    with Session(engine) as db:
+        recomputeRatings(db)
+    return result.rowcount  # type: ignore
+
+
+def printDuplicates(duplicates: list[dict[str, Any]]):
+    print(f"{'reviewId':>10} {'userId':>8} {'gameId':>8} {'keeps':>10}  createdAt")
+    for duplicate in duplicates:
+        print(
+            f"{duplicate['reviewId']:>10} {duplicate['userId']:>8} "
+            f"{duplicate['gameId']:>8} {duplicate['keptReviewId']:>10}  "
+            f"{duplicate['createdAt']}"
+        )
+    print(f"{len(duplicates)} duplicate reviews")
+
+
+if __name__ == "__main__":
+    from sqlmodel import SQLModel
+    from db import add_missing_columns, create_db_and_tables, engine
+
+    parser = argparse.ArgumentParser(description="Remove duplicate reviews")
+    parser.add_argument("--export", metavar="PATH", help="write the duplicates as JSON Lines")
+    parser.add_argument(
+        "--delete", action="store_true", help="delete the duplicates and their votes"
+    )
+    args = parser.parse_args()
+
+    # Tables and columns only: the unique review index can't exist yet
+    add_missing_columns()
+    SQLModel.metadata.create_all(engine)
+    with engine.connect() as connection:
+        duplicates = findDuplicateReviews(connection)
+    printDuplicates(duplicates)
+    if args.export:
+        with open(args.export, "w", encoding="utf-8") as target:
+            for duplicate in duplicates:
+                target.write(json.dumps(duplicate, default=str) + "\n")
+        print(f"exported to {args.export}")
+    if args.delete:
+        removed = deleteDuplicateReviews(engine, duplicates)
+        create_db_and_tables()
+        print(f"deleted {removed} reviews")
@@ -0,0 +1,145 @@
+import secrets
+import uuid
+from typing import Any, Hashable
+from fastapi import Request, Response
+from sqlalchemy import Connection, Engine, and_, func, insert, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+import models
+
+CATALOG_CACHE_CONTROL = "public, max-age=15, must-revalidate"
+REVIEWS_CACHE_CONTROL = "public, no-cache"
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+# Leaderboards and the similarity table are per-process and number their own
+# versions; ETags built from those include the boot id, so one worker's version 3
+# never matches another's.
+bootId = uuid.uuid4().hex[:12]
+
+# The versions themselves are DataVersion rows, bumped in the same transaction as
+# the write, so writes from other workers, bulkimport and staticimages move them
+# too. A random database id leads every tag, so a recreated database.db can't
+# reissue an ETag handed out for the old one.
+DATABASE_ID_SCOPE = "database"
+
+VersionKey = tuple[str] | tuple[str, int]
+
+
+def versionKey(key: VersionKey) -> tuple[str, int]:
+    return key[0], key[1] if len(key) > 1 else 0  # type: ignore
+
+
+# bumpVersions(db, ("catalog",), ("game", 5)); call before the write commits
+def bumpVersions(db: Session | Connection, *keys: VersionKey):
+    # Sorted, so concurrent writers take the row locks in the same order
+    rows = [
+        {"scope": scope, "key": key, "version": 1}
+        for scope, key in sorted(set(map(versionKey, keys)))
+    ]
+    if not rows:
+        return
+    table = models.DataVersion.__table__  # type: ignore
+    bind = db.get_bind() if isinstance(db, Session) else db
+    dialects = {"sqlite": sqlite, "postgresql": postgresql}
+    if bind.dialect.name in dialects:
+        statement = dialects[bind.dialect.name].insert(table)
+        db.execute(
+            statement.on_conflict_do_update(
+                index_elements=["scope", "key"], set_={"version": table.c.version + 1}
+            ),
+            rows,
+        )
+        return
+    for row in rows:
+        updated = db.execute(
+            update(table)
+            .where(table.c.scope == row["scope"], table.c.key == row["key"])
+            .values(version=table.c.version + 1)
+        )
+        if not updated.rowcount:  # type: ignore
+            db.execute(insert(table).values(**row))
+
+
+# The database id followed by the given versions, e.g.
+# readVersions(db, ("taxonomy",), ("game", 5)). A version never bumped reads as 0.
+def readVersions(db: Session, *keys: VersionKey) -> list[int]:
+    wanted = [(DATABASE_ID_SCOPE, 0), *map(versionKey, keys)]
+    table = models.DataVersion.__table__  # type: ignore
+    found = {
+        (scope, key): version
+        for scope, key, version in db.execute(
+            select(table.c.scope, table.c.key, table.c.version).where(
+                or_(
+                    *(
+                        and_(table.c.scope == scope, table.c.key == key)
+                        for scope, key in set(wanted)
+                    )
+                )
+            )
+        )
+    }
+    return [found.get(key, 0) for key in wanted]
+
+
+# The same joined into one ETag part
+def versionTag(db: Session, *keys: VersionKey) -> str:
+    return "-".join(map(str, readVersions(db, *keys)))
+
+
+# Sum of the versions of the scope's keys that keysQuery selects, e.g. the games
+# on one page: a bump to any of them moves it. Only meaningful next to a version
+# that covers which keys keysQuery selects.
+def versionSum(db: Session, scope: str, keysQuery: Any) -> int:
+    table = models.DataVersion.__table__  # type: ignore
+    return db.execute(
+        select(func.coalesce(func.sum(table.c.version), 0)).where(
+            table.c.scope == scope, table.c.key.in_(keysQuery)
+        )
+    ).scalar_one()
+
+
+def ensureDatabaseId(engine: Engine):
+    table = models.DataVersion.__table__  # type: ignore
+    try:
+        with engine.begin() as connection:
+            exists = connection.scalar(
+                select(table.c.version).where(table.c.scope == DATABASE_ID_SCOPE)
+            )
+            if exists is None:
+                connection.execute(
+                    insert(table).values(
+                        scope=DATABASE_ID_SCOPE, key=0, version=secrets.randbelow(2**31) + 1
+                    )
+                )
+    except IntegrityError:
+        pass  # another worker created it first
+
+
+def makeETag(*parts: Hashable) -> str:
+    return '"' + "-".join(map(str, parts)) + '"'
+
+
+def etagMatches(ifNoneMatch: str | None, etag: str) -> bool:
+    if not ifNoneMatch:
+        return False
+    if ifNoneMatch.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so W/"x" matches "x"
+    candidates = (candidate.strip() for candidate in ifNoneMatch.split(","))
+    return etag in (candidate.removeprefix("W/") for candidate in candidates)
+
+
+# Call before loading anything: a 304 skips the query and the serialization.
+# Reading the version first means a write racing with the load can only make the
+# body newer than its ETag, which costs one extra 200 later, never a stale 304.
+def notModified(
+    request: Request, response: Response, etag: str, cacheControl: str
+) -> Response | None:
+    if etagMatches(request.headers.get("if-none-match"), etag):
+        return Response(
+            status_code=304, headers={"ETag": etag, "Cache-Control": cacheControl}
+        )
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cacheControl
+    return None
@@ -0,0 +1,37 @@
+from typing import Any
+import orjson
+from fastapi.responses import Response
+
+# UTC datetimes come out as "...Z", matching pydantic's JSON output
+ORJSON_OPTIONS = orjson.OPT_UTC_Z
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+
+# A column that already holds JSON text is embedded as-is instead of being
+# parsed and re-encoded
+def rawJson(value: str | None, default: str = "{}") -> orjson.Fragment:
+    return orjson.Fragment(value or default)
+
+
+# The opt-in fast path for list routes: the handler builds plain dicts straight
+# from SQL rows and returns this response. FastAPI then skips response_model
+# validation and serialization entirely; response_model stays on the route for
+# the OpenAPI schema. Rows must already have exactly the response_model fields.
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+
+# Handlers set ETag/Cache-Control/cursor headers on the injected Response, which
+# FastAPI ignores once a handler returns its own response; carry them over.
+def fastJsonResponse(content: Any, response: Response) -> FastJSONResponse:
+    fast = FastJSONResponse(content, status_code=response.status_code or 200)
+    fast.headers.raw.extend(response.headers.raw)
+    return fast
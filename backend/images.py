@@ -0,0 +1,146 @@
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, TypeVar
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+COVER_WIDTHS = (160, 320, 640, 1280)
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+AVIF_QUALITY = 60
+# Decompression-bomb guard: 40 megapixels is far beyond any cover art
+MAX_IMAGE_PIXELS = 40_000_000
+IMAGE_WORKERS = max(1, min(2, (os.cpu_count() or 1) - 1))
+
+T = TypeVar("T")
+
+
+class InvalidImageError(ValueError):
+    pass
+
+
+def decodeImage(sourcePath: str) -> Image.Image:
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    try:
+        with Image.open(sourcePath) as image:
+            if image.format not in ("JPEG", "PNG"):
+                raise InvalidImageError(f"Unsupported image format {image.format}.")
+            # load() decodes every pixel, so truncated or corrupt files fail here
+            image.load()
+            return ImageOps.exif_transpose(image).convert("RGB")
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as error:
+        raise InvalidImageError("Could not decode image.") from error
+
+
+def validateImage(sourcePath: str) -> tuple[int, int]:
+    return decodeImage(sourcePath).size
+
+
+# Files are named after their own content, so a URL always means the same bytes
+# and can be cached forever; identical variants are written once.
+def contentAddressedName(data: bytes, extension: str) -> str:
+    return f"{hashlib.sha256(data).hexdigest()[:32]}.{extension}"
+
+
+def writeContentAddressed(data: bytes, outputDir: str, extension: str) -> str:
+    fileName = contentAddressedName(data, extension)
+    finalPath = os.path.join(outputDir, fileName)
+    if not os.path.exists(finalPath):
+        tempPath = os.path.join(outputDir, f".{fileName}.{os.getpid()}.tmp")
+        with open(tempPath, "wb") as output:
+            output.write(data)
+        os.replace(tempPath, finalPath)
+    return fileName
+
+
+# Runs in a worker process. Writes a content-addressed file into outputDir per
+# format for every width up to the original size; re-encoding drops
+# EXIF/ICC/XMP metadata. Returns {format: [(fileName, width), ...]}, largest first.
+def generateCoverVariants(
+    sourcePath: str, outputDir: str
+) -> dict[str, list[tuple[str, int]]]:
+    image = decodeImage(sourcePath)
+    os.makedirs(outputDir, exist_ok=True)
+    widths = [width for width in COVER_WIDTHS if width < image.width] + [image.width]
+    formats = {
+        "jpeg": {"quality": JPEG_QUALITY, "optimize": True, "progressive": True},
+        "webp": {"quality": WEBP_QUALITY, "method": 4},
+    }
+    if features.check("avif"):
+        formats["avif"] = {"quality": AVIF_QUALITY}
+    variants: dict[str, list[tuple[str, int]]] = {fmt: [] for fmt in formats}
+    for width in sorted(set(widths), reverse=True):
+        height = max(1, round(image.height * width / image.width))
+        resized = (
+            image
+            if width == image.width
+            else image.resize((width, height), Image.Resampling.LANCZOS)
+        )
+        for fmt, options in formats.items():
+            encoded = io.BytesIO()
+            resized.save(encoded, format=fmt.upper(), **options)
+            fileName = writeContentAddressed(encoded.getvalue(), outputDir, fmt)
+            variants[fmt].append((fileName, width))
+    return variants
+
+
+def toSrcset(urlPrefix: str, variants: dict[str, list[tuple[str, int]]]) -> dict[str, str]:
+    return {
+        fmt: ", ".join(f"{urlPrefix}/{fileName} {width}w" for fileName, width in files)
+        for fmt, files in variants.items()
+    }
+
+
+_pool: ProcessPoolExecutor | None = None
+_poolLock = threading.Lock()
+
+
+# spawn, not fork: the server process has live threads and DB connections
+def imagePool() -> ProcessPoolExecutor:
+    global _pool
+    with _poolLock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=IMAGE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+# A worker that dies (out of memory on a hostile file, killed) breaks the whole
+# pool for good. Callers that saw the same broken pool replace it only once.
+def replaceBrokenPool(broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+    global _pool
+    with _poolLock:
+        if _pool is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+    return imagePool()
+
+
+def submitImageJob(fn: Callable[..., T], *args: Any) -> Future[T]:
+    pool = imagePool()
+    try:
+        return pool.submit(fn, *args)
+    except BrokenProcessPool:
+        return replaceBrokenPool(pool).submit(fn, *args)
+
+
+# Lets queued variant jobs finish (their callbacks store the results), then
+# stops the workers
+def shutdownImagePool():
+    global _pool
+    with _poolLock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+
+def submitCoverVariants(
+    sourcePath: str, outputDir: str
+) -> Future[dict[str, list[tuple[str, int]]]]:
+    return submitImageJob(generateCoverVariants, sourcePath, outputDir)
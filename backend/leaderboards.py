@@ -0,0 +1,283 @@
+import heapq
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime, timezone
+from typing import Literal
+from sqlalchemy import func, or_
+from sqlmodel import Session, select
+import models
+from etags import readVersions
+
+LeaderboardName = Literal["top-rated", "most-reviewed", "trending"]
+
+# Weight of the prior in the Bayesian average, in reviews: a game needs about
+# this many reviews before its own mean counts as much as the catalog mean
+PRIOR_REVIEWS = float(os.environ.get("LEADERBOARD_PRIOR_REVIEWS", "10"))
+TRENDING_WINDOW_SECONDS = float(os.environ.get("TRENDING_WINDOW_HOURS", "168")) * 3600
+# The prior mean is held fixed between rebuilds so that one review only moves
+# one game; once the catalog mean has drifted this far, every game is re-ranked
+PRIOR_DRIFT = 1.0
+# How much of the review change log is re-read on every catch-up, see catchUp
+SETTLE_SECONDS = 60.0
+
+
+def timestamp(moment: datetime) -> float:
+    # SQLite hands datetimes back naive; they are stored in UTC
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+# Game ids kept sorted by descending score (ties by id), so the top k is a slice
+# and moving one game is a bisect plus a list insert
+class RankedList:
+    def __init__(self):
+        self.keys: list[tuple[float, int]] = []
+        self.keyOf: dict[int, tuple[float, int]] = {}
+
+    def set(self, gameId: int, score: float | None):
+        old = self.keyOf.pop(gameId, None)
+        if old is not None:
+            del self.keys[bisect_left(self.keys, old)]
+        if score is not None:
+            key = (-score, gameId)
+            insort(self.keys, key)
+            self.keyOf[gameId] = key
+
+    def reset(self, scores: dict[int, float]):
+        self.keyOf = {gameId: (-score, gameId) for gameId, score in scores.items()}
+        self.keys = sorted(self.keyOf.values())
+
+    def top(self, offset: int, limit: int) -> list[tuple[int, float]]:
+        return [(gameId, -score) for score, gameId in self.keys[offset : offset + limit]]
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+# Top-rated (Bayesian average), most-reviewed and trending (reviews inside the
+# sliding window), built from SQL and then brought up to date from the
+# DataVersion rows and the review change log on every read, so reviews written
+# by other processes and the CLIs are ranked too. Catching up is idempotent:
+# game stats and trending entries are re-read from the database, keyed by
+# gameId and reviewId, so a change read twice is neither lost nor counted twice.
+class Leaderboards:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (databaseId, catalog version) the lists were built at, the ratings
+        # version and last logged change they were caught up to, and when
+        self.builtVersions: tuple[int, int] | None = None
+        self.ratingsVersion = 0
+        self.lastChangeId = 0
+        self.syncedAt = 0.0
+        self.stats: dict[int, tuple[int, int]] = {}
+        self.totalScore = 0
+        self.totalReviews = 0
+        self.priorMean = 0.0
+        self.topRated = RankedList()
+        self.mostReviewed = RankedList()
+        self.trending = RankedList()
+        self.trendingCounts: dict[int, int] = {}
+        self.windowReviews: dict[int, tuple[int, float]] = {}
+        self.windowExpiry: list[tuple[float, int]] = []
+
+    def build(self, db: Session):
+        # Read first: a change logged while the lists load is replayed by the
+        # next catch-up, which is harmless
+        self.lastChangeId = (
+            db.exec(select(func.max(models.ReviewChange.changeId))).one() or 0
+        )
+        rows = db.exec(
+            select(models.Game.id, models.Game.scoreSum, models.Game.reviewCount).where(
+                models.Game.reviewCount > 0
+            )
+        ).all()
+        self.stats = {
+            gameId: (scoreSum, reviewCount)  # type: ignore
+            for gameId, scoreSum, reviewCount in rows
+        }
+        self.totalScore = sum(scoreSum for scoreSum, _ in self.stats.values())
+        self.totalReviews = sum(reviewCount for _, reviewCount in self.stats.values())
+        self.rerank()
+
+        since = datetime.fromtimestamp(time.time() - TRENDING_WINDOW_SECONDS, timezone.utc)
+        recent = db.exec(
+            select(
+                models.Review.reviewId, models.Review.gameId, models.Review.createdAt
+            ).where(models.Review.createdAt >= since)
+        ).all()
+        self.windowReviews = {
+            reviewId: (gameId, timestamp(createdAt))  # type: ignore
+            for reviewId, gameId, createdAt in recent
+        }
+        self.windowExpiry = [
+            (createdAt + TRENDING_WINDOW_SECONDS, reviewId)
+            for reviewId, (_, createdAt) in self.windowReviews.items()
+        ]
+        heapq.heapify(self.windowExpiry)
+        self.trendingCounts = {}
+        for gameId, _ in self.windowReviews.values():
+            self.trendingCounts[gameId] = self.trendingCounts.get(gameId, 0) + 1
+        self.trending.reset(
+            {gameId: float(count) for gameId, count in self.trendingCounts.items()}
+        )
+
+    def bayesian(self, scoreSum: int, reviewCount: int) -> float:
+        return (PRIOR_REVIEWS * self.priorMean + scoreSum) / (PRIOR_REVIEWS + reviewCount)
+
+    def rerank(self):
+        self.priorMean = self.totalScore / self.totalReviews if self.totalReviews else 0.0
+        self.topRated.reset(
+            {gameId: self.bayesian(*stats) for gameId, stats in self.stats.items()}
+        )
+        self.mostReviewed.reset(
+            {gameId: float(reviewCount) for gameId, (_, reviewCount) in self.stats.items()}
+        )
+
+    # False when changes after lastChangeId may have been pruned from the log
+    def logCovers(self, db: Session) -> bool:
+        oldest = db.exec(select(func.min(models.ReviewChange.changeId))).one()
+        return oldest is not None and oldest <= self.lastChangeId + 1
+
+    # Replays the review change log since the last sync. Changes are logged
+    # with the time they were written rather than committed, and PostgreSQL
+    # hands out ids before commit, so a lower changeId can become visible after
+    # a higher one; the last SETTLE_SECONDS are re-read to pick those up.
+    def catchUp(self, db: Session):
+        since = datetime.fromtimestamp(self.syncedAt - SETTLE_SECONDS, timezone.utc)
+        changes = db.exec(
+            select(
+                models.ReviewChange.changeId,
+                models.ReviewChange.gameId,
+                models.ReviewChange.reviewId,
+            ).where(
+                or_(
+                    models.ReviewChange.changeId > self.lastChangeId,  # type: ignore
+                    models.ReviewChange.changedAt >= since,  # type: ignore
+                )
+            )
+        ).all()
+        if not changes:
+            return
+        self.refreshGames(db, {gameId for _, gameId, _ in changes})
+        self.refreshReviews(db, {reviewId for _, _, reviewId in changes})
+        self.lastChangeId = max(self.lastChangeId, *(changeId for changeId, _, _ in changes))
+
+    def refreshGames(self, db: Session, gameIds: set[int]):
+        rows = db.exec(
+            select(models.Game.id, models.Game.scoreSum, models.Game.reviewCount).where(
+                models.Game.id.in_(gameIds)  # type: ignore
+            )
+        ).all()
+        # A deleted game has no row and drops out of the rankings
+        found = {gameId: (scoreSum, reviewCount) for gameId, scoreSum, reviewCount in rows}
+        for gameId in gameIds:
+            scoreSum, reviewCount = found.get(gameId, (0, 0))  # type: ignore
+            oldSum, oldCount = self.stats.pop(gameId, (0, 0))
+            self.totalScore += scoreSum - oldSum
+            self.totalReviews += reviewCount - oldCount
+            if reviewCount > 0:
+                self.stats[gameId] = (scoreSum, reviewCount)
+                self.topRated.set(gameId, self.bayesian(scoreSum, reviewCount))
+                self.mostReviewed.set(gameId, float(reviewCount))
+            else:
+                self.topRated.set(gameId, None)
+                self.mostReviewed.set(gameId, None)
+        currentMean = self.totalScore / self.totalReviews if self.totalReviews else 0.0
+        if abs(currentMean - self.priorMean) > PRIOR_DRIFT:
+            self.rerank()
+
+    def bumpTrending(self, gameId: int, delta: int):
+        count = self.trendingCounts.get(gameId, 0) + delta
+        if count > 0:
+            self.trendingCounts[gameId] = count
+            self.trending.set(gameId, float(count))
+        else:
+            self.trendingCounts.pop(gameId, None)
+            self.trending.set(gameId, None)
+
+    # Sets the trending entries of these reviews to what the database holds. A
+    # removed entry's heap item is skipped when it comes up in expire().
+    def refreshReviews(self, db: Session, reviewIds: set[int]):
+        rows = db.exec(
+            select(
+                models.Review.reviewId, models.Review.gameId, models.Review.createdAt
+            ).where(models.Review.reviewId.in_(reviewIds))  # type: ignore
+        ).all()
+        windowStart = time.time() - TRENDING_WINDOW_SECONDS
+        current = {
+            reviewId: (gameId, timestamp(createdAt))  # type: ignore
+            for reviewId, gameId, createdAt in rows
+            if timestamp(createdAt) >= windowStart  # type: ignore
+        }
+        for reviewId in reviewIds:
+            entry = current.get(reviewId)
+            old = self.windowReviews.get(reviewId)
+            if entry == old:
+                continue
+            if old is not None:
+                del self.windowReviews[reviewId]
+                self.bumpTrending(old[0], -1)
+            if entry is not None:
+                self.windowReviews[reviewId] = entry
+                heapq.heappush(
+                    self.windowExpiry, (entry[1] + TRENDING_WINDOW_SECONDS, reviewId)
+                )
+                self.bumpTrending(entry[0], 1)
+
+    # Drops reviews that left the window, and stale heap items from the top so
+    # that windowExpiry[0] is the next live expiry
+    def expire(self):
+        now = time.time()
+        while self.windowExpiry:
+            expiresAt, reviewId = self.windowExpiry[0]
+            entry = self.windowReviews.get(reviewId)
+            # SQLite can hand a deleted review's id to the next one
+            live = entry is not None and entry[1] + TRENDING_WINDOW_SECONDS == expiresAt
+            if live and expiresAt > now:
+                return
+            heapq.heappop(self.windowExpiry)
+            if live:
+                del self.windowReviews[reviewId]
+                self.bumpTrending(entry[0], -1)  # type: ignore
+
+    # Brings the lists up to the DataVersion rows: a full build when the
+    # database or the catalog version moved (imports, recomputes) or the log no
+    # longer reaches back to the last sync, a catch-up from the change log when
+    # only the ratings version did. Returns the board's ETag part, the versions
+    # read before syncing and, for trending, when it next changes without a
+    # write.
+    def sync(self, db: Session, board: LeaderboardName) -> str:
+        databaseId, catalog, ratings = readVersions(db, ("catalog",), ("ratings",))
+        with self.lock:
+            syncedAt = time.time()
+            if self.builtVersions != (databaseId, catalog):
+                self.build(db)
+                self.builtVersions = (databaseId, catalog)
+            elif self.ratingsVersion != ratings:
+                if self.logCovers(db):
+                    self.catchUp(db)
+                else:
+                    self.build(db)
+            self.ratingsVersion = ratings
+            self.syncedAt = syncedAt
+            self.expire()
+            tag = f"{databaseId}-{catalog}-{ratings}"
+            if board == "trending" and self.windowExpiry:
+                tag += f"-{self.windowExpiry[0][0]!r}"
+            return tag
+
+    # Call sync first
+    def top(self, board: LeaderboardName, offset: int, limit: int) -> list[tuple[int, float]]:
+        ranked = {
+            "top-rated": self.topRated,
+            "most-reviewed": self.mostReviewed,
+            "trending": self.trending,
+        }[board]
+        with self.lock:
+            return ranked.top(offset, limit)
+
+
+leaderboards = Leaderboards()
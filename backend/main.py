@@ -1,25 +1,157 @@
+import anyio
+import asyncio
+import csv
+import json
+import logging
 import os
-import shutil
-import uuid
-from fastapi import Depends, FastAPI, HTTPException, status, UploadFile, Form, File
+import threading
+import time
+from fastapi import (
+    Depends,
+    FastAPI,
+    HTTPException,
+    status,
+    UploadFile,
+    Form,
+    File,
+    Query,
+    Request,
+    Response,
+)
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
-from typing import Annotated, Any
-from sqlmodel import Session, select, desc, SQLModel  # type: ignore
+from collections import defaultdict
+from collections.abc import Iterable
+from typing import Annotated, Any, Literal
+from sqlmodel import Session, select, SQLModel  # type: ignore
+from sqlalchemy import delete, insert, literal, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import make_transient_to_detached
 import models
-from db import create_db_and_tables, get_session
+from db import create_db_and_tables, engine, get_session
+from catalog import (
+    applyGameFilter,
+    gameJsonRows,
+    gameOutQuery,
+    gameSorts,
+    gameSortKey,
+    loadGameOuts,
+    loadGameRows,
+)
+from cache import ResponseCache
+from compression import CompressionMiddleware, PrecompressedBody, negotiatedBody
+from etags import (
+    CATALOG_CACHE_CONTROL,
+    PRIVATE_CACHE_CONTROL,
+    REVIEWS_CACHE_CONTROL,
+    bootId,
+    bumpVersions,
+    ensureDatabaseId,
+    makeETag,
+    notModified,
+    versionSum,
+    versionTag,
+)
+from facets import facetIndex
+from leaderboards import LeaderboardName, leaderboards
+from similarity import NEIGHBOURS, similarityIndex
+from votes import voteCounters, voteDelta
+from reviewchanges import (
+    CHANGES_CURSOR_HEADER,
+    changeLogPruner,
+    changesCursor,
+    decodeChangesCursor,
+    latestChangeId,
+    loadReviewChanges,
+    recordAuthorChanges,
+    recordReviewChanges,
+)
+from reviewstream import gameReviewEvents, reviewStreams
+from fastjson import dumps, fastJsonResponse
+from reviews import (
+    ReviewSort,
+    hasProfile,
+    loadGameReviewPage,
+    loadUserReviewPage,
+    reviewSortKey,
+)
+from images import (
+    InvalidImageError,
+    shutdownImagePool,
+    submitCoverVariants,
+    submitImageJob,
+    toSrcset,
+    validateImage,
+)
+from staticimages import ImageFiles
+from uploads import (
+    RequestSizeLimitMiddleware,
+    StagedUpload,
+    UnsupportedUploadError,
+    UploadTooLargeError,
+    stageUpload,
+)
+from bulkimport import MAX_IMPORT_BYTES, BulkImporter, textLines
+from metrics import MetricsMiddleware, instrumentEngine, metrics
+from profiler import (
+    DEFAULT_INTERVAL_SECONDS,
+    MAX_PROFILE_SECONDS,
+    ProfilerMiddleware,
+    profiler,
+)
+from ratings import applyReviewDelta, recomputeRatings
+from pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    NEXT_CURSOR_HEADER,
+    decodeCursor,
+    keysetQuery,
+    pageRows,
+    setNextCursor,
+    splitPage,
+)
+from search import (
+    createSearchIndex,
+    searchAvailable,
+    searchGames,
+    searchReviews,
+    toMatchQuery,
+)
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 import jwt
 from jwt.exceptions import InvalidTokenError
 from datetime import datetime, timedelta, timezone
 from starlette.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import StreamingResponse
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    create_db_and_tables()
+    try:
+        addedColumns = create_db_and_tables()
+    except IntegrityError as error:
+        # Older databases can hold several reviews per user and game
+        raise RuntimeError(
+            "Duplicate reviews block the unique review index; list them with "
+            "`python -m dedupereviews`, then remove them with --delete"
+        ) from error
+    if ("game", "scoreSum") in addedColumns:
+        # Existing database: (re)build the integer aggregates from the reviews
+        with Session(engine) as db:
+            recomputeRatings(db)
+    ensureDatabaseId(engine)
+    createSearchIndex(engine)
+    similarityIndex.start(engine)
+    voteCounters.start(engine, onVotesFlushed)
+    changeLogPruner.start(engine)
     yield
+    # First: the variant jobs still queued store their results through the DB
+    shutdownImagePool()
+    changeLogPruner.stop()
+    voteCounters.stop(engine)
+    similarityIndex.stop()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -30,11 +162,25 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, CHANGES_CURSOR_HEADER, "ETag"],
 )
+app.add_middleware(
+    RequestSizeLimitMiddleware,
+    pathLimits={"/admin/games:batch": MAX_IMPORT_BYTES},
+)
+# Inside the metrics middleware, so response sizes are what goes over the wire
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(ProfilerMiddleware)
+# Outermost, so rejected and failed requests are counted too
+app.add_middleware(MetricsMiddleware)
+instrumentEngine(engine)
+
+logger = logging.getLogger(__name__)
 
 images_dir = os.path.join(os.path.dirname(__file__), "images")
+covers_dir = os.path.join(images_dir, "covers")
 os.makedirs(images_dir, exist_ok=True)
-app.mount("/images", StaticFiles(directory=images_dir), name="images")
+app.mount("/images", ImageFiles(directory=images_dir), name="images")
 
 SessionDep = Annotated[Session, Depends(get_session)]
 
@@ -45,6 +191,46 @@ SECRET_KEY = "bc053d3f66f602fcb2c13f511243b964640d486440696606204e1f5fbee2904f"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+CACHE_MAX_ENTRIES = 1024
+CACHE_TTL_SECONDS = 60
+
+responseCache = ResponseCache(CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS)
+
+# The JWT is still decoded and its signature/expiry checked on every request;
+# only the User row lookup that follows is cached. Short TTL so a user deleted
+# through another worker is locked out within seconds.
+USER_CACHE_MAX_ENTRIES = 10000
+USER_CACHE_TTL_SECONDS = 30
+
+userCache = ResponseCache(USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL_SECONDS)
+
+
+# Every review write (and so every averageRating/reviewCount change) must call
+# this before commit, and onReviewsChanged after
+def bumpReviewVersions(db: Session, userId: int, gameIds: set[int]):
+    bumpVersions(
+        db, ("ratings",), ("userReviews", userId), *(("game", gameId) for gameId in gameIds)
+    )
+
+
+def onReviewsChanged(db: Session, userId: int, gameIds: set[int]):
+    similarityIndex.markDirty()
+    reviewStreams.notify(gameIds)
+
+
+# Called with (gameId, author's userId) of the reviews whose like/dislike counters
+# were written, from the vote flush thread or after a recompute. Their versions
+# were bumped in the same transaction (votes.py).
+def onVotesFlushed(reviews: Iterable[tuple[int, int]]):
+    reviewStreams.notify({gameId for gameId, _ in reviews})
+
+
+# Catalog writes bump ("catalog",) and ("taxonomy",) in their own transaction;
+# this drops what the process derived from the old catalog
+def onCatalogChanged():
+    similarityIndex.markDirty()
+    responseCache.clear()
+
 
 def verifyPassword(plainPassword: str, hashedPassword: str):
     return pwd_context.verify(plainPassword, hashedPassword)
@@ -54,16 +240,37 @@ def getPasswordHash(password: str):
     return pwd_context.hash(password)
 
 
+# bcrypt is deliberately slow (~250 ms) and releases the GIL, so it gets its own
+# small pool: a burst of logins can use at most this many cores and can't take
+# over the threadpool that serves every other (sync) route.
+PASSWORD_HASH_WORKERS = min(4, os.cpu_count() or 1)
+passwordExecutor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt"
+)
+
+
+async def verifyPasswordAsync(plainPassword: str, hashedPassword: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        passwordExecutor, verifyPassword, plainPassword, hashedPassword
+    )
+
+
+async def getPasswordHashAsync(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(passwordExecutor, getPasswordHash, password)
+
+
 def getUser(db: SessionDep, username: str):
     user = db.exec(select(models.User).where(models.User.username == username)).first()
     return user
 
 
-def authenticateUser(db: SessionDep, username: str, password: str):
-    user = getUser(db, username)
+async def authenticateUser(db: SessionDep, username: str, password: str):
+    user = await run_in_threadpool(getUser, db, username)
     if not user:
         return False
-    if not verifyPassword(password, user.passwordHash):
+    if not await verifyPasswordAsync(password, user.passwordHash):
         return False
     return user
 
@@ -79,7 +286,7 @@ def createAccessToken(data: dict[str, Any], expires_delta: timedelta | None = No
     return encodedJwt
 
 
-async def get_current_user(
+def get_current_user(
     token: Annotated[str, Depends(oauth2_scheme)], db: SessionDep
 ):
     credentials_exception = HTTPException(
@@ -95,9 +302,18 @@ async def get_current_user(
         token_data = models.TokenData(username=username)
     except InvalidTokenError:
         raise credentials_exception
+    generation = userCache.generation
+    snapshot = userCache.get(("user", token_data.username))
+    if snapshot is not None:
+        # merge(load=False) gives this request its own session-bound copy without
+        # a SELECT, so handlers can still modify or delete it
+        return db.merge(snapshot, load=False)
     user = getUser(db, username=(token_data.username))
     if user is None:
         raise credentials_exception
+    snapshot = models.User(**user.model_dump())
+    make_transient_to_detached(snapshot)
+    userCache.set(("user", token_data.username), snapshot, generation)
     return user
 
 
@@ -105,7 +321,7 @@ async def get_current_user(
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db: SessionDep
 ) -> models.Token:
-    user = authenticateUser(db, form_data.username, form_data.password)
+    user = await authenticateUser(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -130,10 +346,8 @@ async def read_users_me(
 @app.post(
     "/register", response_model=models.UserResponse, status_code=status.HTTP_201_CREATED
 )
-def register(userToCreate: models.UserCreate, db: SessionDep):
-    existingUser = db.exec(
-        select(models.User).where(models.User.username == userToCreate.username)
-    ).first()
+async def register(userToCreate: models.UserCreate, db: SessionDep):
+    existingUser = await run_in_threadpool(getUser, db, userToCreate.username)
 
     if existingUser:
         raise HTTPException(status_code=400, detail="Username already registered")
@@ -142,17 +356,20 @@ def register(userToCreate: models.UserCreate, db: SessionDep):
     user = models.User(
         username=userToCreate.username,
         email=userToCreate.email,
-        passwordHash=getPasswordHash(userToCreate.password),
+        passwordHash=await getPasswordHashAsync(userToCreate.password),
     )
 
-    db.add(user)
-    db.commit()
-    db.refresh(user)
+    def saveUser():
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+
+    await run_in_threadpool(saveUser)
     return user
 
 
 @app.get("/profiles/me", response_model=models.Profile, status_code=status.HTTP_200_OK)
-async def getCurrentProfile(
+def getCurrentProfile(
     currentUser: Annotated[models.User, Depends(get_current_user)], db: SessionDep
 ):
     profile = db.exec(
@@ -171,7 +388,7 @@ async def getCurrentProfile(
     response_model=models.Profile,
     status_code=status.HTTP_201_CREATED,
 )
-async def createProfile(
+def createProfile(
     current_user: Annotated[models.User, Depends(get_current_user)],
     db: SessionDep,
     profileCreateInfo: models.ProfileCreate,
@@ -192,78 +409,64 @@ async def createProfile(
 @app.get(
     "/users/me/reviews", response_model=list[models.UserReviewOut], status_code=200
 )
-async def getCurrentUserReviews(
+def getCurrentUserReviews(
     current_user: Annotated[models.User, Depends(get_current_user)],
     db: SessionDep,
+    request: Request,
+    response: Response,
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
 ):
-    allCurrentUserReviews = db.exec(
-        select(models.Review)
-        .where(models.Review.userId == current_user.id)
-        .order_by(desc(models.Review.createdAt))
-    ).all()
-    currentUserProfile = db.exec(
-        select(models.Profile).where(models.Profile.userId == current_user.id)
-    ).first()
-    if not currentUserProfile:
+    etag = makeETag(
+        "user",
+        current_user.id,
+        versionTag(db, ("profiles",), ("userReviews", current_user.id)),  # type: ignore
+    )
+    if cached := notModified(request, response, etag, PRIVATE_CACHE_CONTROL):
+        return cached
+    userReviewRows = loadUserReviewPage(db, current_user.id, cursor, limit)  # type: ignore
+    # Only an empty page needs to tell "no reviews" from "no profile"
+    if not userReviewRows and not hasProfile(db, current_user.id):  # type: ignore
         raise HTTPException(status_code=400, detail="No profile for this User")
-    userReviewOuts: list[models.UserReviewOut] = []
-    for review in allCurrentUserReviews:
-        userReviewOut = models.UserReviewOut(
-            reviewId=review.reviewId,
-            userId=review.userId,
-            content=review.content,
-            score=review.score,
-            likes=review.likes,
-            dislikes=review.dislikes,
-            profilePictureRelativePath=currentUserProfile.profilePictureRelativePath,
-            nickname=currentUserProfile.nickname,
-            createdAt=review.createdAt,
-            gameId=review.gameId,
-            gameName=db.exec(select(models.Game).where(models.Game.id == review.gameId))
-            .first()
-            .name,  # type: ignore
-        )
-        userReviewOuts.append(userReviewOut)
-    return userReviewOuts
+    page = pageRows(
+        userReviewRows,
+        limit,
+        "newest",
+        lambda review: reviewSortKey("newest", review),
+        response,
+    )
+    return fastJsonResponse(page, response)
 
 
 @app.get("/users/{userId}/reviews", response_model=list[models.UserReviewOut])
-async def getUserReviews(userId: int, db: SessionDep):
-    userProfile = db.exec(
-        select(models.Profile).where(models.Profile.userId == userId)
-    ).first()
-    if not userProfile:
+def getUserReviews(
+    userId: int,
+    db: SessionDep,
+    request: Request,
+    response: Response,
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+):
+    etag = makeETag(
+        "user", userId, versionTag(db, ("profiles",), ("userReviews", userId))
+    )
+    if cached := notModified(request, response, etag, REVIEWS_CACHE_CONTROL):
+        return cached
+    userReviewRows = loadUserReviewPage(db, userId, cursor, limit)
+    if not userReviewRows and not hasProfile(db, userId):
         raise HTTPException(status_code=404, detail="User profile not found")
-
-    userReviews = db.exec(
-        select(models.Review)
-        .where(models.Review.userId == userId)
-        .order_by(desc(models.Review.createdAt))
-    ).all()
-    userReviewOuts: list[models.UserReviewOut] = []
-    for review in userReviews:
-        userReviewOut = models.UserReviewOut(
-            reviewId=review.reviewId,
-            userId=review.userId,
-            content=review.content,
-            score=review.score,
-            likes=review.likes,
-            dislikes=review.dislikes,
-            profilePictureRelativePath=userProfile.profilePictureRelativePath,
-            nickname=userProfile.nickname,
-            createdAt=review.createdAt,
-            gameId=review.gameId,
-            gameName=db.exec(select(models.Game).where(models.Game.id == review.gameId))
-            .first()
-            .name,  # type: ignore
-        )
-        userReviewOuts.append(userReviewOut)
-
-    return userReviewOuts
+    page = pageRows(
+        userReviewRows,
+        limit,
+        "newest",
+        lambda review: reviewSortKey("newest", review),
+        response,
+    )
+    return fastJsonResponse(page, response)
 
 
 @app.put("/profiles/me", response_model=models.Profile, status_code=200)
-async def updateProfile(
+def updateProfile(
     updateInfo: models.ProfileUpdate,
     current_user: Annotated[models.User, Depends(get_current_user)],
     db: SessionDep,
@@ -278,13 +481,17 @@ async def updateProfile(
     profile.bio = updateInfo.bio
     profile.nickname = updateInfo.nickname
     profile.profilePictureRelativePath = updateInfo.profilePictureRelativePath
+    reviewedGameIds = recordAuthorChanges(db, current_user.id)  # type: ignore
+    # nickname and picture are embedded in every review list
+    bumpVersions(db, ("profiles",))
     db.commit()
+    reviewStreams.notify(reviewedGameIds)
     db.refresh(profile)
     return profile
 
 
 @app.get("/profiles/{profileId}", response_model=models.Profile, status_code=200)
-async def getProfile(profileId: int, db: SessionDep):
+def getProfile(profileId: int, db: SessionDep):
     profile = db.exec(
         select(models.Profile).where(models.Profile.profileId == profileId)
     ).first()
@@ -295,31 +502,58 @@ async def getProfile(profileId: int, db: SessionDep):
     return profile
 
 
-@app.get("/games/{gameId}", response_model=models.GameOut, status_code=200)
-async def getGameInfo(gameId: int, db: SessionDep):
-    game = db.exec(select(models.Game).where(models.Game.id == gameId)).first()
-    if not game:
-        raise HTTPException(status_code=404, detail="Game doesn't exist")
-    platformsResult = db.exec(
-        select(models.Platform)
-        .join(models.GamePlatform)
-        .where(models.GamePlatform.gameId == game.id)
-    ).all()
-    platformsList = list(platformsResult)
-    genresResult = db.exec(
-        select(models.Genre)
-        .join(models.GameGenre)
-        .where(models.GameGenre.gameId == game.id)
-    ).all()
-    genresList = list(genresResult)
-    gameOut = models.GameOut(
-        **game.model_dump(), platforms=platformsList, genres=genresList
+def gameFilter(
+    genreIds: list[int] = Query(default=[]),
+    platformIds: list[int] = Query(default=[]),
+    yearFrom: int | None = None,
+    yearTo: int | None = None,
+    minRating: float | None = Query(default=None, ge=0, le=100),
+    minReviews: int | None = Query(default=None, ge=0),
+) -> models.GameFilter:
+    return models.GameFilter(
+        genreIds=genreIds,
+        platformIds=platformIds,
+        yearFrom=yearFrom,
+        yearTo=yearTo,
+        minRating=minRating,
+        minReviews=minReviews,
     )
+
+
+GameFilterDep = Annotated[models.GameFilter, Depends(gameFilter)]
+
+
+# Must be registered before /games/{gameId} so "facets" isn't parsed as an id
+@app.get("/games/facets", response_model=models.GameFacets, status_code=200)
+def getGameFacets(db: SessionDep, filters: GameFilterDep):
+    return facetIndex.facets(db, filters)
+
+
+@app.get("/games/{gameId}", response_model=models.GameOut, status_code=200)
+def getGameInfo(
+    gameId: int, db: SessionDep, request: Request, response: Response
+):
+    tag = versionTag(db, ("taxonomy",), ("game", gameId))
+    etag = makeETag("game", gameId, tag)
+    if cached := notModified(request, response, etag, CATALOG_CACHE_CONTROL):
+        return cached
+    # Keyed by the version too: a write from another worker doesn't invalidate
+    # this process's cache, but it does move the version
+    generation = responseCache.generation
+    gameOut = responseCache.get(("game", gameId, tag))
+    if gameOut is None:
+        gameOuts = loadGameOuts(
+            db, gameOutQuery().where(models.Game.id == gameId)
+        )
+        if not gameOuts:
+            raise HTTPException(status_code=404, detail="Game doesn't exist")
+        gameOut = gameOuts[0]
+        responseCache.set(("game", gameId, tag), gameOut, generation)
     return gameOut
 
 
 @app.delete("/users/me", status_code=204)
-async def deleteCurrentUser(
+def deleteCurrentUser(
     current_user: Annotated[models.User, Depends(get_current_user)],
     db: SessionDep,
 ):
@@ -330,27 +564,46 @@ async def deleteCurrentUser(
     reviews = db.exec(
         select(models.Review).where(models.Review.userId == current_user.id)
     ).all()
-    for review in reviews:
-        reviewedGame = db.exec(
-            select(models.Game).where(models.Game.id == review.gameId)
-        ).first()
-        if not reviewedGame:
-            raise HTTPException(status_code=400)
-        scoreSum = reviewedGame.averageRating * reviewedGame.reviewCount
-        scoreSum -= review.score
-        reviewedGame.reviewCount -= 1
-        if reviewedGame.reviewCount > 0:
-            reviewedGame.averageRating = scoreSum / reviewedGame.reviewCount
-        else:
-            reviewedGame.averageRating = 0.0
-        db.delete(review)
-    db.delete(profile)
-    db.delete(current_user)
-    db.commit()
+    reviewedGameIds = {review.gameId for review in reviews}
+    reviewIds = [review.reviewId for review in reviews]
+    with voteCounters.writing():
+        for review in reviews:
+            applyReviewDelta(db, review.gameId, -review.score, -1)
+            db.delete(review)
+        recordReviewChanges(db, [(review.gameId, review.reviewId) for review in reviews])  # type: ignore
+        db.exec(
+            delete(models.ReviewVote).where(models.ReviewVote.reviewId.in_(reviewIds))  # type: ignore
+        )
+        # Their votes on other users' reviews come off those reviews' counters
+        castVotes = db.exec(
+            delete(models.ReviewVote)  # type: ignore
+            .where(models.ReviewVote.userId == current_user.id)
+            .returning(models.ReviewVote.reviewId, models.ReviewVote.value)
+        ).all()
+        votedIds = [reviewId for reviewId, _ in castVotes]
+        votedReviews = db.exec(
+            select(
+                models.Review.reviewId,
+                models.Review.gameId,
+                models.Review.userId,
+                models.Review.createdAt,
+            ).where(models.Review.reviewId.in_(votedIds))  # type: ignore
+        ).all()
+        db.delete(profile)
+        db.delete(current_user)
+        bumpReviewVersions(db, current_user.id, reviewedGameIds)  # type: ignore
+        db.commit()
+        voteValues = dict(castVotes)
+        for reviewId, gameId, authorId, createdAt in votedReviews:
+            likes, dislikes = voteDelta(voteValues[reviewId], 0)
+            voteCounters.add(reviewId, gameId, authorId, createdAt, likes, dislikes)
+    userCache.invalidate("user", current_user.username)
+    voteCounters.discard(reviewIds)  # type: ignore
+    onReviewsChanged(db, current_user.id, reviewedGameIds)  # type: ignore
 
 
 @app.delete("/users/me/reviews/{reviewId}", status_code=204)
-async def deleteCurrentUserReview(
+def deleteCurrentUserReview(
     reviewId: int,
     db: SessionDep,
     currentUser: Annotated[models.User, Depends(get_current_user)],
@@ -364,77 +617,319 @@ async def deleteCurrentUserReview(
         raise HTTPException(
             status_code=403, detail="Not authorized to delete this review"
         )
-    reviewedGame = db.exec(
-        select(models.Game).where(models.Game.id == review.gameId)
-    ).first()
-    if not reviewedGame:
-        raise HTTPException(status_code=400)
-    scoreSum = reviewedGame.averageRating * reviewedGame.reviewCount
-    scoreSum -= review.score
-    reviewedGame.reviewCount -= 1
-    if reviewedGame.reviewCount > 0:
-        reviewedGame.averageRating = scoreSum / reviewedGame.reviewCount
-    else:
-        reviewedGame.averageRating = 0.0
+    applyReviewDelta(db, review.gameId, -review.score, -1)
+    db.exec(
+        delete(models.ReviewVote).where(models.ReviewVote.reviewId == reviewId)  # type: ignore
+    )
+    recordReviewChanges(db, [(review.gameId, reviewId)])
     db.delete(review)
+    bumpReviewVersions(db, currentUser.id, {review.gameId})  # type: ignore
     db.commit()
+    voteCounters.discard([reviewId])
+    onReviewsChanged(db, currentUser.id, {review.gameId})  # type: ignore
 
 
 @app.get(
     "/games/{gameId}/reviews", response_model=list[models.ReviewOut], status_code=200
 )
-async def getGameReviews(gameId: int, db: SessionDep):
-    reviewsAndProfiles = db.exec(
-        select(models.Review, models.Profile)
-        .join(
-            models.Profile,
-            models.Profile.userId == models.Review.userId,  # type: ignore
-        )  # Eğer eskiden foreign key olan profileId olmadığı için faillıyorsa reviewdaki modelin userIdsini profileId olarak değiştir.
-        .where(models.Review.gameId == gameId)
-        .order_by(desc(models.Review.createdAt))
-    ).all()
-    reviewOuts: list[models.ReviewOut] = []
-    for review, profile in reviewsAndProfiles:
-        reviewOut = models.ReviewOut(
-            reviewId=review.reviewId,
-            userId=review.userId,
-            content=review.content,
-            score=review.score,
-            likes=review.likes,
-            dislikes=review.dislikes,
-            profilePictureRelativePath=profile.profilePictureRelativePath,
-            nickname=profile.nickname,
-            createdAt=review.createdAt,
-            gameId=review.gameId,
-        )
-        reviewOuts.append(reviewOut)
-    return reviewOuts
+def getGameReviews(
+    gameId: int,
+    db: SessionDep,
+    request: Request,
+    response: Response,
+    sort: ReviewSort = "newest",
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+):
+    etag = makeETag(
+        "reviews",
+        gameId,
+        versionTag(db, ("profiles",), ("game", gameId), ("gameReviews", gameId)),
+    )
+    if cached := notModified(request, response, etag, REVIEWS_CACHE_CONTROL):
+        return cached
+    # Read before the page, so a write racing with it comes again in the delta
+    response.headers[CHANGES_CURSOR_HEADER] = changesCursor(latestChangeId(db), time.time())
+    reviewRows = loadGameReviewPage(db, gameId, sort, cursor, limit)
+    page = pageRows(
+        reviewRows, limit, sort, lambda review: reviewSortKey(sort, review), response
+    )
+    return fastJsonResponse(page, response)
+
+
+# What changed since a cursor from X-Changes-Cursor, an earlier delta or a
+# stream event id. Deleted reviews come back as ids. 410 once the cursor is
+# older than the change log; the client then reloads the list.
+@app.get("/games/{gameId}/reviews/changes", response_model=models.ReviewChanges)
+def getGameReviewChanges(
+    gameId: int,
+    db: SessionDep,
+    response: Response,
+    since: str,
+    limit: int = Query(default=MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    sinceId = decodeChangesCursor(since)
+    changes, hasMore = loadReviewChanges(db, gameId, sinceId, limit)
+    lastId, lastChangedAt = changes[-1][:2] if changes else (sinceId, 0.0)
+    # Without more to come the log holds nothing newer for this game, so the
+    # cursor is good from now on; otherwise only from the last change it covers
+    cursor = changesCursor(lastId, lastChangedAt if hasMore else time.time())
+    return fastJsonResponse(
+        {
+            "changed": [review for _, _, _, review in changes if review is not None],
+            "deleted": [reviewId for _, _, reviewId, review in changes if review is None],
+            "cursor": cursor,
+            "hasMore": hasMore,
+        },
+        response,
+    )
+
+
+# Server-Sent Events: the changes of one game as they are committed (see
+# reviewstream.py). Without a cursor the stream starts at the present.
+@app.get("/games/{gameId}/reviews/stream")
+def streamGameReviews(
+    gameId: int, db: SessionDep, request: Request, since: str | None = None
+):
+    if db.get(models.Game, gameId) is None:
+        raise HTTPException(status_code=404, detail="Game doesn't exist")
+    cursor = request.headers.get("last-event-id") or since
+    sinceId = decodeChangesCursor(cursor) if cursor else latestChangeId(db)
+    return StreamingResponse(
+        gameReviewEvents(engine, gameId, sinceId),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.get("/games", status_code=200, response_model=list[models.GameOut])
-async def getAllGamesInfo(db: SessionDep):
-    allGames = db.exec(
-        select(models.Game).order_by(desc(models.Game.averageRating))
+def getAllGamesInfo(
+    db: SessionDep,
+    request: Request,
+    response: Response,
+    filters: GameFilterDep,
+    sort: Literal["rating", "reviews", "year", "name"] = "rating",
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+):
+    sortColumn, descending = gameSorts[sort]
+    gamesQuery = keysetQuery(
+        applyGameFilter(gameOutQuery(), filters),
+        sort,
+        sortColumn,
+        models.Game.id,
+        descending,
+        cursor,
+        limit,
+    )
+    # The versions cover every page/filter combination: the ETag is per URL
+    # anyway. Which games a rating sort or filter picks moves with any review;
+    # otherwise only the catalog decides, and the ratings shown move with the
+    # page's own games.
+    if (
+        sort in ("rating", "reviews")
+        or filters.minRating is not None
+        or filters.minReviews is not None
+    ):
+        tag = versionTag(db, ("catalog",), ("ratings",))
+    else:
+        pageIds = gamesQuery.with_only_columns(models.Game.id)  # type: ignore
+        tag = f"{versionTag(db, ('catalog',))}-{versionSum(db, 'game', pageIds)}"
+    etag = makeETag("games", tag)
+    if cached := notModified(request, response, etag, CATALOG_CACHE_CONTROL):
+        return cached
+    # The cache holds the encoded page and its gzip/brotli codings, so a hit
+    # neither serializes nor compresses
+    def loadPage() -> tuple[PrecompressedBody, str | None]:
+        gameRows = loadGameRows(db, gamesQuery)
+        page, nextCursor = splitPage(
+            gameRows, limit, sort, lambda game: gameSortKey(sort, game)
+        )
+        return PrecompressedBody(dumps(gameJsonRows(page))), nextCursor
+
+    body, nextCursor = responseCache.getOrLoad(
+        ("games", tag, sort, limit, cursor, filters.model_dump_json()), loadPage
+    )
+    setNextCursor(response, nextCursor)
+    return fastJsonResponse(negotiatedBody(request, response, body), response)
+
+
+# Rankings are kept in memory and caught up from the review change log
+# (leaderboards.py), so a page costs a slice plus one primary-key query for the
+# games on it
+@app.get("/leaderboards/{board}", response_model=list[models.LeaderboardEntry])
+def getLeaderboard(
+    board: LeaderboardName,
+    db: SessionDep,
+    request: Request,
+    response: Response,
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(default=0, ge=0, le=10_000),
+):
+    tag = leaderboards.sync(db, board)
+    etag = makeETag("leaderboard", board, tag)
+    if cached := notModified(request, response, etag, CATALOG_CACHE_CONTROL):
+        return cached
+
+    def loadBoard() -> PrecompressedBody:
+        ranked = leaderboards.top(board, offset, limit)
+        gameRows = loadGameRows(
+            db,
+            gameOutQuery().where(
+                models.Game.id.in_([gameId for gameId, _ in ranked])  # type: ignore
+            ),
+        )
+        gamesById = {game["id"]: game for game in gameJsonRows(gameRows)}
+        entries = [
+            {"rank": offset + index + 1, "score": score, "game": gamesById[gameId]}
+            for index, (gameId, score) in enumerate(ranked)
+            if gameId in gamesById
+        ]
+        return PrecompressedBody(dumps(entries))
+
+    body = responseCache.getOrLoad(
+        ("games", "leaderboard", board, offset, limit, tag), loadBoard
+    )
+    return fastJsonResponse(negotiatedBody(request, response, body), response)
+
+
+def loadScoredGames(db: Session, scored: list[tuple[int, float]]) -> list[dict[str, Any]]:
+    gameRows = loadGameRows(
+        db,
+        gameOutQuery().where(
+            models.Game.id.in_([gameId for gameId, _ in scored])  # type: ignore
+        ),
+    )
+    gamesById = {game["id"]: game for game in gameJsonRows(gameRows)}
+    return [
+        {"score": score, "game": gamesById[gameId]}
+        for gameId, score in scored
+        if gameId in gamesById
+    ]
+
+
+# Neighbours are computed in the background (similarity.py); serving is a lookup
+# in the current table plus one primary-key query. Empty until the first
+# computation after startup has finished.
+@app.get("/games/{gameId}/similar", response_model=list[models.ScoredGame])
+def getSimilarGames(
+    gameId: int,
+    db: SessionDep,
+    request: Request,
+    response: Response,
+    limit: int = Query(default=10, ge=1, le=NEIGHBOURS),
+):
+    similarityVersion = similarityIndex.version
+    tag = versionTag(db, ("catalog",), ("ratings",))
+    etag = makeETag("similar", gameId, tag, bootId, similarityVersion)
+    if cached := notModified(request, response, etag, CATALOG_CACHE_CONTROL):
+        return cached
+
+    def loadSimilar() -> PrecompressedBody | None:
+        similar = similarityIndex.similar(gameId, limit)
+        if not similar and db.get(models.Game, gameId) is None:
+            return None
+        return PrecompressedBody(dumps(loadScoredGames(db, similar)))
+
+    body = responseCache.getOrLoad(
+        ("games", "similar", gameId, limit, tag, similarityVersion), loadSimilar
+    )
+    if body is None:
+        raise HTTPException(status_code=404, detail="Game doesn't exist")
+    return fastJsonResponse(negotiatedBody(request, response, body), response)
+
+
+# Games like the ones the user rated above their own average. Users without
+# reviews get the top-rated leaderboard.
+@app.get("/users/me/recommendations", response_model=list[models.ScoredGame])
+def getRecommendations(
+    current_user: Annotated[models.User, Depends(get_current_user)],
+    db: SessionDep,
+    request: Request,
+    response: Response,
+    limit: int = Query(default=10, ge=1, le=MAX_PAGE_SIZE),
+):
+    etag = makeETag(
+        "recommendations",
+        current_user.id,
+        versionTag(db, ("catalog",), ("ratings",), ("userReviews", current_user.id)),  # type: ignore
+        bootId,
+        similarityIndex.version,
+    )
+    if cached := notModified(request, response, etag, PRIVATE_CACHE_CONTROL):
+        return cached
+    reviews = db.exec(
+        select(models.Review.gameId, models.Review.score).where(
+            models.Review.userId == current_user.id
+        )
     ).all()
-    allGameOuts: list[models.GameOut] = []
-    for game in allGames:
-        platformsResult = db.exec(
-            select(models.Platform)
-            .join(models.GamePlatform)
-            .where(models.GamePlatform.gameId == game.id)
-        ).all()
-        platformsList = list(platformsResult)
-        genresResult = db.exec(
-            select(models.Genre)
-            .join(models.GameGenre)
-            .where(models.GameGenre.gameId == game.id)
-        ).all()
-        genresList = list(genresResult)
-        gameOut = models.GameOut(
-            **game.model_dump(), platforms=platformsList, genres=genresList
+    recommended = similarityIndex.recommend(list(reviews), limit)  # type: ignore
+    if not recommended:
+        reviewedIds = {gameId for gameId, _ in reviews}
+        leaderboards.sync(db, "top-rated")
+        ranked = leaderboards.top("top-rated", 0, limit + len(reviewedIds))
+        recommended = [
+            (gameId, score) for gameId, score in ranked if gameId not in reviewedIds
+        ][:limit]
+    return fastJsonResponse(loadScoredGames(db, recommended), response)
+
+
+def searchParams(
+    q: str = Query(min_length=1, max_length=200),
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+) -> tuple[str, tuple[float, int] | None, int]:
+    if not searchAvailable(engine):
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Full-text search needs SQLite FTS5 and isn't available on this database.",
         )
-        allGameOuts.append(gameOut)
-    return allGameOuts
+    matchQuery = toMatchQuery(q)
+    if not matchQuery:
+        raise HTTPException(status_code=400, detail="Search query has no words.")
+    after = None
+    if cursor:
+        cursorValues = decodeCursor(cursor, "relevance")
+        try:
+            lastRank, lastId = cursorValues
+            after = (float(lastRank), int(lastId))
+        except (TypeError, ValueError, IndexError, OverflowError):
+            raise HTTPException(status_code=400, detail="Invalid cursor.")
+    return matchQuery, after, limit
+
+
+SearchParamsDep = Annotated[
+    tuple[str, tuple[float, int] | None, int], Depends(searchParams)
+]
+
+
+@app.get("/search", response_model=list[models.GameSearchHit], status_code=200)
+def searchGameCatalog(
+    db: SessionDep, response: Response, params: SearchParamsDep
+):
+    matchQuery, after, limit = params
+    hits = searchGames(db, matchQuery, after, limit + 1)
+    page = pageRows(
+        hits, limit, "relevance", lambda hit: (hit["rank"], hit["id"]), response
+    )
+    return fastJsonResponse(page, response)
+
+
+@app.get(
+    "/search/reviews", response_model=list[models.ReviewSearchHit], status_code=200
+)
+def searchGameReviews(
+    db: SessionDep, response: Response, params: SearchParamsDep
+):
+    matchQuery, after, limit = params
+    hits = searchReviews(db, matchQuery, after, limit + 1)
+    return pageRows(
+        hits,
+        limit,
+        "relevance",
+        lambda hit: (hit["rank"], hit["reviewId"]),
+        response,
+    )
 
 
 # TODO creating review, updating review
@@ -443,7 +938,7 @@ async def getAllGamesInfo(db: SessionDep):
     status_code=status.HTTP_201_CREATED,
     response_model=models.Review,
 )
-async def createReview(
+def createReview(
     currentUser: Annotated[models.User, Depends(get_current_user)],
     db: SessionDep,
     reviewCreateInfo: models.ReviewCreate,
@@ -457,32 +952,29 @@ async def createReview(
             status_code=status.HTTP_404_NOT_FOUND, detail="Game doesnt't exist."
         )
 
-    existingReview = db.exec(
-        select(models.Review)
-        .where(models.Review.userId == currentUser.id)
-        .where(models.Review.gameId == reviewCreateInfo.gameId)
-    ).first()
-
-    if existingReview:
+    review = models.Review(**reviewCreateInfo.model_dump(), userId=currentUser.id)  # type: ignore
+    db.add(review)
+    # ux_review_userId_gameId decides, so two concurrent posts can't both get in
+    try:
+        db.flush()
+    except IntegrityError:
+        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT, detail="Game already reviewed"
         )
-
-    review = models.Review(**reviewCreateInfo.model_dump(), userId=currentUser.id)  # type: ignore
-    scoreSum = reviewedGame.averageRating * reviewedGame.reviewCount
-    scoreSum += review.score
-    reviewedGame.reviewCount += 1
-    reviewedGame.averageRating = scoreSum / reviewedGame.reviewCount
-    db.add(review)
+    applyReviewDelta(db, reviewCreateInfo.gameId, review.score, 1)
+    recordReviewChanges(db, [(review.gameId, review.reviewId)])  # type: ignore
+    bumpReviewVersions(db, currentUser.id, {reviewCreateInfo.gameId})  # type: ignore
     db.commit()
     db.refresh(review)
+    onReviewsChanged(db, currentUser.id, {reviewCreateInfo.gameId})  # type: ignore
     return review
 
 
 @app.put(
     "/users/me/reviews", response_model=models.Review, status_code=status.HTTP_200_OK
 )
-async def updateReview(
+def updateReview(
     currentUser: Annotated[models.User, Depends(get_current_user)],
     db: SessionDep,
     reviewUpdateInfo: models.ReviewUpdate,
@@ -508,28 +1000,135 @@ async def updateReview(
         )
     oldScore = existingReview.score
     newScore = reviewUpdateInfo.score
-    scoreSum = reviewedGame.averageRating * reviewedGame.reviewCount
-    scoreSum = scoreSum - oldScore + newScore
-    reviewedGame.averageRating = scoreSum / reviewedGame.reviewCount
+    applyReviewDelta(db, reviewUpdateInfo.gameId, newScore - oldScore, 0)
+    recordReviewChanges(db, [(existingReview.gameId, existingReview.reviewId)])  # type: ignore
     existingReview.content = reviewUpdateInfo.content
     existingReview.score = reviewUpdateInfo.score
+    bumpReviewVersions(db, currentUser.id, {reviewUpdateInfo.gameId})  # type: ignore
     db.commit()
+    onReviewsChanged(db, currentUser.id, {reviewUpdateInfo.gameId})  # type: ignore
     db.refresh(existingReview)
     return existingReview
 
 
+def findVotedReview(db: Session, reviewId: int, voterId: int) -> Any:
+    review = db.exec(
+        select(models.Review.gameId, models.Review.userId, models.Review.createdAt).where(
+            models.Review.reviewId == reviewId
+        )
+    ).first()
+    if not review:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Review doesn't exist."
+        )
+    if review.userId == voterId:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Can't vote on your own review",
+        )
+    return review
+
+
+# The vote row is written now; the review's likes/dislikes follow within
+# VOTE_FLUSH_MS (votes.py)
+@app.put("/reviews/{reviewId}/vote", status_code=204)
+def voteOnReview(
+    reviewId: int,
+    voteInfo: models.ReviewVoteCreate,
+    currentUser: Annotated[models.User, Depends(get_current_user)],
+    db: SessionDep,
+):
+    review = findVotedReview(db, reviewId, currentUser.id)  # type: ignore
+    value = 1 if voteInfo.vote == "like" else -1
+    # Inserted only if the review is still there, so a vote racing the review's
+    # delete gets a 404 rather than leaving an orphan row
+    newVote = insert(models.ReviewVote).from_select(
+        ["reviewId", "userId", "value", "createdAt"],
+        select(
+            models.Review.reviewId,
+            literal(currentUser.id),
+            literal(value),
+            literal(datetime.now(timezone.utc), models.ReviewVote.createdAt.type),  # type: ignore
+        )
+        .where(models.Review.reviewId == reviewId)
+        .where(models.Review.createdAt == review.createdAt),
+    )
+    with voteCounters.writing():
+        # The primary key decides between a first vote and a change of vote, so
+        # two concurrent requests from one user can't both count
+        try:
+            if not db.exec(newVote).rowcount:  # type: ignore
+                db.rollback()
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND, detail="Review doesn't exist."
+                )
+            previous = 0
+        except IntegrityError:
+            db.rollback()
+            switched = db.exec(
+                update(models.ReviewVote)  # type: ignore
+                .where(models.ReviewVote.reviewId == reviewId)
+                .where(models.ReviewVote.userId == currentUser.id)
+                .where(models.ReviewVote.value != value)
+                .values(value=value)
+            )
+            previous = -value if switched.rowcount else value
+        db.commit()
+        if previous != value:
+            likes, dislikes = voteDelta(previous, value)
+            voteCounters.add(
+                reviewId, review.gameId, review.userId, review.createdAt, likes, dislikes
+            )
+
+
+@app.delete("/reviews/{reviewId}/vote", status_code=204)
+def removeReviewVote(
+    reviewId: int,
+    currentUser: Annotated[models.User, Depends(get_current_user)],
+    db: SessionDep,
+):
+    review = findVotedReview(db, reviewId, currentUser.id)  # type: ignore
+    with voteCounters.writing():
+        removed = db.exec(
+            delete(models.ReviewVote)  # type: ignore
+            .where(models.ReviewVote.reviewId == reviewId)
+            .where(models.ReviewVote.userId == currentUser.id)
+            .returning(models.ReviewVote.value)
+        ).first()
+        db.commit()
+        if removed is not None:
+            likes, dislikes = voteDelta(removed.value, 0)
+            voteCounters.add(
+                reviewId, review.gameId, review.userId, review.createdAt, likes, dislikes
+            )
+    if removed is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="No vote on this review"
+        )
+
+
 adminUsernames = ["Batuhan", "isomert"]
 
 @app.get("/genres", response_model=list[models.Genre])
-async def getAllGenres(db: SessionDep):
-    genres = db.exec(select(models.Genre)).all()
-    return list(genres)
+def getAllGenres(db: SessionDep, request: Request, response: Response):
+    tag = versionTag(db, ("taxonomy",))
+    etag = makeETag("genres", tag)
+    if cached := notModified(request, response, etag, CATALOG_CACHE_CONTROL):
+        return cached
+    return responseCache.getOrLoad(
+        ("genres", tag), lambda: list(db.exec(select(models.Genre)).all())
+    )
 
 
 @app.get("/platforms", response_model=list[models.Platform])
-async def getAllPlatforms(db: SessionDep):
-    platforms = db.exec(select(models.Platform)).all()
-    return list(platforms)
+def getAllPlatforms(db: SessionDep, request: Request, response: Response):
+    tag = versionTag(db, ("taxonomy",))
+    etag = makeETag("platforms", tag)
+    if cached := notModified(request, response, etag, CATALOG_CACHE_CONTROL):
+        return cached
+    return responseCache.getOrLoad(
+        ("platforms", tag), lambda: list(db.exec(select(models.Platform)).all())
+    )
 
 
 def is_admin(user: models.User) -> bool:
@@ -537,6 +1136,118 @@ def is_admin(user: models.User) -> bool:
     return user.username in adminUsernames
 
 
+async def get_admin_user(
+    current_user: Annotated[models.User, Depends(get_current_user)],
+):
+    if not is_admin(current_user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required."
+        )
+    return current_user
+
+
+@app.get("/metrics", include_in_schema=False)
+def getMetrics():
+    return Response(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get("/admin/cacheStats")
+async def getCacheStats(_: Annotated[models.User, Depends(get_admin_user)]):
+    return responseCache.stats()
+
+
+@app.get("/admin/profiler")
+async def getProfilerStatus(_: Annotated[models.User, Depends(get_admin_user)]):
+    return profiler.status()
+
+
+# Samples stacks for `seconds`, either of all requests or of `percent` of them
+@app.post("/admin/profiler/start")
+async def startProfiler(
+    _: Annotated[models.User, Depends(get_admin_user)],
+    seconds: float = Query(default=30, gt=0, le=MAX_PROFILE_SECONDS),
+    percent: float = Query(default=100, gt=0, le=100),
+    intervalMs: float = Query(default=DEFAULT_INTERVAL_SECONDS * 1000, ge=1, le=1000),
+):
+    if not profiler.start(seconds, percent, intervalMs / 1000):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="Profiler is already running."
+        )
+    return profiler.status()
+
+
+@app.post("/admin/profiler/stop")
+async def stopProfiler(_: Annotated[models.User, Depends(get_admin_user)]):
+    await run_in_threadpool(profiler.stop)
+    return profiler.status()
+
+
+# Collapsed stacks ("frame;frame;frame count" per line) of the last session, for
+# flamegraph.pl, speedscope or inferno
+@app.get("/admin/profiler/stacks")
+async def downloadProfilerStacks(_: Annotated[models.User, Depends(get_admin_user)]):
+    fileName = time.strftime("profile-%Y%m%d-%H%M%S.collapsed", time.gmtime(profiler.startedAt))
+    return Response(
+        profiler.collapsed(),
+        media_type="text/plain; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="{fileName}"'},
+    )
+
+
+@app.post("/admin/recomputeRatings")
+def recomputeAllRatings(
+    _: Annotated[models.User, Depends(get_admin_user)], db: SessionDep
+):
+    gamesWithReviews = recomputeRatings(db)
+    onVotesFlushed(voteCounters.recompute(db))
+    onCatalogChanged()
+    return {"gamesWithReviews": gamesWithReviews}
+
+
+# Body is JSON Lines (default) or CSV, see bulkimport.py for the columns. The body
+# is streamed into the importer on a worker thread; each chunk commits on its own.
+@app.post("/admin/games:batch", response_model=models.ImportReport)
+async def importGames(
+    _: Annotated[models.User, Depends(get_admin_user)],
+    request: Request,
+    format: Literal["jsonl", "csv"] | None = None,
+):
+    if format is None:
+        contentType = request.headers.get("content-type", "")
+        format = "csv" if contentType.startswith("text/csv") else "jsonl"
+    body = request.stream()
+
+    async def nextChunk() -> bytes:
+        return await body.__anext__()
+
+    def chunks():
+        while True:
+            try:
+                yield anyio.from_thread.run(nextChunk)
+            except StopAsyncIteration:
+                return
+
+    def logProgress(report: models.ImportReport):
+        logger.info(
+            "Import: %d rows, %d inserted, %d updated, %d skipped",
+            report.rows, report.inserted, report.updated, report.skipped,
+        )
+
+    importer = BulkImporter(engine, progress=logProgress)
+    try:
+        report = await run_in_threadpool(importer.importLines, textLines(chunks()), format)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Import body must be UTF-8.")
+    except csv.Error as error:
+        raise HTTPException(status_code=400, detail=f"Invalid CSV: {error}")
+    finally:
+        if importer.report.inserted or importer.report.updated:
+            onCatalogChanged()
+    return report
+
+
 @app.get("/users/me/is-admin")
 async def check_admin_status(
     current_user: Annotated[models.User, Depends(get_current_user)]
@@ -560,6 +1271,64 @@ async def createGame(
             status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required."
         )
 
+    # 1. Stream the upload to a temp file, sniffing its type and hashing it
+    try:
+        upload = await stageUpload(coverArt, images_dir)
+    except UploadTooLargeError as error:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(error)
+        )
+    except UnsupportedUploadError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+    try:
+        # 2. Make sure it really is an image by decoding it (in the image pool, so
+        # a huge or hostile file can't take down this process)
+        try:
+            await asyncio.wrap_future(submitImageJob(validateImage, upload.tempPath))
+        except InvalidImageError:
+            raise HTTPException(status_code=400, detail="Invalid image file.")
+
+        # 3. Insert the game; the file only gets its public name once that commits.
+        # Held from here until its variants are stored (storeCoverVariants).
+        full_path = os.path.join(images_dir, upload.fileName)
+        retainOriginal(full_path)
+        try:
+            newGame = await run_in_threadpool(
+                insertGame, db, name, releaseYear, description, publisher,
+                genreIds, platformIds, upload,
+            )
+            upload.commit(images_dir)
+        except BaseException:
+            releaseOriginal(full_path, True)
+            raise
+    finally:
+        upload.discard()
+    onCatalogChanged()
+
+    # 4. Resized/WebP variants are generated after the response is sent
+    gameId = newGame.id
+    try:
+        variantsJob = submitCoverVariants(full_path, covers_dir)
+    except BaseException:
+        releaseOriginal(full_path, True)
+        raise
+    variantsJob.add_done_callback(
+        lambda future: storeCoverVariants(gameId, full_path, future)  # type: ignore
+    )
+    return newGame
+
+
+def insertGame(
+    db: Session,
+    name: str,
+    releaseYear: int,
+    description: str,
+    publisher: str,
+    genreIds: list[int],
+    platformIds: list[int],
+    upload: StagedUpload,
+) -> models.Game:
     existingGame = db.exec(select(models.Game).where(models.Game.name == name)).first()
 
     if existingGame:
@@ -567,29 +1336,22 @@ async def createGame(
             status_code=status.HTTP_409_CONFLICT, detail="Game already exists"
         )
 
-    # 1. Generate a unique filename
-    ext = os.path.splitext(coverArt.filename)[1]  # type: ignore
-    filename = f"{uuid.uuid4().hex}{ext}"
-    relativePath = f"/images/{filename}"
-
-    valid_extensions = [".jpg", ".jpeg", ".png"]
-    if ext.lower() not in valid_extensions:  # type: ignore
-        raise HTTPException(status_code=400, detail="Unsupported image format.")
-
-    # 2. Save image to disk
-    full_path = os.path.join(images_dir, filename)
-    with open(full_path, "wb") as buffer:
-        shutil.copyfileobj(coverArt.file, buffer)
     newGame = models.Game(
         name=name,
         description=description,
         releaseYear=releaseYear,
         publisher=publisher,
-        coverArtRelativePath=relativePath,
+        coverArtRelativePath=f"/images/{upload.fileName}",
     )
     db.add(newGame)
-    db.commit()
-    db.refresh(newGame)
+    publisherRow = db.exec(
+        select(models.Publisher).where(models.Publisher.name == publisher)
+    ).first() or models.Publisher(name=publisher)
+    db.add(publisherRow)
+    db.flush()
+    db.add(
+        models.GamePublisher(gameId=newGame.id, publisherId=publisherRow.id)  # type: ignore
+    )
 
     for genreId in genreIds:
         gameGenre = models.GameGenre(
@@ -605,5 +1367,64 @@ async def createGame(
         )
         db.add(gamePlatform)
 
+    bumpVersions(db, ("catalog",), ("taxonomy",))
     db.commit()
+    db.refresh(newGame)
     return newGame
+
+
+# Identical uploads share one content-addressed original, so it is counted by
+# the variant jobs of this process that still need it. The count is taken before
+# the upload is committed and the file is only removed under the lock, so an
+# identical upload either keeps it or writes it again after the removal.
+originalJobs: defaultdict[str, int] = defaultdict(int)
+originalJobsLock = threading.Lock()
+
+
+def retainOriginal(path: str):
+    with originalJobsLock:
+        originalJobs[path] += 1
+
+
+def releaseOriginal(path: str, keep: bool):
+    with originalJobsLock:
+        originalJobs[path] -= 1
+        if originalJobs[path] > 0:
+            return
+        del originalJobs[path]
+        if keep:
+            return
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def storeCoverVariants(gameId: int, originalPath: str, future: Any):
+    stillUsed: Any = True
+    try:
+        try:
+            variants = future.result()
+        except Exception:
+            logger.exception("Cover art processing failed for game %s", gameId)
+            return
+        with Session(engine) as db:
+            game = db.get(models.Game, gameId)
+            if game is None:
+                return
+            game.coverArtSrcset = json.dumps(toSrcset("/images/covers", variants))
+            # The full-size re-encode replaces the upload, which may still carry EXIF
+            game.coverArtRelativePath = f"/images/covers/{variants['jpeg'][0][0]}"
+            bumpVersions(db, ("catalog",), ("game", gameId))
+            db.commit()
+            # Games whose variants never got stored still point at the original
+            stillUsed = db.exec(
+                select(models.Game.id).where(
+                    models.Game.coverArtRelativePath
+                    == f"/images/{os.path.basename(originalPath)}"
+                )
+            ).first()
+    finally:
+        releaseOriginal(originalPath, stillUsed is not None)
+    responseCache.invalidate("games")
+    responseCache.invalidate("game", gameId)
@@ -0,0 +1,227 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from sqlalchemy import Engine, event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+SLOW_QUERY_SECONDS = float(os.environ.get("SLOW_QUERY_MS", "100")) / 1000
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+# Per-request DB counters. The middleware sets one per request; sync handlers
+# run in a threadpool copy of the context, which still points at the same object.
+class RequestStats:
+    __slots__ = ("queries", "dbSeconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.dbSeconds = 0.0
+
+
+currentRequestStats: ContextVar[RequestStats | None] = ContextVar(
+    "currentRequestStats", default=None
+)
+
+
+def escapeLabel(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def formatLabels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escapeLabel(value)}"' for name, value in labels.items()) + "}"
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.inFlight = 0
+        self.requests: dict[tuple[str, str, str], int] = {}
+        self.latency: dict[tuple[str, str], Histogram] = {}
+        self.responseSize: dict[tuple[str, str], Histogram] = {}
+        self.queriesPerRequest: dict[tuple[str, str], Histogram] = {}
+        self.dbSeconds: dict[tuple[str, str], float] = {}
+        self.queries = 0
+        self.querySeconds = 0.0
+        self.slowQueries = 0
+
+    def recordRequest(
+        self,
+        method: str,
+        route: str,
+        status: int,
+        seconds: float,
+        size: int,
+        stats: RequestStats,
+    ):
+        key = (method, route)
+        with self.lock:
+            statusKey = (method, route, str(status))
+            self.requests[statusKey] = self.requests.get(statusKey, 0) + 1
+            if key not in self.latency:
+                self.latency[key] = Histogram(LATENCY_BUCKETS)
+                self.responseSize[key] = Histogram(SIZE_BUCKETS)
+                self.queriesPerRequest[key] = Histogram(QUERY_COUNT_BUCKETS)
+                self.dbSeconds[key] = 0.0
+            self.latency[key].observe(seconds)
+            self.responseSize[key].observe(size)
+            self.queriesPerRequest[key].observe(stats.queries)
+            self.dbSeconds[key] += stats.dbSeconds
+
+    def recordQuery(self, seconds: float, slow: bool):
+        with self.lock:
+            self.queries += 1
+            self.querySeconds += seconds
+            if slow:
+                self.slowQueries += 1
+
+    def render(self) -> str:
+        lines: list[str] = []
+
+        def header(name: str, kind: str, help: str):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histogram(name: str, help: str, series: dict[tuple[str, str], Histogram]):
+            header(name, "histogram", help)
+            for (method, route), values in sorted(series.items()):
+                labels = {"method": method, "route": route}
+                cumulative = 0
+                for bound, count in zip(values.buckets, values.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{formatLabels({**labels, 'le': repr(float(bound))})} {cumulative}")
+                cumulative += values.counts[-1]
+                lines.append(f"{name}_bucket{formatLabels({**labels, 'le': '+Inf'})} {cumulative}")
+                lines.append(f"{name}_sum{formatLabels(labels)} {values.sum}")
+                lines.append(f"{name}_count{formatLabels(labels)} {cumulative}")
+
+        with self.lock:
+            header("http_requests_in_flight", "gauge", "Requests currently being handled.")
+            lines.append(f"http_requests_in_flight {self.inFlight}")
+            header("http_requests_total", "counter", "Finished requests.")
+            for (method, route, status), count in sorted(self.requests.items()):
+                labels = {"method": method, "route": route, "status": status}
+                lines.append(f"http_requests_total{formatLabels(labels)} {count}")
+            histogram(
+                "http_request_duration_seconds", "Time to the last response byte.", self.latency
+            )
+            histogram("http_response_size_bytes", "Response body size.", self.responseSize)
+            histogram(
+                "http_request_db_queries", "SQL statements per request.", self.queriesPerRequest
+            )
+            header("http_request_db_seconds_total", "counter", "Time spent in SQL per route.")
+            for (method, route), seconds in sorted(self.dbSeconds.items()):
+                labels = {"method": method, "route": route}
+                lines.append(f"http_request_db_seconds_total{formatLabels(labels)} {seconds}")
+            header("db_queries_total", "counter", "SQL statements executed.")
+            lines.append(f"db_queries_total {self.queries}")
+            header("db_query_seconds_total", "counter", "Time spent in SQL.")
+            lines.append(f"db_query_seconds_total {self.querySeconds}")
+            header("db_slow_queries_total", "counter", "SQL statements slower than SLOW_QUERY_MS.")
+            lines.append(f"db_slow_queries_total {self.slowQueries}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+# Label by route template, never the raw path, so /games/1 and /games/2 share a series
+def routeLabel(scope: Scope) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    if "endpoint" in scope:
+        # Mounted apps (static files) have no route object
+        return scope.get("root_path", "") + "/{path}"
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = currentRequestStats.set(stats)
+        status = 500
+        size = 0
+
+        async def countingSend(message: Message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        with metrics.lock:
+            metrics.inFlight += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, countingSend)
+        finally:
+            elapsed = time.perf_counter() - start
+            with metrics.lock:
+                metrics.inFlight -= 1
+            currentRequestStats.reset(token)
+            metrics.recordRequest(
+                scope["method"], routeLabel(scope), status, elapsed, size, stats
+            )
+
+
+def beforeCursorExecute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("queryStart", []).append(time.perf_counter())
+
+
+def afterCursorExecute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["queryStart"].pop()
+    slow = elapsed >= SLOW_QUERY_SECONDS
+    metrics.recordQuery(elapsed, slow)
+    stats = currentRequestStats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.dbSeconds += elapsed
+    if slow:
+        # Parameters can hold emails, password hashes and review text
+        count = len(parameters) if isinstance(parameters, (list, tuple, dict)) else 0
+        logger.warning(
+            "Slow query (%.1f ms, %s%d parameters redacted): %s",
+            elapsed * 1000,
+            "executemany, " if executemany else "",
+            count,
+            " ".join(statement.split()),
+        )
+
+
+def forgetFailedQuery(context):
+    if context.connection is not None and context.connection.info.get("queryStart"):
+        context.connection.info["queryStart"].pop()
+
+
+def instrumentEngine(engine: Engine):
+    event.listen(engine, "before_cursor_execute", beforeCursorExecute)
+    event.listen(engine, "after_cursor_execute", afterCursorExecute)
+    event.listen(engine, "handle_error", forgetFailedQuery)
@@ -1,6 +1,9 @@
+from sqlalchemy import Index, text
 from sqlmodel import Field, SQLModel
 from datetime import datetime, timezone
-from pydantic import BaseModel
+from typing import Literal
+import json
+from pydantic import BaseModel, field_validator
 
 
 class Game(SQLModel, table=True):
@@ -10,10 +13,13 @@ class Game(SQLModel, table=True):
     description: str = Field(min_length=1)
     averageRating: float = Field(default=0.0, index=True)
     reviewCount: int = Field(default=0, index=True)
+    scoreSum: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
     publisher: str
     coverArtRelativePath: str = Field(
         default="../images/gameCoverArts/gameCoverArtPlaceholder.jpeg"
     )
+    # JSON {format: srcset}, filled in once the cover variants are generated
+    coverArtSrcset: str | None = None
 
 
 class Platform(SQLModel, table=True):
@@ -22,6 +28,11 @@ class Platform(SQLModel, table=True):
 
 
 class GamePlatform(SQLModel, table=True):
+    # Primary key starts with gameId; this covers "games on platform X" lookups
+    __table_args__ = (
+        Index("ix_gameplatform_platformId_gameId", "platformId", "gameId"),
+    )
+
     gameId: int = Field(foreign_key="game.id", primary_key=True)
     platformId: int = Field(foreign_key="platform.id", primary_key=True)
 
@@ -40,15 +51,61 @@ class GameOut(BaseModel):
     reviewCount: int
     publisher: str
     coverArtRelativePath: str
+    coverArtSrcset: dict[str, str] = {}
     platforms: list[Platform]
     genres: list[Genre]
 
+    @field_validator("coverArtSrcset", mode="before")
+    @classmethod
+    def parseSrcset(cls, value: str | dict[str, str] | None) -> dict[str, str]:
+        if value is None:
+            return {}
+        if isinstance(value, str):
+            return json.loads(value)
+        return value
+
 
 class GameGenre(SQLModel, table=True):
+    __table_args__ = (Index("ix_gamegenre_genreId_gameId", "genreId", "gameId"),)
+
     gameId: int = Field(foreign_key="game.id", primary_key=True)
     genreId: int = Field(foreign_key="genre.id", primary_key=True)
 
 
+class GameFilter(BaseModel):
+    genreIds: list[int] = []
+    platformIds: list[int] = []
+    yearFrom: int | None = None
+    yearTo: int | None = None
+    minRating: float | None = None
+    minReviews: int | None = None
+
+
+class FacetCount(BaseModel):
+    id: int
+    name: str
+    count: int
+
+
+class GameFacets(BaseModel):
+    total: int
+    genres: list[FacetCount]
+    platforms: list[FacetCount]
+
+
+# score is the Bayesian average for top-rated, the review count for
+# most-reviewed and the reviews inside the window for trending
+class LeaderboardEntry(BaseModel):
+    rank: int
+    score: float
+    game: GameOut
+
+
+class ScoredGame(BaseModel):
+    score: float
+    game: GameOut
+
+
 class Publisher(SQLModel, table=True):
     id: int | None = Field(default=None, primary_key=True)
     name: str = Field(index=True, min_length=1)
@@ -59,6 +116,33 @@ class GamePublisher(SQLModel, table=True):
     publisherId: int = Field(foreign_key="publisher.id", primary_key=True)
 
 
+class GameImportRow(BaseModel):
+    name: str = Field(min_length=1)
+    releaseYear: int
+    description: str = Field(min_length=1)
+    publisher: str = Field(min_length=1)
+    genres: list[str] = []
+    platforms: list[str] = []
+    coverArtRelativePath: str | None = None
+
+
+class ImportRowError(BaseModel):
+    line: int
+    message: str
+
+
+class ImportReport(BaseModel):
+    rows: int = 0
+    inserted: int = 0
+    updated: int = 0
+    skipped: int = 0
+    genresCreated: int = 0
+    platformsCreated: int = 0
+    publishersCreated: int = 0
+    seconds: float = 0.0
+    errors: list[ImportRowError] = []
+
+
 class UserCreate(BaseModel):
     username: str
     email: str
@@ -115,6 +199,17 @@ class ReviewUpdate(BaseModel):
 
 
 class Review(SQLModel, table=True):
+    # The feeds filter on gameId/userId and page by (createdAt, reviewId); SQLite
+    # appends the rowid (reviewId) to every index, so both walk an index in order.
+    # The unique index enforces one review per user and game. The "helpful" feed
+    # sorts on net likes; the query must use this exact expression to hit it.
+    __table_args__ = (
+        Index("ix_review_gameId_createdAt", "gameId", "createdAt"),
+        Index("ix_review_userId_createdAt", "userId", "createdAt"),
+        Index("ux_review_userId_gameId", "userId", "gameId", unique=True),
+        Index("ix_review_gameId_helpful", "gameId", text("(likes - dislikes)")),
+    )
+
     reviewId: int | None = Field(default=None, primary_key=True)
     userId: int = Field(foreign_key="user.id")
     gameId: int = Field(foreign_key="game.id")
@@ -125,6 +220,47 @@ class Review(SQLModel, table=True):
     createdAt: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 
+# One row per user and review, so a user can't vote twice. value is 1 for a like
+# and -1 for a dislike; Review.likes/dislikes are the batched totals (votes.py).
+class ReviewVote(SQLModel, table=True):
+    __table_args__ = (Index("ix_reviewvote_userId", "userId"),)
+
+    reviewId: int = Field(foreign_key="review.reviewId", primary_key=True)
+    userId: int = Field(foreign_key="user.id", primary_key=True)
+    value: int
+    createdAt: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+# Append-only log of review writes per game, read by the delta endpoint and the
+# review streams (reviewchanges.py). A deleted review is a change whose review no
+# longer exists. AUTOINCREMENT so ids are never reused after old entries are
+# pruned: the cursors handed to clients are these ids.
+class ReviewChange(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_reviewchange_gameId_changeId", "gameId", "changeId"),
+        Index("ix_reviewchange_changedAt", "changedAt"),
+        {"sqlite_autoincrement": True},
+    )
+
+    changeId: int | None = Field(default=None, primary_key=True)
+    gameId: int
+    reviewId: int
+    changedAt: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+# Versions the ETags are built from (etags.py), bumped in the transaction of the
+# write they describe. scope is "catalog", "game", "userReviews", ...; key is the
+# game or user id, 0 for the global scopes.
+class DataVersion(SQLModel, table=True):
+    scope: str = Field(primary_key=True)
+    key: int = Field(default=0, primary_key=True)
+    version: int = Field(default=0)
+
+
+class ReviewVoteCreate(BaseModel):
+    vote: Literal["like", "dislike"]
+
+
 class ReviewOut(BaseModel):
     reviewId: int | None
     userId: int
@@ -142,6 +278,37 @@ class UserReviewOut(ReviewOut):
     gameName: str
 
 
+class ReviewChanges(BaseModel):
+    changed: list[ReviewOut]
+    deleted: list[int]
+    cursor: str
+    hasMore: bool
+
+
+class GameSearchHit(BaseModel):
+    id: int
+    name: str
+    releaseYear: int
+    averageRating: float
+    reviewCount: int
+    publisher: str
+    coverArtRelativePath: str
+    nameHighlight: str
+    descriptionSnippet: str
+    rank: float
+
+
+class ReviewSearchHit(BaseModel):
+    reviewId: int
+    userId: int
+    gameId: int
+    gameName: str
+    score: int
+    createdAt: datetime
+    contentSnippet: str
+    rank: float
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -0,0 +1,117 @@
+import base64
+import binascii
+import json
+from datetime import datetime, timezone
+from typing import Any, Callable, Sequence, TypeVar
+from fastapi import HTTPException, Response
+from sqlalchemy import DateTime, literal, tuple_
+from sqlmodel import desc
+
+T = TypeVar("T")
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encodeCursor(sortKey: str, values: Sequence[Any]) -> str:
+    payload = [sortKey] + [
+        value.isoformat() if isinstance(value, datetime) else value for value in values
+    ]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decodeCursor(cursor: str, sortKey: str) -> list[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    if not isinstance(payload, list) or len(payload) < 2 or payload[0] != sortKey:
+        raise HTTPException(
+            status_code=400, detail="Cursor doesn't match the requested sort."
+        )
+    return payload[1:]
+
+
+# A cursor value checked against the column it will be compared with; a
+# tampered cursor gets a 400 rather than failing in the driver
+def cursorValue(value: Any, column: Any) -> Any:
+    # sqlmodel wraps DateTime in a TypeDecorator, so look at the underlying type
+    columnType = getattr(column.type, "impl", column.type)
+    if isinstance(columnType, DateTime):
+        try:
+            parsed = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor.")
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+    try:
+        pythonType = columnType.python_type
+    except NotImplementedError:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    # JSON has no separate float type for whole numbers; bool is an int subclass
+    if pythonType is float and type(value) is int:
+        return float(value)
+    if type(value) is not pythonType:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    return value
+
+
+# Keyset (seek) pagination: WHERE (sortColumn, id) < (lastValue, lastId) walks the
+# index from the last seen row, so page 10,000 costs the same as page 1.
+def keysetQuery(
+    query: Any,
+    sortKey: str,
+    sortColumn: Any,
+    idColumn: Any,
+    descending: bool,
+    cursor: str | None,
+    limit: int,
+) -> Any:
+    if cursor:
+        cursorValues = decodeCursor(cursor, sortKey)
+        if len(cursorValues) != 2:
+            raise HTTPException(status_code=400, detail="Invalid cursor.")
+        lastValue = cursorValue(cursorValues[0], sortColumn)
+        lastId = cursorValue(cursorValues[1], idColumn)
+        key = tuple_(sortColumn, idColumn)
+        bound = tuple_(
+            literal(lastValue, sortColumn.type), literal(lastId, idColumn.type)
+        )
+        query = query.where(key < bound if descending else key > bound)
+    if descending:
+        query = query.order_by(desc(sortColumn), desc(idColumn))
+    else:
+        query = query.order_by(sortColumn, idColumn)
+    # One extra row tells us whether there is a next page without a COUNT(*)
+    return query.limit(limit + 1)
+
+
+def splitPage(
+    rows: Sequence[T],
+    limit: int,
+    sortKey: str,
+    keyOf: Callable[[T], Sequence[Any]],
+) -> tuple[list[T], str | None]:
+    page = list(rows[:limit])
+    if len(rows) > limit and page:
+        return page, encodeCursor(sortKey, keyOf(page[-1]))
+    return page, None
+
+
+def setNextCursor(response: Response, nextCursor: str | None):
+    if nextCursor:
+        response.headers[NEXT_CURSOR_HEADER] = nextCursor
+
+
+def pageRows(
+    rows: Sequence[T],
+    limit: int,
+    sortKey: str,
+    keyOf: Callable[[T], Sequence[Any]],
+    response: Response,
+) -> list[T]:
+    page, nextCursor = splitPage(rows, limit, sortKey, keyOf)
+    setNextCursor(response, nextCursor)
+    return page
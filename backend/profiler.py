@@ -0,0 +1,171 @@
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+MAX_PROFILE_SECONDS = 300
+DEFAULT_INTERVAL_SECONDS = 0.005
+
+# Leaf functions of threads parked waiting for work; sampling them only adds noise
+idleFunctions = {
+    "Condition.wait",
+    "Event.wait",
+    "Thread.join",
+    "EpollSelector.select",
+    "KqueueSelector.select",
+    "PollSelector.select",
+    "SelectSelector.select",
+    "_worker",
+    "_wait_for_tstate_lock",
+}
+
+
+def frameLabel(frame: FrameType) -> str:
+    code = frame.f_code
+    path = code.co_filename
+    if "site-packages" in path:
+        path = path.rsplit("site-packages" + os.sep, 1)[1]
+    else:
+        path = os.path.basename(path)
+    # Semicolons separate frames in the collapsed format
+    return f"{code.co_qualname} ({path}:{code.co_firstlineno})".replace(";", ",")
+
+
+def collapse(frame: FrameType | None) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(frameLabel(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+# A wall-clock sampler: a background thread reads every other thread's Python
+# stack with sys._current_frames() and counts identical stacks. The output is the
+# "collapsed" format flamegraph.pl, speedscope and inferno all read.
+#
+# With percent < 100, only a share of requests is marked as sampled and stacks
+# are only taken while one of them is in flight. Stacks are per thread, not per
+# request, so requests running at the same moment show up as well.
+class SamplingProfiler:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stacks: Counter[str] = Counter()
+        self.running = False
+        self.percent = 100.0
+        self.interval = DEFAULT_INTERVAL_SECONDS
+        self.startedAt = 0.0
+        self.deadline = 0.0
+        self.samples = 0
+        self.sampledRequests = 0
+        self.sampledInFlight = 0
+        self.thread: threading.Thread | None = None
+
+    def start(self, seconds: float, percent: float, interval: float) -> bool:
+        with self.lock:
+            if self.running:
+                return False
+            self.stacks = Counter()
+            self.samples = 0
+            self.sampledRequests = 0
+            self.sampledInFlight = 0
+            self.percent = percent
+            self.interval = interval
+            self.startedAt = time.time()
+            self.deadline = time.monotonic() + min(seconds, MAX_PROFILE_SECONDS)
+            self.running = True
+            self.thread = threading.Thread(
+                target=self.sampleLoop, name="sampling-profiler", daemon=True
+            )
+            self.thread.start()
+            return True
+
+    def stop(self):
+        with self.lock:
+            self.running = False
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def shouldSample(self) -> bool:
+        return self.running and (self.percent >= 100 or random.random() * 100 < self.percent)
+
+    def requestStarted(self):
+        with self.lock:
+            self.sampledRequests += 1
+            self.sampledInFlight += 1
+
+    def requestFinished(self):
+        with self.lock:
+            self.sampledInFlight -= 1
+
+    def sampleLoop(self):
+        ownId = threading.get_ident()
+        # The sampler only runs when it gets the GIL; with the default 5 ms switch
+        # interval that is mostly when other threads block, which would hide pure
+        # Python work (pydantic, serialization) from the profile.
+        switchInterval = sys.getswitchinterval()
+        sys.setswitchinterval(min(switchInterval, self.interval / 5))
+        try:
+            self.collectSamples(ownId)
+        finally:
+            sys.setswitchinterval(switchInterval)
+            with self.lock:
+                self.running = False
+
+    def collectSamples(self, ownId: int):
+        while self.running and time.monotonic() < self.deadline:
+            time.sleep(self.interval)
+            if self.percent < 100 and self.sampledInFlight == 0:
+                continue
+            frames = sys._current_frames()
+            taken = []
+            for threadId, frame in frames.items():
+                if threadId == ownId or frame.f_code.co_qualname in idleFunctions:
+                    continue
+                taken.append(collapse(frame))
+            del frames
+            with self.lock:
+                self.samples += 1
+                self.stacks.update(taken)
+
+    def status(self) -> dict:
+        with self.lock:
+            return {
+                "running": self.running,
+                "percent": self.percent,
+                "intervalMs": self.interval * 1000,
+                "startedAt": self.startedAt,
+                "remainingSeconds": max(0.0, round(self.deadline - time.monotonic(), 1))
+                if self.running
+                else 0.0,
+                "samples": self.samples,
+                "sampledRequests": self.sampledRequests,
+                "distinctStacks": len(self.stacks),
+            }
+
+    def collapsed(self) -> str:
+        with self.lock:
+            return "".join(
+                f"{stack} {count}\n" for stack, count in self.stacks.most_common()
+            )
+
+
+profiler = SamplingProfiler()
+
+
+class ProfilerMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not profiler.shouldSample():
+            await self.app(scope, receive, send)
+            return
+        profiler.requestStarted()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.requestFinished()
@@ -0,0 +1,56 @@
+from sqlalchemy import Float, case, cast, func, update
+from sqlmodel import Session, select
+import models
+from etags import bumpVersions
+
+
+# The aggregate lives in the row as an integer scoreSum plus reviewCount, and is
+# only ever changed by a relative UPDATE in the caller's transaction, so
+# concurrent reviews can't overwrite each other and nothing drifts. averageRating
+# is kept alongside because /games sorts and filters on its index.
+def applyReviewDelta(db: Session, gameId: int, scoreDelta: int, countDelta: int):
+    newSum = models.Game.scoreSum + scoreDelta
+    newCount = models.Game.reviewCount + countDelta
+    db.exec(
+        update(models.Game)  # type: ignore
+        .where(models.Game.id == gameId)  # type: ignore
+        .values(
+            scoreSum=newSum,
+            reviewCount=newCount,
+            averageRating=case(
+                (newCount > 0, cast(newSum, Float) / newCount), else_=0.0
+            ),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def recomputeRatings(db: Session) -> int:
+    totals = (
+        select(
+            models.Review.gameId,
+            func.sum(models.Review.score).label("scoreSum"),
+            func.count().label("reviewCount"),
+        )
+        .group_by(models.Review.gameId)
+        .subquery()
+    )
+    db.exec(
+        update(models.Game)  # type: ignore
+        .values(scoreSum=0, reviewCount=0, averageRating=0.0)
+        .execution_options(synchronize_session=False)
+    )
+    result = db.exec(
+        update(models.Game)  # type: ignore
+        .where(models.Game.id == totals.c.gameId)  # type: ignore
+        .values(
+            scoreSum=totals.c.scoreSum,
+            reviewCount=totals.c.reviewCount,
+            averageRating=cast(totals.c.scoreSum, Float) / totals.c.reviewCount,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    # Every game's rating may have moved
+    bumpVersions(db, ("catalog",), ("taxonomy",))
+    db.commit()
+    return result.rowcount  # type: ignore
@@ -0,0 +1,169 @@
+import logging
+import os
+import threading
+import time
+from collections.abc import Iterable
+from datetime import datetime, timezone
+from typing import Any
+from fastapi import HTTPException
+from sqlalchemy import Connection, Engine, delete, func, insert, literal
+from sqlmodel import Session, select
+import models
+from leaderboards import timestamp
+from pagination import decodeCursor, encodeCursor
+from reviews import reviewFeedQuery, reviewRows
+
+logger = logging.getLogger(__name__)
+
+# How long a changes cursor stays usable; older ones get 410 and the client
+# reloads the list
+RETENTION_SECONDS = float(os.environ.get("REVIEW_CHANGES_RETENTION_HOURS", "24")) * 3600
+# Entries are kept this much longer than cursors are accepted, so an entry whose
+# transaction committed a while after its changedAt can't be pruned from under a
+# cursor that is still valid
+PRUNE_MARGIN_SECONDS = 3600
+PRUNE_INTERVAL_SECONDS = 600
+CHANGES_CURSOR_HEADER = "X-Changes-Cursor"
+
+
+# A cursor is the last change the client has seen plus a time no later than
+# that change, which is what decides whether the log still covers everything
+# after it
+def changesCursor(changeId: int, seenAt: float) -> str:
+    return encodeCursor("changes", [changeId, int(seenAt)])
+
+
+def decodeChangesCursor(cursor: str) -> int:
+    values = decodeCursor(cursor, "changes")
+    if len(values) != 2 or not all(type(value) is int for value in values):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    changeId, seenAt = values
+    if seenAt < time.time() - RETENTION_SECONDS:
+        raise HTTPException(
+            status_code=410, detail="Cursor expired, reload the reviews."
+        )
+    return changeId
+
+
+# Rows are (gameId, reviewId). Runs in the caller's transaction, so the log
+# can't disagree with the reviews it describes.
+def recordReviewChanges(db: Session | Connection, changes: Iterable[tuple[int, int]]):
+    changedAt = datetime.now(timezone.utc)
+    rows = [
+        {"gameId": gameId, "reviewId": reviewId, "changedAt": changedAt}
+        for gameId, reviewId in set(changes)
+    ]
+    if rows:
+        db.execute(insert(models.ReviewChange), rows)
+
+
+# Every review by this user embeds their profile; returns the games touched
+def recordAuthorChanges(db: Session, userId: int) -> set[int]:
+    changedAt = datetime.now(timezone.utc)
+    rows = db.execute(
+        insert(models.ReviewChange)
+        .from_select(
+            ["gameId", "reviewId", "changedAt"],
+            select(
+                models.Review.gameId,
+                models.Review.reviewId,
+                literal(changedAt, models.ReviewChange.changedAt.type),  # type: ignore
+            ).where(models.Review.userId == userId),
+        )
+        .returning(models.ReviewChange.gameId)
+    ).all()
+    return {gameId for (gameId,) in rows}
+
+
+def latestChangeId(db: Session) -> int:
+    return db.exec(select(func.max(models.ReviewChange.changeId))).one() or 0
+
+
+# The reviews of a game changed after sinceId, oldest change first, as
+# (changeId, changedAt, reviewId, row or None if deleted). A review changed
+# several times appears once, at its latest change, so a page ends on a change
+# id below every review it left out and that id is the next cursor.
+def loadReviewChanges(
+    db: Session, gameId: int, sinceId: int, limit: int
+) -> tuple[list[tuple[int, float, int, dict[str, Any] | None]], bool]:
+    latestId = func.max(models.ReviewChange.changeId).label("changeId")
+    changes = db.exec(
+        select(
+            models.ReviewChange.reviewId,
+            latestId,
+            func.max(models.ReviewChange.changedAt),
+        )
+        .where(models.ReviewChange.gameId == gameId)
+        .where(models.ReviewChange.changeId > sinceId)  # type: ignore
+        .group_by(models.ReviewChange.reviewId)
+        .order_by(latestId)
+        .limit(limit + 1)
+    ).all()
+    hasMore = len(changes) > limit
+    changes = changes[:limit]
+    if not changes:
+        return [], False
+    # Filtered on gameId too: SQLite can hand a deleted review's id to a review
+    # of another game
+    current = {
+        review["reviewId"]: review
+        for review in reviewRows(
+            db.exec(
+                reviewFeedQuery(withGameName=False)
+                .where(models.Review.gameId == gameId)
+                .where(
+                    models.Review.reviewId.in_(  # type: ignore
+                        [reviewId for reviewId, _, _ in changes]
+                    )
+                )
+            ).all()
+        )
+    }
+    return [
+        (changeId, timestamp(changedAt), reviewId, current.get(reviewId))
+        for reviewId, changeId, changedAt in changes
+    ], hasMore
+
+
+def pruneReviewChanges(engine: Engine) -> int:
+    cutoff = datetime.fromtimestamp(
+        time.time() - RETENTION_SECONDS - PRUNE_MARGIN_SECONDS, timezone.utc
+    )
+    with engine.begin() as connection:
+        result = connection.execute(
+            delete(models.ReviewChange).where(models.ReviewChange.changedAt < cutoff)  # type: ignore
+        )
+    return result.rowcount
+
+
+class ChangeLogPruner:
+    def __init__(self):
+        self.stopping = threading.Event()
+        self.thread: threading.Thread | None = None
+
+    def run(self, engine: Engine, interval: float):
+        while True:
+            try:
+                pruned = pruneReviewChanges(engine)
+                if pruned:
+                    logger.info("Pruned %d review changes", pruned)
+            except Exception:
+                logger.exception("Pruning review changes failed")
+            if self.stopping.wait(interval):
+                return
+
+    def start(self, engine: Engine, interval: float = PRUNE_INTERVAL_SECONDS):
+        self.stopping.clear()
+        self.thread = threading.Thread(
+            target=self.run, args=(engine, interval), name="reviewchanges", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+
+changeLogPruner = ChangeLogPruner()
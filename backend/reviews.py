@@ -0,0 +1,106 @@
+from typing import Any, Literal, Sequence
+from sqlmodel import Session, select
+import models
+from pagination import keysetQuery
+
+reviewColumns = (
+    models.Review.reviewId,
+    models.Review.userId,
+    models.Review.gameId,
+    models.Review.content,
+    models.Review.score,
+    models.Review.likes,
+    models.Review.dislikes,
+    models.Profile.profilePictureRelativePath,
+    models.Profile.nickname,
+    models.Review.createdAt,
+)
+
+
+# Review ⋈ Profile (⋈ Game for the gameName of user feeds) as plain columns, so a
+# whole page is one query no matter how many games it spans
+def reviewFeedQuery(withGameName: bool) -> Any:
+    query = select(*reviewColumns).join(
+        models.Profile,
+        models.Profile.userId == models.Review.userId,  # type: ignore
+    )
+    if withGameName:
+        query = query.add_columns(models.Game.name.label("gameName")).join(  # type: ignore
+            models.Game,
+            models.Game.id == models.Review.gameId,  # type: ignore
+        )
+    return query
+
+
+ReviewSort = Literal["newest", "helpful"]
+
+# Both descending, ties broken by the newer reviewId. "helpful" is net likes,
+# spelled exactly as in ix_review_gameId_helpful.
+reviewSorts: dict[str, Any] = {
+    "newest": models.Review.createdAt,
+    "helpful": models.Review.likes - models.Review.dislikes,
+}
+
+
+def reviewPageQuery(
+    query: Any, sort: ReviewSort, cursor: str | None, limit: int
+) -> Any:
+    return keysetQuery(
+        query,
+        sort,
+        reviewSorts[sort],
+        models.Review.reviewId,
+        True,
+        cursor,
+        limit,
+    )
+
+
+# The columns come straight from typed SQL and are exactly ReviewOut's fields, in
+# order (plus gameName for UserReviewOut), so rows go out as dicts without a model
+def reviewRows(rows: Sequence[Any]) -> list[dict[str, Any]]:
+    return [row._asdict() for row in rows]
+
+
+def reviewSortKey(sort: ReviewSort, review: dict[str, Any]) -> tuple[Any, int | None]:
+    if sort == "helpful":
+        return review["likes"] - review["dislikes"], review["reviewId"]
+    return review["createdAt"], review["reviewId"]
+
+
+def loadUserReviewPage(
+    db: Session, userId: int, cursor: str | None, limit: int
+) -> list[dict[str, Any]]:
+    rows = db.exec(
+        reviewPageQuery(
+            reviewFeedQuery(withGameName=True).where(models.Review.userId == userId),
+            "newest",
+            cursor,
+            limit,
+        )
+    ).all()
+    return reviewRows(rows)
+
+
+def loadGameReviewPage(
+    db: Session, gameId: int, sort: ReviewSort, cursor: str | None, limit: int
+) -> list[dict[str, Any]]:
+    rows = db.exec(
+        reviewPageQuery(
+            reviewFeedQuery(withGameName=False).where(models.Review.gameId == gameId),
+            sort,
+            cursor,
+            limit,
+        )
+    ).all()
+    return reviewRows(rows)
+
+
+def hasProfile(db: Session, userId: int) -> bool:
+    return (
+        db.exec(
+            select(models.Profile.profileId).where(models.Profile.userId == userId)
+        ).first()
+        is not None
+    )
+
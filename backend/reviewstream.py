@@ -0,0 +1,118 @@
+import asyncio
+import os
+import threading
+from collections import defaultdict
+from collections.abc import AsyncIterator, Iterable, Iterator
+from contextlib import contextmanager
+from typing import Any
+from sqlalchemy import Engine
+from sqlmodel import Session, select
+from starlette.concurrency import run_in_threadpool
+import models
+from fastjson import dumps
+from reviewchanges import changesCursor, loadReviewChanges
+
+# Sent when nothing happened for this long, so proxies keep the connection open.
+# Also how often a stream looks at the change log on its own, which is how it
+# picks up writes made by other worker processes.
+KEEPALIVE_SECONDS = float(os.environ.get("REVIEW_STREAM_KEEPALIVE_SECONDS", "15"))
+STREAM_BATCH = 100
+# Clients reconnect after this many milliseconds, sending Last-Event-ID
+RETRY_MILLISECONDS = 3000
+
+
+# Wakes the review streams of a game after a write. Called from the sync
+# handlers on the threadpool and from the vote flush thread, so the wake-up is
+# handed to each stream's own event loop.
+class ReviewStreams:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.listeners: defaultdict[
+            int, set[tuple[asyncio.AbstractEventLoop, asyncio.Event]]
+        ] = defaultdict(set)
+
+    @contextmanager
+    def subscribe(self, gameId: int) -> Iterator[asyncio.Event]:
+        listener = (asyncio.get_running_loop(), asyncio.Event())
+        with self.lock:
+            self.listeners[gameId].add(listener)
+        try:
+            yield listener[1]
+        finally:
+            with self.lock:
+                self.listeners[gameId].discard(listener)
+                if not self.listeners[gameId]:
+                    del self.listeners[gameId]
+
+    def notify(self, gameIds: Iterable[int]):
+        with self.lock:
+            listeners = [
+                listener for gameId in gameIds for listener in self.listeners.get(gameId, ())
+            ]
+        for loop, wake in listeners:
+            try:
+                loop.call_soon_threadsafe(wake.set)
+            except RuntimeError:  # loop already closed
+                pass
+
+    def count(self) -> int:
+        with self.lock:
+            return sum(len(listeners) for listeners in self.listeners.values())
+
+
+reviewStreams = ReviewStreams()
+
+
+def sseEvent(event: str, data: Any, eventId: str | None = None) -> bytes:
+    # orjson output is a single line, so it fits in one data: field
+    head = f"event: {event}\n" + (f"id: {eventId}\n" if eventId else "")
+    return head.encode() + b"data: " + dumps(data) + b"\n\n"
+
+
+def loadStreamBatch(
+    engine: Engine, gameId: int, sinceId: int
+) -> tuple[list[tuple[int, float, int, dict[str, Any] | None]], bool, tuple[float, int] | None]:
+    with Session(engine) as db:
+        changes, hasMore = loadReviewChanges(db, gameId, sinceId, STREAM_BATCH)
+        rating = None
+        if changes:
+            rating = db.exec(
+                select(models.Game.averageRating, models.Game.reviewCount).where(
+                    models.Game.id == gameId
+                )
+            ).first()
+    return changes, hasMore, tuple(rating) if rating else None  # type: ignore
+
+
+# One "review" or "reviewDeleted" event per changed review, in change order and
+# carrying its change as the event id, then a "rating" event when the game's
+# average or count moved. Everything is read from the change log, so a
+# reconnect with Last-Event-ID picks up exactly where the stream stopped.
+async def gameReviewEvents(engine: Engine, gameId: int, sinceId: int) -> AsyncIterator[bytes]:
+    lastRating: tuple[float, int] | None = None
+    with reviewStreams.subscribe(gameId) as wake:
+        yield f"retry: {RETRY_MILLISECONDS}\n\n".encode()
+        while True:
+            wake.clear()
+            hasMore = True
+            while hasMore:
+                changes, hasMore, rating = await run_in_threadpool(
+                    loadStreamBatch, engine, gameId, sinceId
+                )
+                for changeId, changedAt, reviewId, review in changes:
+                    eventId = changesCursor(changeId, changedAt)
+                    if review is None:
+                        yield sseEvent("reviewDeleted", {"reviewId": reviewId}, eventId)
+                    else:
+                        yield sseEvent("review", review, eventId)
+                    sinceId = changeId
+                if rating is not None and rating != lastRating:
+                    lastRating = rating
+                    averageRating, reviewCount = rating
+                    yield sseEvent(
+                        "rating", {"averageRating": averageRating, "reviewCount": reviewCount}
+                    )
+            try:
+                await asyncio.wait_for(wake.wait(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
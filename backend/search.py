@@ -0,0 +1,174 @@
+import html
+import re
+from typing import Any
+from sqlalchemy import Engine, text
+from sqlmodel import Session
+
+# External-content FTS5 tables: the text lives in game/review, the index only stores
+# tokens. Triggers keep them in sync; the UPDATE triggers only fire for the indexed
+# columns so rating/counter updates don't touch the index.
+searchSchema = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS game_fts USING fts5(
+        name, description, publisher,
+        content='game', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS game_fts_ai AFTER INSERT ON game BEGIN
+        INSERT INTO game_fts(rowid, name, description, publisher)
+        VALUES (new.id, new.name, new.description, new.publisher);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS game_fts_ad AFTER DELETE ON game BEGIN
+        INSERT INTO game_fts(game_fts, rowid, name, description, publisher)
+        VALUES ('delete', old.id, old.name, old.description, old.publisher);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS game_fts_au
+    AFTER UPDATE OF name, description, publisher ON game BEGIN
+        INSERT INTO game_fts(game_fts, rowid, name, description, publisher)
+        VALUES ('delete', old.id, old.name, old.description, old.publisher);
+        INSERT INTO game_fts(rowid, name, description, publisher)
+        VALUES (new.id, new.name, new.description, new.publisher);
+    END""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS review_fts USING fts5(
+        content,
+        content='review', content_rowid='reviewId',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS review_fts_ai AFTER INSERT ON review BEGIN
+        INSERT INTO review_fts(rowid, content) VALUES (new.reviewId, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS review_fts_ad AFTER DELETE ON review BEGIN
+        INSERT INTO review_fts(review_fts, rowid, content)
+        VALUES ('delete', old.reviewId, old.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS review_fts_au AFTER UPDATE OF content ON review BEGIN
+        INSERT INTO review_fts(review_fts, rowid, content)
+        VALUES ('delete', old.reviewId, old.content);
+        INSERT INTO review_fts(rowid, content) VALUES (new.reviewId, new.content);
+    END""",
+]
+
+
+# FTS5 is SQLite-only; on other databases the search routes answer 501
+def searchAvailable(engine: Engine) -> bool:
+    return engine.dialect.name == "sqlite"
+
+
+def createSearchIndex(engine: Engine):
+    if not searchAvailable(engine):
+        return
+    with engine.begin() as connection:
+        existing = connection.execute(
+            text("SELECT name FROM sqlite_master WHERE name IN ('game_fts', 'review_fts')")
+        ).scalars().all()
+        for statement in searchSchema:
+            connection.execute(text(statement))
+        # Rows written before the index existed have to be indexed once
+        if "game_fts" not in existing:
+            connection.execute(text("INSERT INTO game_fts(game_fts) VALUES ('rebuild')"))
+        if "review_fts" not in existing:
+            connection.execute(
+                text("INSERT INTO review_fts(review_fts) VALUES ('rebuild')")
+            )
+
+
+# User input is never passed to MATCH as-is: every word becomes a quoted prefix
+# term, so operators and stray quotes can't produce FTS5 syntax errors.
+def toMatchQuery(q: str) -> str | None:
+    words = re.findall(r"\w+", q)
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+# FTS5 wraps matches around the stored text as-is, so it marks them with
+# private-use characters; the text is HTML-escaped first and only then do those
+# become <mark> tags
+MATCH_START = "\ue000"
+MATCH_END = "\ue001"
+
+
+def markMatches(fragment: str) -> str:
+    return (
+        html.escape(fragment)
+        .replace(MATCH_START, "<mark>")
+        .replace(MATCH_END, "</mark>")
+    )
+
+
+# name matches weigh more than publisher, publisher more than description
+gameRank = "bm25(game_fts, 10.0, 1.0, 3.0)"
+
+
+def searchGames(
+    db: Session, matchQuery: str, after: tuple[float, int] | None, limit: int
+) -> list[dict[str, Any]]:
+    seek = f"AND ({gameRank}, game.id) > (:lastRank, :lastId)" if after else ""
+    rows = db.execute(
+        text(
+            f"""
+            SELECT game.id, game.name, game."releaseYear", game."averageRating",
+                game."reviewCount", game.publisher, game."coverArtRelativePath",
+                highlight(game_fts, 0, :matchStart, :matchEnd) AS "nameHighlight",
+                snippet(game_fts, 1, :matchStart, :matchEnd, '…', 24)
+                    AS "descriptionSnippet",
+                {gameRank} AS rank
+            FROM game_fts JOIN game ON game.id = game_fts.rowid
+            WHERE game_fts MATCH :matchQuery {seek}
+            ORDER BY rank, game.id
+            LIMIT :limit
+            """
+        ),
+        {
+            "matchQuery": matchQuery,
+            "lastRank": after[0] if after else None,
+            "lastId": after[1] if after else None,
+            "limit": limit,
+            "matchStart": MATCH_START,
+            "matchEnd": MATCH_END,
+        },
+    ).mappings()
+    return [
+        {
+            **row,
+            "nameHighlight": markMatches(row["nameHighlight"]),
+            "descriptionSnippet": markMatches(row["descriptionSnippet"]),
+        }
+        for row in rows
+    ]
+
+
+def searchReviews(
+    db: Session, matchQuery: str, after: tuple[float, int] | None, limit: int
+) -> list[dict[str, Any]]:
+    seek = (
+        'AND (bm25(review_fts), review."reviewId") > (:lastRank, :lastId)'
+        if after
+        else ""
+    )
+    rows = db.execute(
+        text(
+            f"""
+            SELECT review."reviewId", review."userId", review."gameId",
+                game.name AS "gameName", review.score, review."createdAt",
+                snippet(review_fts, 0, :matchStart, :matchEnd, '…', 32) AS "contentSnippet",
+                bm25(review_fts) AS rank
+            FROM review_fts
+            JOIN review ON review."reviewId" = review_fts.rowid
+            JOIN game ON game.id = review."gameId"
+            WHERE review_fts MATCH :matchQuery {seek}
+            ORDER BY rank, review."reviewId"
+            LIMIT :limit
+            """
+        ),
+        {
+            "matchQuery": matchQuery,
+            "lastRank": after[0] if after else None,
+            "lastId": after[1] if after else None,
+            "limit": limit,
+            "matchStart": MATCH_START,
+            "matchEnd": MATCH_END,
+        },
+    ).mappings()
+    return [
+        {**row, "contentSnippet": markMatches(row["contentSnippet"])} for row in rows
+    ]
@@ -0,0 +1,243 @@
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+import numpy as np
+from scipy import sparse
+from sqlalchemy import Engine
+from sqlmodel import Session, select
+import models
+
+logger = logging.getLogger(__name__)
+
+NEIGHBOURS = 20
+SIMILARITY_REFRESH_SECONDS = float(os.environ.get("SIMILARITY_REFRESH_SECONDS", "900"))
+# Share of the review-based similarity in the blend; games nobody has co-reviewed
+# still get neighbours from their genres and platforms
+RATING_WEIGHT = 0.7
+GENRE_WEIGHT = 1.0
+PLATFORM_WEIGHT = 0.5
+# Similarity from n co-reviewers is scaled by n / (n + SHRINKAGE), so two games
+# that happen to share one reviewer don't come out as near-identical
+SHRINKAGE = 5.0
+# Rows of the games x games product computed at once: BLOCK_ROWS x games float32
+BLOCK_ROWS = 256
+
+
+def rowNormalized(matrix: sparse.csr_matrix) -> sparse.csr_matrix:
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.csr_matrix(sparse.diags(1.0 / norms) @ matrix)
+
+
+# Top-k neighbours per game as two (games x k) arrays, so a lookup is an index
+# and a slice. Replaced as a whole on every refresh.
+class SimilarityTable:
+    def __init__(self, gameIds: np.ndarray, neighbours: np.ndarray, scores: np.ndarray):
+        self.gameIds = gameIds
+        self.rowOf = {int(gameId): row for row, gameId in enumerate(gameIds)}
+        self.neighbours = neighbours
+        self.scores = scores
+
+    def similar(self, gameId: int, limit: int) -> list[tuple[int, float]]:
+        row = self.rowOf.get(gameId)
+        if row is None:
+            return []
+        scores = self.scores[row, :limit]
+        ids = self.gameIds[self.neighbours[row, :limit]]
+        return [
+            (int(similarId), float(score))
+            for similarId, score in zip(ids, scores)
+            if score > 0
+        ]
+
+
+emptyTable = SimilarityTable(
+    np.zeros(0, np.int64),
+    np.zeros((0, NEIGHBOURS), np.int32),
+    np.zeros((0, NEIGHBOURS), np.float32),
+)
+
+
+def loadMatrices(db: Session) -> tuple[np.ndarray, sparse.csr_matrix, sparse.csr_matrix]:
+    gameIds = np.array(
+        db.exec(select(models.Game.id).order_by(models.Game.id)).all(), np.int64
+    )
+    columnOf = {int(gameId): column for column, gameId in enumerate(gameIds)}
+    # The queries below don't share a snapshot with this one: rows of games added
+    # since (or left dangling) are skipped until the next recompute
+
+    reviews = db.exec(
+        select(models.Review.userId, models.Review.gameId, models.Review.score)
+    ).all()
+    rowOf: dict[int, int] = {}
+    users, columns, scores = [], [], []
+    for userId, gameId, score in reviews:
+        if gameId not in columnOf:
+            continue
+        users.append(rowOf.setdefault(userId, len(rowOf)))
+        columns.append(columnOf[gameId])
+        scores.append(score)
+    ratings = sparse.csr_matrix(
+        (np.array(scores, np.float32), (users, columns)),
+        shape=(len(rowOf), len(gameIds)),
+    )
+
+    features: list[tuple[int, int, float]] = []
+    genreColumn: dict[int, int] = defaultdict(lambda: len(genreColumn))
+    for gameId, genreId in db.exec(
+        select(models.GameGenre.gameId, models.GameGenre.genreId)
+    ):
+        if gameId in columnOf:
+            features.append((columnOf[gameId], genreColumn[genreId], GENRE_WEIGHT))
+    platformOffset = len(genreColumn)
+    platformColumn: dict[int, int] = defaultdict(
+        lambda: platformOffset + len(platformColumn)
+    )
+    for gameId, platformId in db.exec(
+        select(models.GamePlatform.gameId, models.GamePlatform.platformId)
+    ):
+        if gameId in columnOf:
+            features.append(
+                (columnOf[gameId], platformColumn[platformId], PLATFORM_WEIGHT)
+            )
+    rows, featureColumns, weights = zip(*features) if features else ((), (), ())
+    membership = sparse.csr_matrix(
+        (np.array(weights, np.float32), (rows, featureColumns)),
+        shape=(len(gameIds), platformOffset + len(platformColumn)),
+    )
+    return gameIds, ratings, membership
+
+
+def computeSimilarity(
+    gameIds: np.ndarray,
+    ratings: sparse.csr_matrix,
+    membership: sparse.csr_matrix,
+    k: int = NEIGHBOURS,
+) -> SimilarityTable:
+    gameCount = len(gameIds)
+    k = min(k, max(gameCount - 1, 0))
+    if k == 0:
+        return emptyTable
+    # games x users
+    byGame = ratings.T.tocsr().astype(np.float32)
+    reviewed = byGame.copy()
+    reviewed.data[:] = 1.0
+    # Adjusted cosine: each user's scores relative to their own mean, so a harsh
+    # and a generous reviewer who agree on the order count as agreeing
+    counts = np.diff(ratings.indptr)
+    means = np.asarray(ratings.sum(axis=1)).ravel() / np.maximum(counts, 1)
+    byGame.data -= means[byGame.indices].astype(np.float32)
+    byGame = rowNormalized(byGame)
+    content = rowNormalized(membership).astype(np.float32)
+
+    neighbours = np.zeros((gameCount, k), np.int32)
+    scores = np.zeros((gameCount, k), np.float32)
+    for start in range(0, gameCount, BLOCK_ROWS):
+        stop = min(start + BLOCK_ROWS, gameCount)
+        ratingSimilarity = (byGame[start:stop] @ byGame.T).toarray()
+        support = (reviewed[start:stop] @ reviewed.T).toarray()
+        ratingSimilarity *= support / (support + SHRINKAGE)
+        contentSimilarity = (content[start:stop] @ content.T).toarray()
+        blended = RATING_WEIGHT * ratingSimilarity + (1 - RATING_WEIGHT) * contentSimilarity
+        blended[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+        top = np.argpartition(-blended, k - 1, axis=1)[:, :k]
+        topScores = np.take_along_axis(blended, top, axis=1)
+        order = np.argsort(-topScores, axis=1)
+        neighbours[start:stop] = np.take_along_axis(top, order, axis=1)
+        scores[start:stop] = np.take_along_axis(topScores, order, axis=1)
+    return SimilarityTable(gameIds, neighbours, scores)
+
+
+# Recomputes the whole table in a background thread when reviews or the catalog
+# changed since the last run, at most every SIMILARITY_REFRESH_SECONDS. Readers
+# only ever see a finished table; until the first one is ready they get nothing.
+class SimilarityIndex:
+    def __init__(self):
+        self.table = emptyTable
+        self.version = 0
+        self.dirty = True
+        self.stopping = threading.Event()
+        self.wake = threading.Event()
+        self.thread: threading.Thread | None = None
+        self.lastSeconds = 0.0
+
+    def markDirty(self):
+        self.dirty = True
+
+    def refresh(self, engine: Engine):
+        self.dirty = False
+        started = time.perf_counter()
+        with Session(engine) as db:
+            gameIds, ratings, membership = loadMatrices(db)
+        self.table = computeSimilarity(gameIds, ratings, membership)
+        self.version += 1
+        self.lastSeconds = time.perf_counter() - started
+        logger.info(
+            "Similarity for %d games from %d reviews in %.2fs",
+            len(gameIds),
+            ratings.nnz,
+            self.lastSeconds,
+        )
+
+    def run(self, engine: Engine, interval: float):
+        while not self.stopping.is_set():
+            if self.dirty:
+                try:
+                    self.refresh(engine)
+                except Exception:
+                    logger.exception("Similarity refresh failed")
+            self.wake.wait(interval)
+            self.wake.clear()
+
+    def start(self, engine: Engine, interval: float = SIMILARITY_REFRESH_SECONDS):
+        self.stopping.clear()
+        self.thread = threading.Thread(
+            target=self.run, args=(engine, interval), name="similarity", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def similar(self, gameId: int, limit: int) -> list[tuple[int, float]]:
+        return self.table.similar(gameId, limit)
+
+    # Item-based: the user's mean plus the similarity-weighted deviations of
+    # their scores for each candidate's reviewed neighbours. The +1 pulls
+    # candidates backed by little similarity towards the mean. Only candidates
+    # predicted at or above the user's mean are returned; ties (e.g. a user with
+    # a single review) go to the candidate closest to what they reviewed.
+    def recommend(
+        self, reviews: list[tuple[int, int]], limit: int
+    ) -> list[tuple[int, float]]:
+        if not reviews:
+            return []
+        table = self.table
+        userMean = sum(score for _, score in reviews) / len(reviews)
+        reviewedIds = {gameId for gameId, _ in reviews}
+        weighted: dict[int, float] = defaultdict(float)
+        similaritySum: dict[int, float] = defaultdict(float)
+        for gameId, score in reviews:
+            for similarId, similarity in table.similar(gameId, NEIGHBOURS):
+                if similarId not in reviewedIds:
+                    weighted[similarId] += similarity * (score - userMean)
+                    similaritySum[similarId] += similarity
+        predicted = {
+            gameId: userMean + weighted[gameId] / (similaritySum[gameId] + 1)
+            for gameId in weighted
+            if weighted[gameId] >= 0
+        }
+        ranked = sorted(
+            predicted,
+            key=lambda gameId: (-predicted[gameId], -similaritySum[gameId], gameId),
+        )
+        return [(gameId, predicted[gameId]) for gameId in ranked[:limit]]
+
+
+similarityIndex = SimilarityIndex()
@@ -0,0 +1,133 @@
+import json
+import os
+import re
+import sys
+from email.utils import formatdate
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+from compression import negotiateEncoding
+
+# Everything under covers/ is named after its own sha256 (images.writeContentAddressed)
+CONTENT_ADDRESSED_DIR = "covers"
+contentAddressedName = re.compile(r"^(?P<digest>[0-9a-f]{32})\.[a-z0-9]+$")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Name-based files (bundled art, profile pictures) can change in place
+MUTABLE_CACHE_CONTROL = "public, no-cache"
+
+precompressedEncodings = (("br", ".br"), ("gzip", ".gz"))
+
+# Behind nginx, set this to an `internal` location aliased to the images directory
+# (e.g. /_images/) and nginx streams the file with sendfile instead of Python.
+ACCEL_REDIRECT_PREFIX = os.environ.get("IMAGES_ACCEL_REDIRECT_PREFIX")
+
+
+class ImageFiles(StaticFiles):
+    def file_response(
+        self,
+        full_path: os.PathLike[str] | str,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        full_path = os.fspath(full_path)
+        relative_path = os.path.relpath(full_path, self.directory)  # type: ignore
+        directory, file_name = os.path.split(relative_path)
+        match = contentAddressedName.match(file_name)
+        headers: dict[str, str] = {}
+        if directory == CONTENT_ADDRESSED_DIR and match:
+            headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+            # The name already is a content hash, so it is the strongest ETag there is
+            headers["etag"] = f'"{match.group("digest")}"'
+        else:
+            headers["cache-control"] = MUTABLE_CACHE_CONTROL
+
+        response = FileResponse(
+            full_path, status_code=status_code, stat_result=stat_result, headers=headers
+        )
+        if ACCEL_REDIRECT_PREFIX:
+            if self.is_not_modified(response.headers, request_headers):
+                return NotModifiedResponse(response.headers)
+            return Response(
+                status_code=status_code,
+                headers={
+                    "x-accel-redirect": ACCEL_REDIRECT_PREFIX
+                    + relative_path.replace(os.sep, "/"),
+                    "content-type": response.media_type or "application/octet-stream",
+                    "cache-control": headers["cache-control"],
+                    "etag": response.headers["etag"],
+                    "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+                },
+            )
+
+        # The precompressed copy is chosen first: a conditional request has to be
+        # compared with the ETag of the representation it would get
+        sidecars: dict[str, os.stat_result] = {}
+        accepted = request_headers.get("accept-encoding")
+        if accepted:
+            for encoding, suffix in precompressedEncodings:
+                try:
+                    sidecars[encoding] = os.stat(full_path + suffix)
+                except OSError:
+                    continue
+        encoding = negotiateEncoding(accepted, tuple(sidecars))
+        if encoding is not None:
+            response = FileResponse(
+                full_path + dict(precompressedEncodings)[encoding],
+                status_code=status_code,
+                stat_result=sidecars[encoding],
+                media_type=response.media_type,
+                headers={
+                    **headers,
+                    "content-encoding": encoding,
+                    "etag": response.headers["etag"].rstrip('"') + f'-{encoding}"',
+                },
+            )
+        if sidecars:
+            response.headers["vary"] = "Accept-Encoding"
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+# Moves covers still served under a mutable name (e.g. /images/gameCoverArts/x.jpeg)
+# onto content-addressed variants. Profile pictures keep their client-chosen paths.
+def migrateCovers(imagesDir: str) -> int:
+    from sqlmodel import Session, select
+    from db import engine
+    from etags import bumpVersions
+    from images import generateCoverVariants, toSrcset
+    import models
+
+    coversDir = os.path.join(imagesDir, CONTENT_ADDRESSED_DIR)
+    os.makedirs(coversDir, exist_ok=True)
+    prefix = f"/images/{CONTENT_ADDRESSED_DIR}/"
+    migrated = 0
+    with Session(engine) as db:
+        games = db.exec(
+            select(models.Game).where(
+                models.Game.coverArtRelativePath.not_like(prefix + "%")  # type: ignore
+            )
+        ).all()
+        for game in games:
+            # Seeded rows use "../images/..." relative paths
+            relativePath = game.coverArtRelativePath.partition("images/")[2]
+            sourcePath = os.path.join(imagesDir, relativePath)
+            if not os.path.isfile(sourcePath):
+                print(f"skipping game {game.id}: {sourcePath} not found", file=sys.stderr)
+                continue
+            variants = generateCoverVariants(sourcePath, coversDir)
+            game.coverArtSrcset = json.dumps(toSrcset(prefix.rstrip("/"), variants))
+            game.coverArtRelativePath = prefix + variants["jpeg"][0][0]
+            migrated += 1
+            bumpVersions(db, ("catalog",), ("game", game.id))  # type: ignore
+        db.commit()
+    return migrated
+
+
+if __name__ == "__main__":
+    imagesDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images")
+    print(f"migrated {migrateCovers(imagesDir)} covers")
@@ -0,0 +1,162 @@
+import hashlib
+import os
+import uuid
+import anyio
+from fastapi import HTTPException, UploadFile, status
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+MAX_COVER_ART_BYTES = int(os.environ.get("MAX_COVER_ART_BYTES", 20 * 1024 * 1024))
+# Room for the other form fields and multipart boundaries
+MAX_REQUEST_BYTES = MAX_COVER_ART_BYTES + 256 * 1024
+UPLOAD_CHUNK_BYTES = 256 * 1024
+
+# The file name and the client's content type are both just claims
+imageSignatures = {
+    b"\xff\xd8\xff": ".jpeg",
+    b"\x89PNG\r\n\x1a\n": ".png",
+}
+
+
+class UploadTooLargeError(ValueError):
+    pass
+
+
+class UnsupportedUploadError(ValueError):
+    pass
+
+
+def sniffImageExtension(head: bytes) -> str | None:
+    for signature, extension in imageSignatures.items():
+        if head.startswith(signature):
+            return extension
+    return None
+
+
+# An upload written to a hidden temp file; it only gets its real, content-hash
+# name through commit(), so a failed request never leaves a servable file behind.
+class StagedUpload:
+    def __init__(self, tempPath: str, digest: str, extension: str, size: int):
+        self.tempPath = tempPath
+        self.digest = digest
+        self.extension = extension
+        self.size = size
+
+    @property
+    def fileName(self) -> str:
+        return f"{self.digest[:32]}{self.extension}"
+
+    def commit(self, directory: str) -> str:
+        finalPath = os.path.join(directory, self.fileName)
+        os.replace(self.tempPath, finalPath)
+        return finalPath
+
+    def discard(self):
+        try:
+            os.remove(self.tempPath)
+        except FileNotFoundError:
+            pass
+
+
+async def stageUpload(
+    upload: UploadFile, directory: str, maxBytes: int = MAX_COVER_ART_BYTES
+) -> StagedUpload:
+    tempPath = os.path.join(directory, f".upload-{uuid.uuid4().hex}.tmp")
+    hasher = hashlib.sha256()
+    extension = None
+    size = 0
+    try:
+        async with await anyio.open_file(tempPath, "wb") as output:
+            while chunk := await upload.read(UPLOAD_CHUNK_BYTES):
+                if extension is None:
+                    extension = sniffImageExtension(chunk)
+                    if extension is None:
+                        raise UnsupportedUploadError("Unsupported image format.")
+                size += len(chunk)
+                if size > maxBytes:
+                    raise UploadTooLargeError(
+                        f"Image is larger than {maxBytes // (1024 * 1024)} MB."
+                    )
+                hasher.update(chunk)
+                await output.write(chunk)
+    except BaseException:
+        os.remove(tempPath)
+        raise
+    if extension is None:
+        os.remove(tempPath)
+        raise UnsupportedUploadError("Empty image file.")
+    return StagedUpload(tempPath, hasher.hexdigest(), extension, size)
+
+
+# An HTTPException so FastAPI's body parsing passes it through as a 413 instead
+# of turning it into "There was an error parsing the body"
+class RequestTooLarge(HTTPException):
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Request body too large.",
+        )
+
+
+# Rejects oversized bodies while they arrive, before the multipart parser spools
+# them to disk: by Content-Length up front, and by counting for chunked bodies.
+# pathLimits gives streaming endpoints (e.g. bulk import) their own cap.
+class RequestSizeLimitMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        maxBytes: int = MAX_REQUEST_BYTES,
+        pathLimits: dict[str, int] | None = None,
+    ):
+        self.app = app
+        self.maxBytes = maxBytes
+        self.pathLimits = pathLimits or {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        maxBytes = self.pathLimits.get(scope["path"], self.maxBytes)
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > maxBytes:
+                await self.reject(send)
+                return
+
+        received = 0
+        responseStarted = False
+
+        async def limitedReceive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > maxBytes:
+                    raise RequestTooLarge()
+            return message
+
+        async def trackedSend(message: Message):
+            nonlocal responseStarted
+            if message["type"] == "http.response.start":
+                responseStarted = True
+            await send(message)
+
+        try:
+            await self.app(scope, limitedReceive, trackedSend)
+        except RequestTooLarge:
+            if responseStarted:
+                raise
+            await self.reject(send)
+
+    async def reject(self, send: Send):
+        body = b'{"detail":"Request body too large."}'
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 413,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,221 @@
+import logging
+import os
+import threading
+from datetime import datetime
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from sqlalchemy import Engine, bindparam, func, select, update
+from sqlmodel import Session
+import models
+from etags import bumpVersions
+from reviewchanges import recordReviewChanges
+
+logger = logging.getLogger(__name__)
+
+VOTE_FLUSH_SECONDS = float(os.environ.get("VOTE_FLUSH_MS", "250")) / 1000
+
+
+# (likes, dislikes) to add when a user's vote goes from previous to value, where
+# 1 is a like, -1 a dislike and 0 no vote
+def voteDelta(previous: int, value: int) -> tuple[int, int]:
+    return (value == 1) - (previous == 1), (value == -1) - (previous == -1)
+
+
+# Like/dislike deltas summed per review in memory and written every
+# VOTE_FLUSH_SECONDS as one executemany UPDATE, so a review getting hundreds of
+# votes a second costs one row write per flush instead of one per vote. The
+# ReviewVote rows are the source of truth and are committed by the request
+# itself; a crash loses at most one interval of counter deltas, which
+# /admin/recomputeRatings rebuilds from them. State is per process: each worker
+# flushes its own deltas, and relative UPDATEs from several workers add up.
+class VoteCounters:
+    def __init__(self):
+        # Guards the in-memory state only; never held across a database call
+        self.changed = threading.Condition()
+        self.deltas: dict[int, tuple[int, int]] = {}
+        # reviewId -> (gameId, author's userId, review's createdAt). createdAt
+        # tells a review from a later one that reused its id.
+        self.reviews: dict[int, tuple[int, int, datetime]] = {}
+        # Requests and flushes between their first vote write and their add()s
+        self.writers = 0
+        self.recomputing = False
+        self.stopping = threading.Event()
+        self.thread: threading.Thread | None = None
+        self.onFlushed: Callable[[Iterable[tuple[int, int]]], None] = lambda _: None
+
+    def add(
+        self,
+        reviewId: int,
+        gameId: int,
+        authorId: int,
+        createdAt: datetime,
+        likes: int,
+        dislikes: int,
+    ):
+        with self.changed:
+            if self.reviews.get(reviewId, (0, 0, createdAt))[2] != createdAt:
+                # Left over from a deleted review whose id was handed out again
+                self.deltas.pop(reviewId, None)
+            oldLikes, oldDislikes = self.deltas.get(reviewId, (0, 0))
+            self.deltas[reviewId] = (oldLikes + likes, oldDislikes + dislikes)
+            self.reviews[reviewId] = (gameId, authorId, createdAt)
+
+    # For deleted reviews, so their deltas aren't written for nothing
+    def discard(self, reviewIds: Iterable[int]):
+        with self.changed:
+            for reviewId in reviewIds:
+                self.deltas.pop(reviewId, None)
+                self.reviews.pop(reviewId, None)
+
+    # Wraps a request's ReviewVote writes through its commit and add() calls.
+    # Writers run concurrently; they only wait while a recompute is running, and
+    # a recompute waits for the writers already inside, so it sees each vote
+    # either in ReviewVote and not in the deltas or the other way round.
+    @contextmanager
+    def writing(self) -> Iterator[None]:
+        with self.changed:
+            while self.recomputing:
+                self.changed.wait()
+            self.writers += 1
+        try:
+            yield
+        finally:
+            with self.changed:
+                self.writers -= 1
+                self.changed.notify_all()
+
+    def flush(self, engine: Engine) -> int:
+        with self.writing():
+            return self.writeDeltas(engine)
+
+    def writeDeltas(self, engine: Engine) -> int:
+        with self.changed:
+            deltas, self.deltas = self.deltas, {}
+            reviews, self.reviews = self.reviews, {}
+        rows = [
+            {
+                "targetId": reviewId,
+                "targetCreatedAt": reviews[reviewId][2],
+                "likesDelta": likes,
+                "dislikesDelta": dislikes,
+            }
+            for reviewId, (likes, dislikes) in deltas.items()
+            if likes or dislikes
+        ]
+        if not rows:
+            return 0
+        try:
+            with engine.begin() as connection:
+                connection.execute(
+                    update(models.Review)  # type: ignore
+                    .where(models.Review.reviewId == bindparam("targetId"))  # type: ignore
+                    .where(
+                        models.Review.createdAt  # type: ignore
+                        == bindparam("targetCreatedAt", type_=models.Review.createdAt.type)  # type: ignore
+                    )
+                    .values(
+                        likes=models.Review.likes + bindparam("likesDelta"),
+                        dislikes=models.Review.dislikes + bindparam("dislikesDelta"),
+                    ),
+                    rows,
+                )
+                recordReviewChanges(
+                    connection,
+                    [(reviews[row["targetId"]][0], row["targetId"]) for row in rows],
+                )
+                bumpVersions(
+                    connection,
+                    *(
+                        key
+                        for gameId, authorId, _ in reviews.values()
+                        for key in (("gameReviews", gameId), ("userReviews", authorId))
+                    ),
+                )
+        except Exception:
+            # Put them back for the next flush, merged with anything added since
+            for reviewId, (likes, dislikes) in deltas.items():
+                self.add(reviewId, *reviews[reviewId], likes, dislikes)
+            raise
+        self.onFlushed([(gameId, authorId) for gameId, authorId, _ in reviews.values()])
+        return len(rows)
+
+    # Rebuilds the counters from ReviewVote. New writers wait and the ones inside
+    # (a flush included) finish first; every delta left then belongs to a
+    # committed vote that the recompute counts, so they are dropped.
+    def recompute(self, db: Session) -> list[tuple[int, int]]:
+        with self.changed:
+            while self.recomputing:
+                self.changed.wait()
+            self.recomputing = True
+            while self.writers:
+                self.changed.wait()
+            self.deltas, self.reviews = {}, {}
+        try:
+            return recomputeVoteCounts(db)
+        finally:
+            with self.changed:
+                self.recomputing = False
+                self.changed.notify_all()
+
+    def run(self, engine: Engine, interval: float):
+        while not self.stopping.wait(interval):
+            try:
+                self.flush(engine)
+            except Exception:
+                logger.exception("Vote counter flush failed")
+
+    def start(
+        self,
+        engine: Engine,
+        onFlushed: Callable[[Iterable[tuple[int, int]]], None],
+        interval: float = VOTE_FLUSH_SECONDS,
+    ):
+        self.onFlushed = onFlushed
+        self.stopping.clear()
+        self.thread = threading.Thread(
+            target=self.run, args=(engine, interval), name="votes", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self, engine: Engine):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.flush(engine)
+
+
+# Rebuilds the counters from ReviewVote and returns (gameId, author's userId) of
+# the reviews that changed. Call it through VoteCounters.recompute, or pending
+# deltas are counted twice.
+def recomputeVoteCounts(db: Session) -> list[tuple[int, int]]:
+    def votes(value: int):
+        return (
+            select(func.count())
+            .where(models.ReviewVote.reviewId == models.Review.reviewId)
+            .where(models.ReviewVote.value == value)
+            .scalar_subquery()
+        )
+
+    likes, dislikes = votes(1), votes(-1)
+    changed = db.exec(
+        update(models.Review)  # type: ignore
+        .where((models.Review.likes != likes) | (models.Review.dislikes != dislikes))
+        .values(likes=likes, dislikes=dislikes)
+        .returning(models.Review.reviewId, models.Review.gameId, models.Review.userId)
+        .execution_options(synchronize_session=False)
+    ).all()
+    recordReviewChanges(db, [(gameId, reviewId) for reviewId, gameId, _ in changed])
+    bumpVersions(
+        db,
+        *(
+            key
+            for _, gameId, authorId in changed
+            for key in (("gameReviews", gameId), ("userReviews", authorId))
+        ),
+    )
+    db.commit()
+    return [(gameId, userId) for _, gameId, userId in changed]
+
+
+voteCounters = VoteCounters()
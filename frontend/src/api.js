@@ -5,4 +5,18 @@ const api = axios.create({
         'Content-Type': 'application/json' },
     });
 
-export default api;
\ No newline at end of file
+// List endpoints return one page at a time and put the cursor for the next
+// one in X-Next-Cursor, which is absent on the last page. Pass it back to get
+// the page after.
+export function getPage(url, cursor, config = {}) {
+  return api.get(url, {
+    ...config,
+    params: cursor ? { ...config.params, cursor } : config.params,
+  });
+}
+
+export function nextCursor(res) {
+  return res.headers['x-next-cursor'] || null;
+}
+
+export default api;
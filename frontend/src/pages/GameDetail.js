@@ -1,8 +1,29 @@
-import React, { useEffect, useState, useContext } from 'react';
+import React, { useEffect, useState, useContext, useRef } from 'react';
 import { useParams, Navigate } from 'react-router-dom';
-import api from '../api';
+import api, { getPage, nextCursor } from '../api';
 import { AuthContext } from '../contexts/AuthContext';
 
+// Changed reviews replace their old copy or go on top (the list is newest
+// first); deleted ones are dropped
+function applyReviewChanges(reviews, changed, deleted) {
+  const changedById = new Map(changed.map(r => [r.reviewId, r]));
+  const deletedIds = new Set(deleted);
+  const kept = reviews
+    .filter(r => !deletedIds.has(r.reviewId))
+    .map(r => {
+      const update = changedById.get(r.reviewId);
+      changedById.delete(r.reviewId);
+      return update || r;
+    });
+  return [...changedById.values(), ...kept];
+}
+
+// A later page goes at the end, minus reviews a change already put on top
+function appendReviewPage(reviews, page) {
+  const shown = new Set(reviews.map(r => r.reviewId));
+  return [...reviews, ...page.filter(r => !shown.has(r.reviewId))];
+}
+
 export default function GameDetail() {
   const { id } = useParams();
   const gameId = parseInt(id, 10);
@@ -10,24 +31,75 @@ export default function GameDetail() {
 
   const [game, setGame] = useState(null);
   const [reviews, setReviews] = useState([]);
+  const [cursor, setCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [user, setUser] = useState(null);
   const [existingReview, setExistingReview] = useState(null);
   const [content, setContent] = useState('');
   const [score, setScore] = useState(50);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
+  // Position in the review change log: set by the first page, moved on by
+  // every delta and stream event. Later pages don't move it.
+  const changesCursor = useRef(null);
+
+  const showFirstPage = revRes => {
+    changesCursor.current = revRes.headers['x-changes-cursor'];
+    setReviews(revRes.data);
+    setCursor(nextCursor(revRes));
+  };
+
+  const loadReviews = async () => {
+    showFirstPage(await getPage(`/games/${gameId}/reviews`));
+  };
+
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const res = await getPage(`/games/${gameId}/reviews`, cursor);
+      setReviews(prev => appendReviewPage(prev, res.data));
+      setCursor(nextCursor(res));
+    } catch (err) {
+      console.error(err);
+      setError('Failed to load reviews.');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  // Fetches only what changed since the cursor; starts over from the first
+  // page when the server no longer has the log that far back (410)
+  const syncReviews = async () => {
+    try {
+      let hasMore = true;
+      while (hasMore) {
+        const res = await api.get(`/games/${gameId}/reviews/changes`, {
+          params: { since: changesCursor.current },
+        });
+        setReviews(prev => applyReviewChanges(prev, res.data.changed, res.data.deleted));
+        changesCursor.current = res.data.cursor;
+        hasMore = res.data.hasMore;
+      }
+    } catch (err) {
+      if (err.response && err.response.status === 410) {
+        await loadReviews();
+      } else {
+        throw err;
+      }
+    }
+  };
 
   useEffect(() => {
     if (!token) return;
     Promise.all([
       api.get('/users/me'),
       api.get(`/games/${gameId}`),
-      api.get(`/games/${gameId}/reviews`),
+      getPage(`/games/${gameId}/reviews`),
     ])
       .then(([userRes, gameRes, revRes]) => {
         setUser(userRes.data);
         setGame(gameRes.data);
-        setReviews(revRes.data);
+        showFirstPage(revRes);
       })
       .catch(err => {
         console.error(err);
@@ -36,6 +108,28 @@ export default function GameDetail() {
       .finally(() => setLoading(false));
   }, [token, gameId]);
 
+  // Other users' reviews and the rating arrive over Server-Sent Events. The
+  // browser reconnects on its own and resumes from the last event id.
+  useEffect(() => {
+    if (loading || !changesCursor.current) return;
+    const since = encodeURIComponent(changesCursor.current);
+    const source = new EventSource(
+      `${api.defaults.baseURL}/games/${gameId}/reviews/stream?since=${since}`
+    );
+    source.addEventListener('review', e => {
+      setReviews(prev => applyReviewChanges(prev, [JSON.parse(e.data)], []));
+      changesCursor.current = e.lastEventId;
+    });
+    source.addEventListener('reviewDeleted', e => {
+      setReviews(prev => applyReviewChanges(prev, [], [JSON.parse(e.data).reviewId]));
+      changesCursor.current = e.lastEventId;
+    });
+    source.addEventListener('rating', e => {
+      setGame(prev => prev && { ...prev, ...JSON.parse(e.data) });
+    });
+    return () => source.close();
+  }, [loading, gameId]);
+
   useEffect(() => {
     if (user && reviews.length > 0) {
       const myRev = reviews.find(r => r.userId === user.id);
@@ -69,8 +163,7 @@ export default function GameDetail() {
           content,
           score,
         });
-        const revRes = await api.get(`/games/${gameId}/reviews`);
-        setReviews(revRes.data);
+        await syncReviews();
         alert('Review updated');
       } else {
         await api.post('/users/me/reviews', {
@@ -78,8 +171,7 @@ export default function GameDetail() {
           content,
           score,
         });
-        const revRes = await api.get(`/games/${gameId}/reviews`);
-        setReviews(revRes.data);
+        await syncReviews();
         alert('Review created');
       }
       setExistingReview(null);
@@ -99,8 +191,7 @@ export default function GameDetail() {
     if (!existingReview) return;
     try {
       await api.delete(`/users/me/reviews/${existingReview.reviewId}`);
-      const revRes = await api.get(`/games/${gameId}/reviews`);
-      setReviews(revRes.data);
+      await syncReviews();
       setExistingReview(null);
       setContent('');
       setScore(50);
@@ -159,7 +250,7 @@ export default function GameDetail() {
       {error && <div style={{ color: 'red', marginBottom: '1rem' }}>{error}</div>}
 
       <hr style={{ margin: '2rem 0' }} />
-      <h3>All Reviews ({reviews.length})</h3>
+      <h3>All Reviews ({game.reviewCount})</h3>
       <ul style={{ listStyle: 'none', padding: 0 }}>
         {reviews.map(r => (
           <li
@@ -177,6 +268,11 @@ export default function GameDetail() {
           </li>
         ))}
       </ul>
+      {cursor && (
+        <button className="btn" onClick={loadMore} disabled={loadingMore}>
+          {loadingMore ? 'Loading…' : 'Load more reviews'}
+        </button>
+      )}
     </div>
   );
 }
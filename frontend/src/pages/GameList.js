@@ -1,23 +1,38 @@
 import React, { useEffect, useState, useContext } from 'react';
 import { Link, Navigate } from 'react-router-dom';
-import api from '../api';
+import { getPage, nextCursor } from '../api';
 import { AuthContext } from '../contexts/AuthContext';
 
 export default function GameList() {
   const { token } = useContext(AuthContext);
   const [games, setGames] = useState([]);
+  const [cursor, setCursor] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [err, setErr] = useState('');
 
   useEffect(() => {
     if (!token) return;
-    api
-      .get('/games')
-      .then(res => setGames(res.data))
+    getPage('/games')
+      .then(res => {
+        setGames(res.data);
+        setCursor(nextCursor(res));
+      })
       .catch(() => setErr('Failed to load games.'))
       .finally(() => setLoading(false));
   }, [token]);
 
+  const loadMore = () => {
+    setLoadingMore(true);
+    getPage('/games', cursor)
+      .then(res => {
+        setGames(prev => [...prev, ...res.data]);
+        setCursor(nextCursor(res));
+      })
+      .catch(() => setErr('Failed to load games.'))
+      .finally(() => setLoadingMore(false));
+  };
+
   if (!token)      return <Navigate to="/login" />;
   if (loading)     return <div>Loading games…</div>;
   if (err)         return <div style={{ color: 'red' }}>{err}</div>;
@@ -63,6 +78,11 @@ export default function GameList() {
           </li>
         ))}
       </ul>
+      {cursor && (
+        <button className="btn" onClick={loadMore} disabled={loadingMore}>
+          {loadingMore ? 'Loading…' : 'Load more'}
+        </button>
+      )}
     </div>
   );
 }
@@ -1,12 +1,14 @@
 import React, { useContext, useEffect, useState } from 'react';
 import { Link } from 'react-router-dom';
-import api from '../api';
+import api, { getPage, nextCursor } from '../api';
 import { AuthContext } from '../contexts/AuthContext';
 
 export default function Profile() {
   const { token } = useContext(AuthContext);
   const [user, setUser] = useState(null);
   const [reviews, setReviews] = useState([]);
+  const [cursor, setCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [bio, setBio] = useState('');
   const [nickname, setNickname] = useState('');
   const [picture, setPicture] = useState('');
@@ -15,15 +17,27 @@ export default function Profile() {
   useEffect(() => {
     if (!token) return;
 
-    Promise.all([api.get('/users/me'), api.get('/users/me/reviews')])
+    Promise.all([api.get('/users/me'), getPage('/users/me/reviews')])
       .then(([uRes, rRes]) => {
         setUser(uRes.data);
         setReviews(rRes.data);
+        setCursor(nextCursor(rRes));
       })
       .catch(() => setErr('Failed to load profile information.'))
       .finally(() => setLoading(false));
   }, [token]);
 
+  const loadMore = () => {
+    setLoadingMore(true);
+    getPage('/users/me/reviews', cursor)
+      .then(res => {
+        setReviews(prev => [...prev, ...res.data]);
+        setCursor(nextCursor(res));
+      })
+      .catch(() => setErr('Failed to load profile information.'))
+      .finally(() => setLoadingMore(false));
+  };
+
   const handleSave = async () => {
     try {
       await api.put('/profiles/me', {
@@ -90,6 +104,11 @@ export default function Profile() {
           </li>
         ))}
       </ul>
+      {cursor && (
+        <button className="btn" onClick={loadMore} disabled={loadingMore}>
+          {loadingMore ? 'Loading…' : 'Load more'}
+        </button>
+      )}
     </div>
   );
 }